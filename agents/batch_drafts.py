@@ -0,0 +1,228 @@
+"""Bulk drafting through the OpenAI Batch API (half price, 24 h window).
+
+For big non-urgent runs (nightly follow-ups) draft_emails_batch() is a
+drop-in for copy_crafter.draft_emails():
+
+  1. render every prompt; cache hits and repeated prompts are not sent
+  2. write one JSONL request per remaining prompt, custom_id = contact id
+  3. files.create(purpose="batch") → batches.create, ≤ BATCH_MAX per job
+  4. poll until every job is done, read the output/error files
+  5. map results back by custom_id, fill the draft cache, finish_body()
+
+Anything the batch couldn't draft (errors, expiry) is retried through the
+normal synchronous path so a run never silently drops contacts.
+
+Submitted jobs are recorded in the draft cache's DB by a hash of their
+input file until their results are read; a run restarted mid-wait with the
+same drafts resumes those jobs instead of submitting (and paying) again.
+
+    BATCH_POLL     seconds between status checks (default 30)
+    BATCH_TIMEOUT  cancel and fall back after this many seconds (default 24 h)
+    BATCH_MAX      requests per batch job (default 50 000, the API cap)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+
+from clients import openai_client
+from copy_crafter import (MAX_TOKENS, TEMPERATURE, draft_emails, finish_body,
+                          is_literal, model_name, render_prompt)
+from draft_cache import default_cache
+from metrics import span, count, record_tokens
+
+BATCH_POLL    = float(os.getenv("BATCH_POLL", 30))
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", 24 * 3600))
+BATCH_MAX     = int(os.getenv("BATCH_MAX", 50_000))
+
+DONE = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_jsonl(jobs: list[tuple[str, str]]) -> bytes:
+    """[(custom_id, prompt)] → Batch API input file."""
+    return b"".join(
+        json.dumps({
+            "custom_id": cid,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model_name(),
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": TEMPERATURE,
+                "max_tokens": MAX_TOKENS,
+            },
+        }).encode() + b"\n"
+        for cid, prompt in jobs
+    )
+
+
+def input_hash(jobs: list[tuple[str, str]]) -> str:
+    """Identity of a batch job's input (prompts, model and settings)."""
+    return hashlib.sha256(build_jsonl(jobs)).hexdigest()
+
+
+def resume_or_submit(jobs: list[tuple[str, str]], cache, client=None) -> str:
+    """The batch already running for exactly these jobs, or a new one."""
+    client = client or openai_client()
+    h = input_hash(jobs)
+    bid = cache.pending_batch(h)
+    if bid:
+        try:
+            status = client.batches.retrieve(bid).status
+        except Exception as e:                          # purged / other account
+            print(f"⚠️  batch {bid} can't be resumed: {e}")
+            status = None
+        if status is not None and status not in ("failed", "expired", "cancelled"):
+            print(f"📦 batch {bid}: resuming ({status}, {len(jobs)} drafts)")
+            count("openai.batch_resumed")
+            return bid
+    bid = submit(jobs, client)
+    cache.save_batch(h, bid)
+    return bid
+
+
+def submit(jobs: list[tuple[str, str]], client=None) -> str:
+    """Upload one JSONL file and start a batch; returns the batch id."""
+    client = client or openai_client()
+    with span("openai.batch_submit"):
+        f = client.files.create(file=("drafts.jsonl", build_jsonl(jobs)), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=f.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+    print(f"📦 batch {batch.id}: {len(jobs)} drafts submitted")
+    return batch.id
+
+
+def wait(batch_ids: list[str], client=None, poll: float | None = None,
+         timeout: float | None = None) -> list:
+    """Poll until every batch reaches a terminal state; batches still
+    running at the timeout are cancelled."""
+    client = client or openai_client()
+    poll = BATCH_POLL if poll is None else poll
+    deadline = time.monotonic() + (BATCH_TIMEOUT if timeout is None else timeout)
+    pending, done = list(batch_ids), {}
+    with span("openai.batch_wait"):
+        while pending:
+            for bid in list(pending):
+                b = client.batches.retrieve(bid)
+                if b.status in DONE:
+                    done[bid] = b
+                    pending.remove(bid)
+            if not pending:
+                break
+            if time.monotonic() > deadline:
+                # cancel so the synchronous fallback doesn't pay for the same drafts twice
+                print(f"⚠️  {len(pending)} batch(es) still running after the timeout, "
+                      f"cancelling: {pending}")
+                for bid in pending:
+                    try:
+                        done[bid] = client.batches.cancel(bid)
+                        count("openai.batch_cancelled")
+                    except Exception as e:              # finished in the meantime
+                        print(f"⚠️  cancel {bid} failed: {e}")
+                        done[bid] = client.batches.retrieve(bid)
+                break
+            time.sleep(poll)
+    return [done[bid] for bid in batch_ids]
+
+
+def read_results(batch, client=None) -> dict[str, dict]:
+    """{custom_id: output line} from a finished batch's output file."""
+    client = client or openai_client()
+    out = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if line.strip():
+                rec = json.loads(line)
+                out[rec["custom_id"]] = rec
+    return out
+
+
+def _text(rec: dict | None) -> str | None:
+    resp = (rec or {}).get("response") or {}
+    if resp.get("status_code") != 200:
+        return None
+    try:
+        return resp["body"]["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def draft_emails_batch(
+    props_list: list[dict],
+    template: str = "first_touch_email.md",
+    *,
+    bypass_cache: bool = False,
+    client=None,
+    poll: float | None = None,
+    timeout: float | None = None,
+) -> list[str | None]:
+    """Like draft_emails(), but through the Batch API; results in input order."""
+    if is_literal(template):
+        return draft_emails(props_list, template)       # rendered locally, nothing to batch
+    client = client or openai_client()
+    cache  = default_cache()
+    prompts = [render_prompt(p, template) for p in props_list]
+    raw: list[str | None] = [None] * len(props_list)
+
+    # cache hits and duplicate prompts never leave the process
+    by_prompt: dict[str, list[int]] = {}
+    for i, prompt in enumerate(prompts):
+        hit = None if bypass_cache else cache.get(
+            cache.key(prompt, model_name(), TEMPERATURE, MAX_TOKENS))
+        if hit is not None:
+            raw[i] = hit
+            count("draft_cache.hit")
+        else:
+            by_prompt.setdefault(prompt, []).append(i)
+
+    jobs, owners, used = [], {}, set()
+    for prompt, idxs in by_prompt.items():
+        cid = str(props_list[idxs[0]].get("hs_object_id") or f"row-{idxs[0]}")
+        if cid in used:                                  # custom_id must be unique
+            cid = f"{cid}#{idxs[0]}"
+        used.add(cid)
+        jobs.append((cid, prompt))
+        owners[cid] = (prompt, idxs)
+    count("draft_cache.miss", len(jobs))
+
+    if jobs:
+        ids = [resume_or_submit(jobs[i:i + BATCH_MAX], cache, client)
+               for i in range(0, len(jobs), BATCH_MAX)]
+        for b in wait(ids, client, poll, timeout):
+            results = read_results(b, client)
+            for cid, rec in results.items():
+                if cid not in owners:
+                    continue
+                text = _text(rec)
+                if text is None:
+                    continue
+                usage = rec["response"]["body"].get("usage") or {}
+                record_tokens(f"batch:{template}", usage.get("prompt_tokens", 0),
+                              usage.get("completion_tokens", 0))
+                prompt, idxs = owners[cid]
+                cache.put(cache.key(prompt, model_name(), TEMPERATURE, MAX_TOKENS), text)
+                for i in idxs:
+                    raw[i] = text
+            cache.drop_batch(b.id)                       # results are cached now
+            rc = b.request_counts
+            print(f"📦 batch {b.id} {b.status}: "
+                  f"{rc.completed if rc else '?'} ok, {rc.failed if rc else '?'} failed")
+
+    out: list[str | None] = [finish_body(r, p) if r is not None else None
+                             for r, p in zip(raw, props_list)]
+
+    missing = [i for i, r in enumerate(out) if r is None]
+    if missing:                                          # errored / expired items
+        print(f"↻ {len(missing)} draft(s) not returned by the batch – drafting them directly")
+        count("openai.batch_fallback", len(missing))
+        for i, body in zip(missing, draft_emails([props_list[i] for i in missing], template)):
+            out[i] = body
+    return out
@@ -0,0 +1,92 @@
+"""Process-wide API clients and config, built once on first use.
+
+Every agent asks here instead of constructing its own, so when several
+agents run in one process (run.py) they share connection pools. Nothing
+is built (or even imported – the SDKs are slow to import) until first
+called, so importing an agent for one helper stays cheap.
+
+Env
+  HUBSPOT_TOKEN, HUBSPOT_API_BASE   (base URL override, e.g. a local fake)
+  OPENAI_API_KEY, OPENAI_BASE_URL   (read by the OpenAI SDK itself)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from functools import lru_cache, wraps
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT / ".env")
+
+
+def _once(fn):
+    """lru_cache that also builds only once when first called from many
+    threads at the same time (drafting/sending workers)."""
+    cached = lru_cache(maxsize=None)(fn)
+    lock = threading.Lock()
+
+    @wraps(fn)
+    def wrapper(*args, **kw):
+        with lock:
+            return cached(*args, **kw)
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+@_once
+def hubspot_client():
+    from hubspot import HubSpot
+    kw = {"host": os.environ["HUBSPOT_API_BASE"]} if os.getenv("HUBSPOT_API_BASE") else {}
+    return HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"), **kw)
+
+
+def contacts_api(name: str, hs=None):
+    """hs.crm.contacts.<name>_api ("basic", "batch", "search"), built once.
+
+    The SDK builds a fresh ApiClient – and urllib3 pool – on every access to
+    these attributes, so going through the HubSpot object alone keeps no
+    connection alive between calls."""
+    return _contacts_api(hs or hubspot_client(), name)
+
+
+@_once
+def _contacts_api(hs, name: str):
+    return getattr(hs.crm.contacts, f"{name}_api")
+
+
+def hubspot_error() -> type[Exception]:
+    """HubSpot's ApiException, for `except hubspot_error():` – the clause is
+    only evaluated while an exception is matched, so the SDK isn't imported
+    by merely importing an agent."""
+    from hubspot.crm.contacts import ApiException
+    return ApiException
+
+
+@_once
+def openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@_once
+def icp_config() -> dict:
+    """config/icp.json (companySignals, contactTitles, exclusionRules …)."""
+    with open(ROOT / "config" / "icp.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@_once
+def http_session(pool_size: int = 16):
+    """Keep-alive requests.Session for Slack, Cloudflare and friends."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
@@ -0,0 +1,232 @@
+"""Local SQLite mirror of HubSpot contacts.
+
+The first sync streams the whole portal; later syncs ask the Search API
+only for contacts whose `lastmodifieddate` is at or after the stored
+high-water mark. Selection queries (follow-ups due on a date, top-K by
+fit_score, contacts at a domain) then run against indexed local tables.
+
+    m = contact_mirror()
+    m.sync(hs)
+    m.emailed_on("2025-06-01")
+    m.top_k(5)
+
+Contacts deleted in HubSpot are not seen by incremental syncs; run
+sync(hs, full=True) now and then to rebuild from scratch.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from clients import ROOT, _once, contacts_api
+from hs_contacts import iter_contacts
+from metrics import span
+from ratelimit import call
+
+MIRROR_PROPERTIES = [
+    "email", "firstname", "lastname", "jobtitle", "company",
+    "fit_score", "last_emailed", "followup_step", "gtm_sender", "lastmodifieddate",
+    "hs_email_optout", "hs_email_hard_bounce_reason_enum",      # suppression.py
+]
+
+SEARCH_PAGE  = 200          # Search API max page size
+SEARCH_DEPTH = 10_000       # Search API refuses to page past this many hits
+
+
+class MirroredContact(NamedTuple):
+    """Same shape the agents use from the SDK: `.id` and `.properties`."""
+    id: str
+    properties: dict
+
+
+def _to_ms(iso: str) -> int:
+    return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def _int(v) -> int | None:
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return None
+
+
+class ContactMirror:
+    def __init__(self, path: str | Path | None = None):
+        path = Path(path or os.getenv("MIRROR_PATH", ROOT / ".cache" / "contacts.sqlite"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS contacts (
+                id           TEXT PRIMARY KEY,
+                email        TEXT,
+                domain       TEXT,
+                fit_score    INTEGER NOT NULL DEFAULT 0,
+                last_emailed TEXT,
+                lastmodified TEXT,
+                props        TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_contacts_last_emailed ON contacts(last_emailed);
+            CREATE INDEX IF NOT EXISTS ix_contacts_fit_score    ON contacts(fit_score);
+            CREATE INDEX IF NOT EXISTS ix_contacts_domain       ON contacts(domain);
+            CREATE INDEX IF NOT EXISTS ix_contacts_email        ON contacts(email);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    # ── sync ─────────────────────────────────────────────────────
+    def high_water_mark(self) -> str | None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'hwm'").fetchone()
+        return row[0] if row else None
+
+    def sync(self, hs, full: bool = False) -> int:
+        """Pull changes since the last sync (or everything); returns rows upserted."""
+        hwm = None if full else self.high_water_mark()
+        if hwm is None:
+            with self._lock:
+                self._db.execute("DELETE FROM contacts")
+                self._db.execute("DELETE FROM meta WHERE key = 'hwm'")
+                self._db.commit()
+            # a full stream isn't in lastmodifieddate order: the mark is only
+            # saved once it completes, so a sync that dies midway starts over
+            n = self._upsert_stream(iter_contacts(hs, properties=MIRROR_PROPERTIES),
+                                    ordered=False)
+        else:
+            n = self._upsert_stream(self._changed_since(hs, hwm))
+        print(f"🗂  mirror: {n} contacts synced ({'full' if hwm is None else 'since ' + hwm})")
+        return n
+
+    def _changed_since(self, hs, hwm: str) -> Iterator:
+        """Search API, oldest change first; restarts from the newest seen
+        timestamp whenever the 10k search depth is reached."""
+        since = _to_ms(hwm)
+        while True:
+            after, seen, last = None, 0, None
+            while True:
+                body = {
+                    "filterGroups": [{"filters": [{
+                        "propertyName": "lastmodifieddate",
+                        "operator": "GTE",
+                        "value": str(since),
+                    }]}],
+                    "sorts": [{"propertyName": "lastmodifieddate", "direction": "ASCENDING"}],
+                    "properties": MIRROR_PROPERTIES,
+                    "limit": SEARCH_PAGE,
+                }
+                if after:
+                    body["after"] = after
+                with span("hubspot.search"):
+                    res = call("hubspot", contacts_api("search", hs).do_search,
+                               public_object_search_request=body)
+                for c in res.results:
+                    last = c.properties.get("lastmodifieddate") or last
+                    yield c
+                seen += len(res.results)
+                nxt = getattr(res.paging, "next", None) if res.paging else None
+                if not (nxt and nxt.after):
+                    return
+                if seen + SEARCH_PAGE > SEARCH_DEPTH:
+                    break
+                after = nxt.after
+            if last is None or _to_ms(last) <= since:
+                return                       # >10k edits in one millisecond: give up
+            since = _to_ms(last)
+
+    def _upsert_stream(self, contacts, chunk: int = 1000, ordered: bool = True) -> int:
+        """Upsert contacts in chunks. `ordered` (oldest change first) lets
+        every chunk advance the high-water mark; otherwise it is written
+        only after the whole stream."""
+        n, hwm, rows = 0, self.high_water_mark(), []
+
+        def flush(final: bool = False):
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO contacts"
+                    " (id, email, domain, fit_score, last_emailed, lastmodified, props)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                if hwm and (ordered or final):
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('hwm', ?)", (hwm,))
+                self._db.commit()
+            rows.clear()
+
+        for c in contacts:
+            p = dict(c.properties or {})
+            p["hs_object_id"] = str(c.id)
+            email = (p.get("email") or "").lower()
+            mod = p.get("lastmodifieddate")
+            if mod and (hwm is None or _to_ms(mod) > _to_ms(hwm)):
+                hwm = mod
+            rows.append((
+                str(c.id),
+                email or None,
+                email.split("@")[-1] if "@" in email else None,
+                _int(p.get("fit_score")) or 0,
+                p.get("last_emailed") or None,
+                mod,
+                json.dumps(p),
+            ))
+            n += 1
+            if len(rows) >= chunk:
+                flush()
+        flush(final=True)
+        return n
+
+    # ── queries ──────────────────────────────────────────────────
+    def _select(self, where: str = "", args: tuple = (), tail: str = "") -> list[MirroredContact]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT id, props FROM contacts {where} {tail}", args).fetchall()
+        return [MirroredContact(r[0], json.loads(r[1])) for r in rows]
+
+    def emailed_on(self, date_str: str) -> list[MirroredContact]:
+        return self._select("WHERE last_emailed = ?", (date_str,))
+
+    def emailed_between(self, oldest: str, newest: str) -> list[MirroredContact]:
+        """Contacts whose last_emailed date is in [oldest, newest] – one index range scan."""
+        return self._select("WHERE last_emailed BETWEEN ? AND ? AND email IS NOT NULL",
+                            (oldest, newest))
+
+    def top_k(self, k: int, require_email: bool = True,
+              unemailed: bool = False) -> list[MirroredContact]:
+        conds = (["email IS NOT NULL"] if require_email else []) + \
+                (["last_emailed IS NULL"] if unemailed else [])
+        where = "WHERE " + " AND ".join(conds) if conds else ""
+        return self._select(where, (int(k),), "ORDER BY fit_score DESC LIMIT ?")
+
+    def by_domain(self, domain: str) -> list[MirroredContact]:
+        return self._select("WHERE domain = ?", (domain.lower(),))
+
+    def id_for_email(self, email: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT id FROM contacts WHERE email = ? LIMIT 1",
+                                   ((email or "").strip().lower(),)).fetchone()
+        return row[0] if row else None
+
+    def iter_all(self, batch: int = 5000) -> Iterator[MirroredContact]:
+        last = ""
+        while True:
+            rows = self._select("WHERE id > ?", (last,), f"ORDER BY id LIMIT {batch}")
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1].id
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+@_once
+def contact_mirror() -> ContactMirror:
+    """Process-wide mirror, opened on first use."""
+    return ContactMirror()
@@ -5,28 +5,57 @@ Features
 • Cleans any sender-name placeholders thoroughly
 • Guarantees exactly one tracked Calendly link
 • Appends an invisible tracking-pixel
+• draft_emails() drafts a whole list concurrently under the shared OpenAI
+  request/token buckets (ratelimit.py)
+• Completions are cached on disk (see draft_cache.py), so re-runs are free
+• With GTM_MEMORY on (memory.py), past emails that got replies are shown
+  as few-shot examples and near-duplicates of sent emails are redrafted
+• Templates may start with front-matter:
+
+      ---
+      mode: literal          # or generative (the default)
+      subject: Re: …         # optional, literal only
+      ---
+
+  A literal template is the finished email – it is filled in locally
+  (no model call, no tokens) and gets the same link/pixel handling.
 """
 
-import os, json, random, re
-from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
-from hubspot import HubSpot
-from hubspot.crm.contacts import ApiException
+from __future__ import annotations
+
+import os, random, re, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple
+
+from clients import ROOT, hubspot_client, hubspot_error, openai_client
 
-# ── env & clients ────────────────────────────────────────────────
-ROOT = Path(__file__).resolve().parent.parent           # project root
-load_dotenv(ROOT / ".env")
+from draft_cache import default_cache
+from metrics import span, count, record_tokens
+from ratelimit import TokenBucket, limiter, observe_headers, retry_after
+from contact_mirror import contact_mirror
 
-SENDER_NAME    = os.getenv("SENDER_NAME", "Matthias")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if TYPE_CHECKING:
+    from openai import OpenAI
 
-openai = OpenAI(api_key=OPENAI_API_KEY)
-hs     = HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"))
+# ── env (.env loaded by clients; clients are built on first use) ──
+SENDER_NAME = os.getenv("SENDER_NAME", "Matthias")
 
 PROMPT_DIR = ROOT / "prompts"          # e.g. prompts/first_touch_email.md
 WORKER_URL = "https://tracker.matthias-hendrichs.workers.dev"
 
+TEMPERATURE = 0.7
+MAX_TOKENS  = 180
+
+# batch drafting knobs (see draft_emails)
+DRAFT_CONCURRENCY = int(os.getenv("DRAFT_CONCURRENCY", 8))
+DRAFT_RETRIES     = int(os.getenv("DRAFT_RETRIES", 5))
+
+# vector memory knobs (memory.py – numpy – is only imported when GTM_MEMORY is on)
+MEMORY_ON            = os.getenv("GTM_MEMORY", "off").lower() not in ("", "off", "0", "false")
+MEMORY_FEWSHOT       = int(os.getenv("MEMORY_FEWSHOT", 2))
+MEMORY_DUP_THRESHOLD = float(os.getenv("MEMORY_DUP_THRESHOLD", 0.97))
+
 # ── helper -------------------------------------------------------
 def split_subject(body: str) -> tuple[str, str]:
     """
@@ -41,31 +70,99 @@ def split_subject(body: str) -> tuple[str, str]:
     return "", body
 
 
-def draft_email(props: dict, template: str = "first_touch_email.md") -> str:
-    """
-    Build prompt, call OpenAI, clean placeholders, guarantee ONE Calendly
-    link, append pixel, return the finished body (plain-text + HTML img tag).
-    """
-    # 1) build prompt & call OpenAI --------------------------------
-    prompt_raw = (PROMPT_DIR / template).read_text(encoding="utf-8")
-    prompt = prompt_raw.format(
-        first_name  = props.get("firstname", "there"),
-        job_title   = props.get("jobtitle",  ""),
-        company     = props.get("company",   "your firm"),
+class Template(NamedTuple):
+    mode: str               # "generative" | "literal"
+    meta: dict
+    body: str
+
+
+@lru_cache(maxsize=64)
+def _parse_template(path: str, mtime_ns: int) -> Template:
+    text = open(path, encoding="utf-8").read()
+    meta = {}
+    m = re.match(r"---[ \t]*\n(.*?)\n---[ \t]*\n", text, re.S)
+    if m and all(":" in line for line in m.group(1).splitlines() if line.strip()):
+        for line in m.group(1).splitlines():
+            k, _, v = line.partition(":")
+            if k.strip():
+                meta[k.strip().lower()] = v.split(" #", 1)[0].strip()
+        text = text[m.end():]
+    mode = meta.get("mode", "generative").lower()
+    if mode not in ("generative", "literal"):
+        raise ValueError(f"{path}: mode must be literal or generative, not {mode!r}")
+    return Template(mode, meta, text)
+
+
+def load_template(template: str) -> Template:
+    """Parsed prompts/<template>, cached until the file changes."""
+    path = PROMPT_DIR / template
+    return _parse_template(str(path), path.stat().st_mtime_ns)
+
+
+def is_literal(template: str) -> bool:
+    return load_template(template).mode == "literal"
+
+
+def _fields(props: dict) -> dict:
+    return dict(
+        first_name  = props.get("firstname") or "there",
+        job_title   = props.get("jobtitle")  or "",
+        company     = props.get("company")   or "your firm",
         sender_name = SENDER_NAME,
-        desk_type   = random.choice(["Asia Macro", "China Research"]),
-    )
-    
-    MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
-
-    resp  = openai.chat.completions.create(
-        model       = MODEL,
-        messages    = [{"role": "user", "content": prompt}],
-        temperature = 0.7,
-        max_tokens  = 180,
+        # seeded per contact so the prompt (and its cache key) is stable
+        desk_type   = random.Random(props.get("hs_object_id") or props.get("email"))
+                            .choice(["Asia Macro", "China Research"]),
     )
-    body: str = resp.choices[0].message.content.strip()
 
+
+def render_prompt(props: dict, template: str = "first_touch_email.md",
+                  examples: list[str] | None = None) -> str:
+    """Fill the template's placeholders from the contact's properties,
+    optionally followed by past emails to learn from."""
+    prompt = load_template(template).body.format(**_fields(props))
+    if examples:
+        prompt += ("\n\nPast emails that got replies – match their tone, don't copy them:\n"
+                   + "\n".join(f"---\n{e}" for e in examples) + "\n---")
+    return prompt
+
+
+def render_literal(props: dict, template: str) -> str:
+    """A literal template, filled in and finished locally – no model call.
+    A `subject:` from the front matter leads as a "Subject:" line (after
+    finish_body, which would drop it) for split_subject() to pick up."""
+    t = load_template(template)
+    fields = _fields(props)
+    body = finish_body(t.body.format(**fields).strip(), props)
+    if t.meta.get("subject"):
+        body = f"Subject: {t.meta['subject'].format(**fields)}\n{body}"
+    return body
+
+
+def model_name() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
+
+
+def complete(prompt: str, client: OpenAI | None = None, template: str | None = None) -> str:
+    """One chat-completion round-trip; returns the raw model text."""
+    with span("openai.chat", template=template or ""):
+        raw   = (client or openai_client()).chat.completions.with_raw_response.create(
+            model       = model_name(),
+            messages    = [{"role": "user", "content": prompt}],
+            temperature = TEMPERATURE,
+            max_tokens  = MAX_TOKENS,
+        )
+    observe_headers("openai", raw.headers)          # x-ratelimit-* → buckets
+    resp = raw.parse()
+    if resp.usage is not None:
+        record_tokens(template, resp.usage.prompt_tokens, resp.usage.completion_tokens)
+    return resp.choices[0].message.content.strip()
+
+
+def finish_body(body: str, props: dict) -> str:
+    """
+    Clean placeholders, guarantee ONE Calendly link and append the pixel
+    to raw model output.
+    """
     subject, body = split_subject(body)
 
     # 2) nuke any sender-name placeholders -------------------------
@@ -94,27 +191,184 @@ def draft_email(props: dict, template: str = "first_touch_email.md") -> str:
 
     return body
 
+
+def cached_complete(prompt: str, call=complete, bypass_cache: bool = False) -> str:
+    """call(prompt) unless the draft cache already holds this exact completion."""
+    cache = default_cache()
+    key   = cache.key(prompt, model_name(), TEMPERATURE, MAX_TOKENS)
+    if not bypass_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            count("draft_cache.hit")
+            return hit
+    count("draft_cache.miss")
+    text = call(prompt)
+    cache.put(key, text)
+    return text
+
+
+def draft_email(props: dict, template: str = "first_touch_email.md",
+                *, bypass_cache: bool = False) -> str:
+    """
+    Build prompt, call OpenAI, clean placeholders, guarantee ONE Calendly
+    link, append pixel, return the finished body (plain-text + HTML img tag).
+    Literal templates skip the model. Goes through the same rate limits and
+    retries as draft_emails().
+    """
+    if is_literal(template):
+        count("drafts.literal")
+        return render_literal(props, template)
+    prompt = render_prompt(props, template)
+    raw    = cached_complete(prompt, lambda p: _complete_with_retry(p, template), bypass_cache)
+    return finish_body(raw, props)
+
+# ── batch drafting ------------------------------------------------
+
+def _complete_with_retry(prompt: str, template: str | None = None,
+                         buckets: tuple[TokenBucket, TokenBucket] | None = None) -> str:
+    """complete() behind the request + token buckets, retrying 429/5xx with
+    Retry-After (shared by every caller) or full-jitter backoff."""
+    from openai import APIConnectionError, APIStatusError
+
+    client     = openai_client().with_options(max_retries=0)   # we own the retries
+    est_tokens = len(prompt) // 4 + MAX_TOKENS      # rough, errs high
+    requests, tokens = buckets or (limiter("openai"), limiter("openai-tokens"))
+    for attempt in range(DRAFT_RETRIES + 1):
+        requests.acquire()
+        tokens.acquire(est_tokens)
+        try:
+            return complete(prompt, client, template)
+        except (APIStatusError, APIConnectionError) as e:
+            status = getattr(e, "status_code", None)
+            if status is not None and status != 429 and status < 500:
+                raise                                # 4xx: don't retry
+            if attempt == DRAFT_RETRIES:
+                raise
+            count("openai.retries")
+            delay = retry_after(getattr(getattr(e, "response", None), "headers", None))
+            if delay is not None:
+                requests.backoff(delay)              # pause every drafting thread
+            else:
+                time.sleep(random.uniform(0, min(30, 2 ** attempt)))
+
+
+def draft_emails(
+    props_list: list[dict],
+    template: str = "first_touch_email.md",
+    *,
+    concurrency: int | None = None,
+    rpm: int | None = None,
+    tpm: int | None = None,
+    bypass_cache: bool = False,
+) -> list[str | None]:
+    """
+    draft_email() for many contacts at once on a worker pool.
+
+    Results come back in input order; a contact whose draft still fails
+    after DRAFT_RETRIES attempts gets None (and a printed error) so one bad
+    call doesn't sink the batch. Passing rpm/tpm uses private buckets,
+    otherwise all calls share the process-wide "openai" buckets.
+    Literal templates are rendered locally instead.
+    """
+    if is_literal(template):
+        count("drafts.literal", len(props_list))
+        return [render_literal(p, template) for p in props_list]
+
+    buckets = None
+    if rpm or tpm:
+        r, t = limiter("openai"), limiter("openai-tokens")
+        buckets = (TokenBucket("openai", rpm / 60, rpm) if rpm else r,
+                   TokenBucket("openai-tokens", tpm / 60, tpm) if tpm else t)
+
+    mem = None
+    if MEMORY_ON:
+        from memory import default_memory
+        mem = default_memory()
+    examples = _examples(mem, props_list, template) if mem else [None] * len(props_list)
+
+    def one(i: int, fresh: bool = False) -> str | None:
+        props = props_list[i]
+        try:
+            raw = cached_complete(
+                render_prompt(props, template, examples[i]),
+                lambda p: _complete_with_retry(p, template, buckets),   # cache hits skip the buckets
+                bypass_cache or fresh,
+            )
+            return finish_body(raw, props)
+        except Exception as e:
+            print(f"❌ Draft failed for {props.get('email') or props.get('hs_object_id')}: {e}")
+            return None
+
+    cache = default_cache()
+    hits0 = cache.hits
+    with ThreadPoolExecutor(max_workers=concurrency or DRAFT_CONCURRENCY) as pool:
+        out = list(pool.map(one, range(len(props_list))))
+        if mem is not None:
+            out = _redraft_near_duplicates(mem, out, lambda i: one(i, fresh=True), pool)
+    if cache.hits > hits0:
+        print(f"🗄  draft cache: {cache.hits - hits0}/{len(props_list)} served from cache")
+    return out
+
+
+def _examples(mem, props_list: list[dict], template: str) -> list[list[str] | None]:
+    """Best-matching past emails that earned a reply, per contact (one
+    embeddings call + one batched search for the whole list)."""
+    if not MEMORY_FEWSHOT or not props_list:
+        return [None] * len(props_list)
+    from memory import embed
+    try:
+        hits = mem.search(embed([render_prompt(p, template) for p in props_list]),
+                          k=MEMORY_FEWSHOT, role="sent", min_score=1)
+    except Exception as e:
+        print(f"⚠️  memory: no few-shot examples ({e})")
+        return [None] * len(props_list)
+    return [[h.content for h in row] or None for row in hits]
+
+
+def _duplicates(mem, bodies: list[str | None]) -> list[int]:
+    from memory import embed
+    idx = [i for i, b in enumerate(bodies) if b]
+    if not idx:
+        return []
+    hits = mem.search(embed([bodies[i] for i in idx]), k=1, role="sent")
+    return [i for i, row in zip(idx, hits)
+            if row and row[0].similarity >= MEMORY_DUP_THRESHOLD]
+
+
+def _redraft_near_duplicates(mem, out: list[str | None], redraft, pool) -> list[str | None]:
+    """Redraft (uncached) anything too close to an email we already sent;
+    drop it if the second attempt is still a near-duplicate."""
+    try:
+        dups = _duplicates(mem, out)
+        if not dups:
+            return out
+        count("memory.near_duplicates", len(dups))
+        print(f"♻️  {len(dups)} draft(s) too close to past emails – redrafting")
+        for i, body in zip(dups, pool.map(redraft, dups)):
+            out[i] = body
+        still = _duplicates(mem, [out[i] for i in dups])
+    except Exception as e:
+        print(f"⚠️  memory: duplicate check skipped ({e})")
+        return out
+    for j in still:
+        out[dups[j]] = None
+    if still:
+        count("memory.rejected", len(still))
+        print(f"🚫 {len(still)} draft(s) rejected as near-duplicates")
+    return out
+
 # ── demo run (top-3 contacts) ------------------------------------
 
 def main():
     try:
-        page = hs.crm.contacts.basic_api.get_page(
-            limit=100,
-            properties=["email", "firstname", "lastname",
-                        "jobtitle", "company", "fit_score"],
-        )
-    except ApiException as e:
+        contact_mirror().sync(hubspot_client())
+    except hubspot_error() as e:
         print("❌ HubSpot API error:", e)
         return
 
-    contacts = sorted(
-        page.results,
-        key=lambda c: int(c.properties.get("fit_score") or 0),
-        reverse=True,
-    )[:3]
-
-    for c in contacts:
-        body = draft_email(c.properties)          # default first-touch
+    contacts = contact_mirror().top_k(3)
+    bodies = draft_emails([c.properties for c in contacts])   # default first-touch
+    for c, body in zip(contacts, bodies):
         print("---\nTo:", c.properties.get("email"))
         print(body)
         print()
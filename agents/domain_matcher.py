@@ -0,0 +1,91 @@
+"""Compiled substring matcher for ICP company signals.
+
+signal_ranker used to test every signal against every domain
+(O(contacts × signals)). DomainMatcher builds an Aho-Corasick automaton
+over the normalised signals once, so scoring a domain is one pass over
+its characters no matter how many signals there are, and memoises the
+result per domain because most contacts share a handful of domains.
+
+Matching keeps the ranker's old semantics: a signal hits when its
+lower-cased, space-free form is a substring of the domain, and the
+earliest-listed signal wins.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable
+
+
+def normalize_signal(s: str) -> str:
+    return s.lower().replace(" ", "")
+
+
+class DomainMatcher:
+    def __init__(self, signals: Iterable[str]):
+        self.signals = [normalize_signal(s) for s in signals]
+        # trie: goto[node] = {char: node}; out[node] = best (lowest) signal index
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[int | None] = [None]
+        for idx, sig in enumerate(self.signals):
+            if sig:
+                self._add(sig, idx)
+        self._link()
+        self._memo: dict[str, int | None] = {}
+
+    def _add(self, word: str, idx: int) -> None:
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+            node = nxt
+        if self._out[node] is None or idx < self._out[node]:
+            self._out[node] = idx
+
+    def _link(self) -> None:
+        """BFS fail links; each node's output = min over its suffix chain."""
+        q = deque(self._goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                inherited = self._out[self._fail[nxt]]
+                if inherited is not None and (self._out[nxt] is None or inherited < self._out[nxt]):
+                    self._out[nxt] = inherited
+                q.append(nxt)
+
+    def match(self, domain: str) -> int | None:
+        """Index of the earliest-listed signal found in `domain`, else None."""
+        if domain in self._memo:
+            return self._memo[domain]
+        best, node = None, 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in domain:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = out[node]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+                if best == 0:
+                    break
+        self._memo[domain] = best
+        return best
+
+    def score(self, domain: str) -> int:
+        """fit_score for a domain: 100 for the first signal, -10 per rank after."""
+        idx = self.match(domain) if domain else None
+        return 0 if idx is None else 100 - idx * 10
+
+    def score_many(self, domains: Iterable[str]) -> list[int]:
+        return [self.score(d) for d in domains]
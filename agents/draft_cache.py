@@ -0,0 +1,177 @@
+"""Content-addressed cache for LLM drafts.
+
+Key = sha256 of (rendered prompt, model, temperature, max_tokens), so the
+same contact + template + model never pays for a second completion.
+Two tiers: an in-memory LRU in front of a SQLite file that survives
+crashes and re-runs. Entries expire after DRAFT_CACHE_TTL seconds and the
+file is trimmed to DRAFT_CACHE_MAX rows, least-recently-used first.
+
+The same file remembers in-flight Batch API jobs by a hash of their input
+(batch_drafts.py), so a run restarted mid-wait resumes the job instead of
+paying for it again.
+
+Env
+  DRAFT_CACHE        "off" disables reads and writes (bypass)
+  DRAFT_CACHE_PATH   default .cache/drafts.sqlite under the project root
+  DRAFT_CACHE_TTL    seconds, default 7 days
+  DRAFT_CACHE_MAX    rows kept on disk, default 50 000
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from clients import ROOT, _once
+
+
+class DraftCache:
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+        lru_size: int = 1024,
+        enabled: bool | None = None,
+    ):
+        self.enabled = (os.getenv("DRAFT_CACHE", "on").lower() not in ("0", "off", "false")
+                        if enabled is None else enabled)
+        self.ttl = float(ttl if ttl is not None else os.getenv("DRAFT_CACHE_TTL", 7 * 86400))
+        self.max_entries = int(max_entries or os.getenv("DRAFT_CACHE_MAX", 50_000))
+        self.lru_size = lru_size
+        self.hits = self.misses = 0
+
+        self._lru: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db: sqlite3.Connection | None = None
+        if self.enabled:
+            path = Path(path or os.getenv("DRAFT_CACHE_PATH", ROOT / ".cache" / "drafts.sqlite"))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS drafts ("
+                " key TEXT PRIMARY KEY, body TEXT NOT NULL,"
+                " created REAL NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS drafts_used ON drafts(used)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " input TEXT PRIMARY KEY, batch_id TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+        blob = json.dumps([prompt, model, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    # ── lookups ──────────────────────────────────────────────────
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit and now - hit[1] < self.ttl:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+
+            row = self._db.execute(
+                "SELECT body, created FROM drafts WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._db.execute("UPDATE drafts SET used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, body: str) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO drafts(key, body, created, used) VALUES (?, ?, ?, ?)",
+                (key, body, now, now),
+            )
+            self._db.commit()
+            self._remember(key, body, now)
+            self._puts += 1
+            if self._puts % 500 == 0:
+                self._evict(now)
+
+    def _remember(self, key: str, body: str, created: float) -> None:
+        self._lru[key] = (body, created)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    # ── in-flight batch jobs ─────────────────────────────────────
+    def pending_batch(self, input_hash: str) -> str | None:
+        """Batch id submitted earlier for this exact input, if not finished."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT batch_id FROM batches WHERE input = ?",
+                                   (input_hash,)).fetchone()
+        return row[0] if row else None
+
+    def save_batch(self, input_hash: str, batch_id: str) -> None:
+        if self.enabled:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO batches VALUES (?, ?, ?)",
+                                 (input_hash, batch_id, time.time()))
+                self._db.commit()
+
+    def drop_batch(self, batch_id: str) -> None:
+        """Forget a batch once its results are in the cache."""
+        if self.enabled:
+            with self._lock:
+                self._db.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+                self._db.commit()
+
+    # ── housekeeping ─────────────────────────────────────────────
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM drafts WHERE created < ?", (now - self.ttl,))
+        self._db.execute("DELETE FROM batches WHERE created < ?", (now - 2 * 86400,))  # 24 h window
+        self._db.execute(
+            "DELETE FROM drafts WHERE key IN ("
+            " SELECT key FROM drafts ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def evict(self) -> None:
+        """Drop expired rows and trim to max_entries (LRU)."""
+        if self.enabled:
+            with self._lock:
+                self._evict(time.time())
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.evict()
+            self._db.close()
+            self._db = None
+            self.enabled = False
+
+
+@_once
+def default_cache() -> DraftCache:
+    """Process-wide cache, opened on first use."""
+    return DraftCache()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Push endpoint for open/click events from the tracking worker.
+
+The worker POSTs batches to /events instead of (or as well as) writing
+KV keys:
+
+    POST /events   Authorization: Bearer $INGEST_TOKEN
+    [{"type": "open", "cid": "134368", "ts": 1748500000}, "click:1748500001:134368", …]
+
+(events as objects or as the KV key string, optionally wrapped in
+{"events": [...]}). A batch is acknowledged with 202 as soon as it is in
+the in-memory queue; workers alert from there in the background. The
+queue is bounded: a batch that doesn't fit gets 429 + Retry-After and
+nothing of it is taken, so the worker retries it whole (or leaves it in
+KV). Duplicates – worker retries, or the same event pushed and also left
+in KV – are dropped by key, and handled events' KV keys are bulk-deleted
+every DELETE_EVERY s, so a restart doesn't alert (or log) them again
+from KV.
+
+The KV poller (open_click_watcher.py) keeps running to catch up on
+whatever wasn't pushed: every 60 s until the first push arrives, then
+every KV_FALLBACK_INTERVAL s.
+
+The listener defaults to localhost; for the tracking worker to reach it,
+set INGEST_HOST and INGEST_TOKEN. serve() refuses a non-loopback host
+without a token (anyone could inject opens/clicks, which feed engagement
+scoring), and run.py's supervisor only uses push mode once a token is set.
+
+    GET /healthz   queue depth and counters
+
+Env
+  INGEST_HOST / INGEST_PORT   default 127.0.0.1:8787
+  INGEST_TOKEN                shared secret (unset = no auth, loopback hosts only)
+  INGEST_QUEUE                max queued events (default 10 000)
+  INGEST_WORKERS              concurrent alert workers (default WATCHER_WORKERS)
+  INGEST_MAX_BATCH            max events per POST (default 1 000)
+  KV_FALLBACK_INTERVAL        seconds between KV catch-up polls once pushes arrive (default 300)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+import open_click_watcher as kv
+from metrics import span, count
+
+HOST          = os.getenv("INGEST_HOST", "127.0.0.1")
+PORT          = int(os.getenv("INGEST_PORT", 8787))
+TOKEN         = os.getenv("INGEST_TOKEN")
+QUEUE_SIZE    = int(os.getenv("INGEST_QUEUE", 10_000))
+WORKERS       = int(os.getenv("INGEST_WORKERS", kv.WORKERS))
+MAX_BATCH     = int(os.getenv("INGEST_MAX_BATCH", 1000))
+KV_FALLBACK_INTERVAL = float(os.getenv("KV_FALLBACK_INTERVAL", 300))
+DELETE_EVERY  = 2.0          # seconds between KV bulk deletes of handled keys
+
+KINDS = ("open", "click")
+
+
+def event_key(ev) -> str | None:
+    """Normalise one pushed event to its KV key form "open:<ts>:<cid>"."""
+    if isinstance(ev, str):
+        parts = ev.split(":")
+        if len(parts) == 3 and parts[0] in KINDS and all(parts):
+            return ev
+        return None
+    if isinstance(ev, dict):
+        kind, cid, ts = ev.get("type"), ev.get("cid"), ev.get("ts")
+        if kind in KINDS and cid not in (None, "") and ts not in (None, ""):
+            return f"{kind}:{ts}:{cid}"
+    return None
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:                  # a hostname, or "" / "0.0.0.0"-style wildcards
+        return False
+
+
+def create_app(handle=kv.alert, queue_size: int = QUEUE_SIZE,
+               workers: int = WORKERS, delete=kv.delete_keys) -> FastAPI:
+    """The ingest app; `handle(key)` runs on a worker thread per event and
+    `delete(keys)` removes handled keys from KV in batches."""
+    stats = {"accepted": 0, "duplicates": 0, "invalid": 0, "rejected": 0,
+             "handled": 0, "failed": 0}
+    handled: list[str] = []                     # KV keys to delete
+
+    async def worker(q: asyncio.Queue):
+        while True:
+            key = await q.get()
+            try:
+                with span("ingest.handle"):
+                    await asyncio.to_thread(handle, key)
+                kv.HANDLED.done(key)
+                handled.append(key)
+                stats["handled"] += 1
+                count("events.handled")
+            except Exception as e:
+                kv.HANDLED.release(key)                 # KV fallback / a retry gets it
+                stats["failed"] += 1
+                print(f"⚠️  event {key} failed: {e}")
+            finally:
+                q.task_done()
+
+    async def flush_deletes():
+        if not handled:
+            return
+        keys = handled[:]
+        del handled[:len(keys)]
+        try:
+            await asyncio.to_thread(delete, keys)
+        except Exception as e:                  # KV catch-up deletes them later
+            print(f"⚠️  ingest: deleting {len(keys)} handled key(s) from KV failed: {e}")
+
+    async def deleter():
+        while True:
+            await asyncio.sleep(DELETE_EVERY)
+            await flush_deletes()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        q = app.state.queue = asyncio.Queue(maxsize=queue_size)
+        tasks = [asyncio.create_task(worker(q)) for _ in range(workers)]
+        tasks.append(asyncio.create_task(deleter()))
+        yield
+        try:
+            await asyncio.wait_for(q.join(), timeout=10)      # drain what we acked
+        except asyncio.TimeoutError:
+            print(f"⚠️  ingest: {q.qsize()} event(s) not handled at shutdown")
+        for t in tasks:
+            t.cancel()
+        await flush_deletes()
+
+    app = FastAPI(title="gtm event ingest", lifespan=lifespan)
+    app.state.pushed = threading.Event()        # set once the tracker has pushed
+
+    @app.post("/events")
+    async def ingest(request: Request):
+        if TOKEN and request.headers.get("authorization") != f"Bearer {TOKEN}":
+            return JSONResponse({"error": "unauthorized"}, status_code=401)
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "body must be JSON"}, status_code=400)
+        events = body.get("events") if isinstance(body, dict) else body
+        if not isinstance(events, list):
+            return JSONResponse({"error": "expected a list of events"}, status_code=400)
+        if len(events) > MAX_BATCH:
+            return JSONResponse({"error": f"at most {MAX_BATCH} events per request"},
+                                status_code=413)
+
+        q: asyncio.Queue = request.app.state.queue
+        keys = [event_key(ev) for ev in events]
+        if q.maxsize - q.qsize() < len(keys):              # all or nothing
+            stats["rejected"] += len(keys)
+            count("ingest.rejected", len(keys))
+            return JSONResponse({"error": "queue full", "queued": q.qsize()},
+                                status_code=429, headers={"Retry-After": "1"})
+        app.state.pushed.set()
+        accepted = duplicates = invalid = 0
+        for key in keys:
+            if key is None:
+                invalid += 1
+            elif not kv.HANDLED.claim(key):
+                duplicates += 1
+            else:
+                q.put_nowait(key)
+                accepted += 1
+        stats["accepted"] += accepted
+        stats["duplicates"] += duplicates
+        stats["invalid"] += invalid
+        count("ingest.accepted", accepted)
+        return JSONResponse({"accepted": accepted, "duplicates": duplicates,
+                             "invalid": invalid}, status_code=202)
+
+    @app.get("/healthz")
+    async def healthz(request: Request):
+        q: asyncio.Queue = request.app.state.queue
+        return {"queued": q.qsize(), "capacity": q.maxsize, **stats}
+
+    return app
+
+
+def serve(stop: threading.Event | None = None, host: str = HOST, port: int = PORT,
+          app: FastAPI | None = None):
+    """Run the ingest server in this thread until `stop` is set."""
+    if not TOKEN and not is_loopback(host):
+        raise RuntimeError(f"refusing to serve unauthenticated /events on {host}; "
+                           "set INGEST_TOKEN (or bind to 127.0.0.1)")
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app or create_app(), host=host, port=port,
+                                           log_level="warning", access_log=False))
+    if stop is not None:
+        def watch():
+            stop.wait()
+            server.should_exit = True
+        threading.Thread(target=watch, daemon=True, name="ingest-stop").start()
+    print(f"📥 event ingest listening on http://{host}:{port}/events")
+    try:
+        server.run()
+    except SystemExit:                  # uvicorn exits the process if it can't bind
+        raise RuntimeError(f"event ingest could not start on {host}:{port}") from None
+
+
+def run(stop: threading.Event | None = None):
+    """Ingest server plus the KV catch-up poller, until `stop` is set."""
+    done = threading.Event()            # ours: also ends the poller if the server dies
+
+    def relay():
+        while not done.is_set():
+            if stop is not None and stop.wait(0.5):
+                done.set()
+            elif stop is None:
+                done.wait()
+
+    threading.Thread(target=relay, daemon=True, name="ingest-relay").start()
+    app = create_app()
+    interval = lambda: KV_FALLBACK_INTERVAL if app.state.pushed.is_set() else kv.INTERVAL
+    poller = threading.Thread(target=kv.run, args=(done, interval),
+                              daemon=True, name="kv-fallback")
+    poller.start()
+    try:
+        serve(done, app=app)
+    finally:
+        done.set()
+        poller.join(timeout=15)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,200 @@
+"""Append-only log of engagement events: opens, clicks, replies.
+
+The watchers used to alert and forget; now every event is also appended
+here so signal_ranker can score on engagement. Storage is columnar, one
+fixed-width file per field under EVENTS_DIR:
+
+    ts.u4     event time, unix seconds (uint32)
+    cid.u8    HubSpot contact id (uint64)
+    kind.u1   0 open · 1 click · 2 reply
+
+Appends are plain stdlib writes (no numpy in the watchers) under a file
+lock, so several processes can log to the same directory; a torn tail
+after a crash is cut back to the last whole row on open. Reads memmap
+the columns, and aggregate() computes per-contact counts, last-seen time
+and a decayed engagement score in a handful of vectorised passes – a
+million events for 100k contacts is a few tens of ms.
+
+    record_event("click", "134368", 1748500001)
+    eng = engagement()                          # None until anything is logged
+    eng.points(["134368", "99"])                # fit_score bonus per contact
+
+Env
+  EVENTS_DIR            default .cache/events
+  EVENT_HALF_LIFE_DAYS  engagement half-life (default 14)
+  ENGAGEMENT_WEIGHT     fit_score points per unit of decayed engagement (default 10, 0 = off)
+  ENGAGEMENT_MAX        cap on the bonus (default 50)
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+
+from clients import ROOT, _once
+from metrics import span, count
+
+if TYPE_CHECKING:
+    import numpy as np
+
+KINDS   = ("open", "click", "reply")
+WEIGHTS = (1.0, 3.0, 5.0)                # per event, before decay
+
+HALF_LIFE_DAYS    = float(os.getenv("EVENT_HALF_LIFE_DAYS", 14))
+ENGAGEMENT_WEIGHT = float(os.getenv("ENGAGEMENT_WEIGHT", 10))
+ENGAGEMENT_MAX    = int(os.getenv("ENGAGEMENT_MAX", 50))
+
+# column name → (array typecode, numpy dtype, bytes per row)
+COLUMNS = {"ts": ("I", "=u4", 4), "cid": ("Q", "=u8", 8), "kind": ("B", "u1", 1)}
+
+
+def _seconds(ts) -> int:
+    """Unix seconds from seconds or milliseconds (the tracker sends either)."""
+    ts = int(float(ts))
+    return ts // 1000 if ts > 10 ** 11 else ts
+
+
+def _ids(contact_ids: Iterable) -> np.ndarray:
+    """Contact ids as uint64; non-numeric ids become 0 (never logged)."""
+    import numpy as np
+
+    def one(c):
+        try:
+            return int(c)
+        except (TypeError, ValueError):
+            return 0
+    return np.fromiter((one(c) for c in contact_ids), np.uint64)
+
+
+class Engagement(NamedTuple):
+    """Per-contact aggregates, one row per contact with events (sorted by id)."""
+    cids: np.ndarray          # uint64
+    counts: np.ndarray        # (n, len(KINDS)) int64
+    last_ts: np.ndarray       # uint32, most recent event
+    score: np.ndarray         # float64, sum of WEIGHTS × 2^(-age / half-life)
+
+    def rows(self, contact_ids: Iterable) -> np.ndarray:
+        """Row of each contact in these arrays, -1 if it has no events."""
+        import numpy as np
+        ids = _ids(contact_ids)
+        pos = np.searchsorted(self.cids, ids)
+        pos[pos >= len(self.cids)] = 0
+        hit = (self.cids[pos] == ids) & (ids != 0) if len(self.cids) else np.zeros(len(ids), bool)
+        return np.where(hit, pos, -1)
+
+    def points(self, contact_ids: Iterable, weight: float = ENGAGEMENT_WEIGHT,
+               cap: int = ENGAGEMENT_MAX) -> np.ndarray:
+        """fit_score bonus for each contact (int, 0 without events)."""
+        import numpy as np
+        rows = self.rows(contact_ids)
+        score = np.where(rows >= 0, self.score[np.maximum(rows, 0)], 0.0)
+        return np.minimum(cap, np.rint(score * weight)).astype(np.int64)
+
+
+class EventStore:
+    def __init__(self, path: str | Path | None = None):
+        self.dir = Path(path or os.getenv("EVENTS_DIR", ROOT / ".cache" / "events"))
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._paths = {name: self.dir / f"{name}.{dt.lstrip('=')}"
+                       for name, (_, dt, _) in COLUMNS.items()}
+        self._lock = threading.Lock()
+        with self._locked():
+            n = self._rows()
+            for name, (_, _, width) in COLUMNS.items():     # cut a torn tail
+                p = self._paths[name]
+                if p.exists() and p.stat().st_size != n * width:
+                    with open(p, "r+b") as f:
+                        f.truncate(n * width)
+
+    @contextmanager
+    def _locked(self):
+        """Thread + inter-process lock around appends."""
+        with self._lock, open(self.dir / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _rows(self) -> int:
+        return min((self._paths[name].stat().st_size // width if self._paths[name].exists() else 0)
+                   for name, (_, _, width) in COLUMNS.items())
+
+    def __len__(self) -> int:
+        return self._rows()
+
+    def append(self, kinds: Iterable[str], contact_ids: Iterable, timestamps: Iterable) -> int:
+        """Log a batch of events; rows with an unknown kind or a non-numeric
+        contact id are skipped. Returns how many were written."""
+        cols = {name: array(code) for name, (code, _, _) in COLUMNS.items()}
+        for kind, cid, ts in zip(kinds, contact_ids, timestamps):
+            try:
+                k, c, t = KINDS.index(kind), int(cid), _seconds(ts)
+            except (ValueError, TypeError, OverflowError):
+                count("events.unloggable")
+                continue
+            cols["kind"].append(k)
+            cols["cid"].append(c)
+            cols["ts"].append(t)
+        n = len(cols["kind"])
+        if n:
+            with self._locked():
+                for name in ("ts", "cid", "kind"):          # kind last: a row exists once it lands
+                    with open(self._paths[name], "ab") as f:
+                        cols[name].tofile(f)
+            count("events.logged", n)
+        return n
+
+    def record(self, kind: str, contact_id, ts=None) -> bool:
+        return self.append([kind], [contact_id], [time.time() if ts is None else ts]) == 1
+
+    def columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ts, cid, kind) as read-only memmaps over the rows written so far."""
+        import numpy as np
+        n = self._rows()
+        return tuple(np.memmap(self._paths[name], dt, "r", shape=(n,)) if n else np.empty(0, dt)
+                     for name, (_, dt, _) in COLUMNS.items())
+
+    def aggregate(self, now: float | None = None,
+                  half_life_days: float = HALF_LIFE_DAYS) -> Engagement:
+        """Counts per kind, last event time and decayed score for every contact."""
+        import numpy as np
+        now = time.time() if now is None else now
+        with span("events.aggregate"):
+            ts, cid, kind = self.columns()
+            cids, inv = np.unique(cid, return_inverse=True)
+            n = len(cids)
+            counts = np.bincount(inv * len(KINDS) + kind, minlength=n * len(KINDS)
+                                 ).reshape(n, len(KINDS))
+            last = np.zeros(n, np.uint32)
+            np.maximum.at(last, inv, ts)
+            age = np.maximum(0.0, now - ts.astype(np.float64)) / (half_life_days * 86400)
+            weight = np.asarray(WEIGHTS)[kind] * np.exp2(-age)
+            score = np.bincount(inv, weights=weight, minlength=n)
+        return Engagement(cids, counts, last, score)
+
+
+# ── process-wide access ──────────────────────────────────────────
+@_once
+def event_store() -> EventStore:
+    return EventStore()
+
+
+def record_event(kind: str, contact_id, ts=None) -> bool:
+    """Append one event to the shared log (False if it couldn't be parsed)."""
+    return event_store().record(kind, contact_id, ts)
+
+
+def engagement(now: float | None = None) -> Engagement | None:
+    """Aggregates over the whole log, or None while it's empty or the
+    bonus is switched off (numpy isn't even imported then)."""
+    store = event_store()
+    if ENGAGEMENT_WEIGHT <= 0 or not len(store):
+        return None
+    return store.aggregate(now)
@@ -1,101 +1,117 @@
 #!/usr/bin/env python3
 """
 Send follow-up emails:
-  • D+3  → prompts/followup_1.md
-  • D+7  → prompts/followup_2.md
+  • D+3 after the first touch  → prompts/followup_1.md
+  • D+7 after the first touch  → prompts/followup_2.md
+
+One range scan over the mirror's last_emailed index buckets every due
+contact by step at once. last_emailed is the previous email's date, so
+each step is due its offset minus the previous step's offset after it
+(follow-up 2: 4 days after follow-up 1). A contact's position in the
+sequence comes from its `followup_step` property (stamped on each send)
+or the outbox history. A step is due from its day until
+FOLLOWUP_CATCHUP_DAYS later, so a missed run (downtime, a weekend) is
+caught up on the next one instead of skipped.
+
+Contacts emailed before followup_step existed have neither; whatever the
+old sequencer last sent them is unknown, so they are taken to be at step
+FOLLOWUP_LEGACY_STEP (default: sequence finished – nobody gets a
+follow-up twice) and that step is stamped on them the first time they
+come up. Set it to 0 if the old code only ever sent first touches.
+
+Follow-ups go out from the mailbox that sent the contact's first touch
+(gtm_sender / outbox history, see mailboxes.py).
+
+FOLLOWUP_DRAFT_MODE=batch drafts each step through the OpenAI Batch API
+(batch_drafts.py) – slower to start, half the price; meant for nightly runs.
 """
 
-import os, time, json
+import os
 from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
-from hubspot import HubSpot
-from hubspot.crm.contacts import ApiException
-
-from sequencer import send_email, stamp_last_emailed      # helpers you already have
-from copy_crafter import draft_email, split_subject
 
-load_dotenv()
-hs = HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"))
+from sequencer import deliver                            # helpers you already have
+from clients import hubspot_client
+from contact_mirror import contact_mirror
+from hs_writer import close_shared_writer, shared_writer
+from mailboxes import close_mailbox_pool
+from metrics import span
+from outbox import default_outbox
 
-STEPS = [
+STEPS = [                 # (days after the first touch, template)
     (3, "followup_1.md"),
     (7, "followup_2.md"),
 ]
+CATCHUP_DAYS = int(os.getenv("FOLLOWUP_CATCHUP_DAYS", 7))
+LEGACY_STEP  = int(os.getenv("FOLLOWUP_LEGACY_STEP", len(STEPS)))
+BATCH_MODE   = os.getenv("FOLLOWUP_DRAFT_MODE", "sync").lower() == "batch"
 
 def cutoff_date(days: int) -> str:
     """YYYY-MM-DD in UTC for 'days' ago."""
     return (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d")
 
-def search_contacts(days: int):
-    """HubSpot sometimes rejects date EQ; fall back to paginated get_page."""
-    date_str = cutoff_date(days)
+def gap(step: int) -> int:
+    """Days between the previous email and follow-up `step` (1-based)."""
+    return STEPS[step - 1][0] - (STEPS[step - 2][0] if step > 1 else 0)
 
-    # 1️⃣ try Search API with plain dict
-    body = {
-        "filterGroups": [
-            {
-                "filters": [
-                    {
-                        "propertyName": "last_emailed",
-                        "operator": "EQ",
-                        "value": date_str,
-                    }
-                ]
-            }
-        ],
-        "properties": ["email", "firstname", "jobtitle", "company", "fit_score"],
-        "limit": 100,
-    }
+def steps_done(contact, history: set[str]) -> int | None:
+    """How many follow-ups this contact has had (0 = only the first touch);
+    None for a contact emailed before followup_step was stamped."""
+    step = contact.properties.get("followup_step")
+    done = None
+    if step not in (None, ""):
+        try:
+            done = int(step)
+        except ValueError:
+            done = 0
+    for i, (_, tmpl) in enumerate(STEPS, 1):
+        if tmpl in history:
+            done = max(done or 0, i)
+    if done is None and history:                              # first touch in the outbox
+        done = 0
+    return done
 
-    try:
-        res = hs.crm.contacts.search_api.do_search(body)
-        return res.results
-    except ApiException as e:
-        if e.status != 400:
-            raise
-        print("⚠️  HubSpot search 400 – falling back to paginated get_page")
-
-    # 2️⃣ fallback: pull pages of 100 until exhausted
-    all_results = []
-    after = None
-    while True:
-        page = hs.crm.contacts.basic_api.get_page(
-            limit=100,
-            after=after,
-            properties=[
-                "email", "firstname", "jobtitle",
-                "company", "fit_score", "last_emailed"
-            ],
-        )
-        all_results.extend(page.results)
-
-        next_page = getattr(page.paging, "next", None)
-        if next_page and next_page.after:
-            after = next_page.after
-        else:
-            break
-
-    # 3️⃣ filter to target date
-    return [
-        c for c in all_results
-        if c.properties.get("last_emailed") == date_str
-    ]
+def due_contacts() -> dict[int, list]:
+    """{step number: contacts due for it}, from a single mirror range query."""
+    gaps = [gap(i) for i in range(1, len(STEPS) + 1)]
+    rows = contact_mirror().emailed_between(cutoff_date(max(gaps) + CATCHUP_DAYS),
+                                            cutoff_date(min(gaps)))
+    history = default_outbox().steps_sent(c.id for c in rows)
+    due = {i: [] for i in range(1, len(STEPS) + 1)}
+    legacy = []
+    for c in rows:
+        done = steps_done(c, history.get(c.id, set()))
+        if done is None:
+            legacy.append(c.id)
+            done = LEGACY_STEP
+        if done >= len(STEPS):
+            continue                                          # sequence finished
+        days = gap(done + 1)
+        if cutoff_date(days + CATCHUP_DAYS) <= c.properties["last_emailed"] <= cutoff_date(days):
+            due[done + 1].append(c)
+    if legacy:                                                # seed once, in HubSpot
+        print(f"🛈 {len(legacy)} contacts without followup_step – taken as step {LEGACY_STEP}")
+        writer = shared_writer(hubspot_client())
+        for cid in legacy:
+            writer.update(cid, {"followup_step": str(LEGACY_STEP)})
+    return due
 
 def main():
-    for days, tmpl in STEPS:
-        contacts = search_contacts(days)
-        print(f"🛈 {len(contacts)} contacts due for day +{days}")
-
-        for c in contacts:
-            email = c.properties.get("email")
-            if not email:
-                continue
+    try:
+        run_steps()
+    finally:
+        close_mailbox_pool()                                  # one SMTP session per run
+        close_shared_writer()                                 # flush last_emailed stamps
 
-            raw  = draft_email(c.properties, template=tmpl)   # full text from GPT
-            subject, body = split_subject(raw)                # strip Subject: line
-            send_email(email, body, subject_hint=subject) 
-            stamp_last_emailed(c.id)
-            time.sleep(2)
+def run_steps():
+    with span("followup.sync"):
+        contact_mirror().sync(hubspot_client())                             # incremental
+    with span("followup.select"):
+        due = due_contacts()
+    for step, (days, tmpl) in enumerate(STEPS, 1):
+        print(f"🛈 {len(due[step])} contacts due for {tmpl} (day +{days}, "
+              f"{gap(step)} days after the previous email, up to {CATCHUP_DAYS} days late)")
+        deliver(due[step], template=tmpl, split=True,  # outbox skips repeats
+                batch=BATCH_MODE)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,52 @@
+"""Streaming reads over the whole HubSpot contact portal.
+
+iter_contacts() follows every `paging.next.after` cursor and yields
+contacts one at a time, so callers never hold more than a page;
+top_k_by_fit_score() keeps only the k best on a heap – for a one-off
+pass straight over the portal; the agents select from the local mirror
+(ContactMirror.top_k), which keeps the same ranking in an index.
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Iterable, Iterator
+
+from clients import contacts_api
+from metrics import span
+from ratelimit import call
+
+PAGE_LIMIT = 100           # HubSpot's max page size for basic_api.get_page
+
+
+def iter_contacts(hs, properties: list[str] | None = None,
+                  page_size: int = PAGE_LIMIT) -> Iterator:
+    """Yield every contact in the portal, requesting only `properties`."""
+    after = None
+    while True:
+        with span("hubspot.get_page"):
+            page = call(
+                "hubspot", contacts_api("basic", hs).get_page,
+                limit=min(page_size, PAGE_LIMIT),
+                after=after,
+                properties=properties,
+            )
+        yield from page.results
+
+        next_page = getattr(page.paging, "next", None) if page.paging else None
+        if next_page and next_page.after:
+            after = next_page.after
+        else:
+            return
+
+
+def fit_score(contact) -> int:
+    try:
+        return int(float(contact.properties.get("fit_score") or 0))
+    except ValueError:
+        return 0
+
+
+def top_k_by_fit_score(k: int, contacts: Iterable) -> list:
+    """The k highest-fit_score contacts, best first, in O(k) memory."""
+    return heapq.nlargest(k, contacts, key=fit_score)
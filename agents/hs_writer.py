@@ -0,0 +1,139 @@
+"""Write-behind buffer for HubSpot contact property updates.
+
+Agents call `update(contact_id, {...})` as often as they like; updates for
+the same contact are merged and shipped through the CRM batch-update
+endpoint, 100 contacts per call, when the buffer fills, every
+`flush_interval` seconds, and on close()/interpreter exit.
+
+Whole-batch failures (429/5xx) are retried by the HubSpot rate limiter; contacts a batch
+still rejects are retried one by one, and whatever keeps failing ends up
+in `failed` ({contact_id: reason}).
+
+    w = shared_writer(hs)
+    w.update(cid, {"fit_score": "80"})
+    ...
+    failed = w.close()
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+
+from clients import contacts_api, hubspot_error
+from metrics import span, count
+from ratelimit import call
+
+BATCH_LIMIT = 100          # HubSpot's max inputs per batch call
+
+
+class ContactWriter:
+    def __init__(self, hs, batch_size: int = BATCH_LIMIT,
+                 flush_interval: float = 5.0, retries: int = 3):
+        self.hs = hs
+        self.batch_size = min(batch_size, BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self.retries = retries
+
+        self.failed: dict[str, str] = {}
+        self.written = self.calls = 0
+
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()          # guards _pending
+        self._send_lock = threading.Lock()     # one flush at a time, in order
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._tick, daemon=True)
+        self._timer.start()
+
+    # ── producer side ────────────────────────────────────────────
+    def update(self, contact_id: str, props: dict) -> None:
+        with self._lock:
+            self._pending.setdefault(str(contact_id), {}).update(props)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _tick(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            if self._pending:
+                self.flush()
+
+    # ── flushing ─────────────────────────────────────────────────
+    def flush(self) -> None:
+        with self._send_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for i in range(0, len(items), self.batch_size):
+                self._send_batch(items[i:i + self.batch_size])
+
+    def _send_batch(self, items: list[tuple[str, dict]]) -> None:
+        from hubspot.crm.contacts import (BatchInputSimplePublicObjectBatchInput,
+                                          SimplePublicObjectBatchInput)
+        body = BatchInputSimplePublicObjectBatchInput(inputs=[
+            SimplePublicObjectBatchInput(id=cid, properties=props) for cid, props in items
+        ])
+        try:
+            self.calls += 1
+            with span("hubspot.batch_update"):
+                resp = call("hubspot", contacts_api("batch", self.hs).update,
+                            batch_input_simple_public_object_batch_input=body,
+                            retries=self.retries)       # 429/5xx retried by the limiter
+        except hubspot_error() as e:
+            print(f"⚠️  Batch update of {len(items)} contacts failed ({e.status}) – retrying one by one")
+            self._send_each(items)
+            return
+
+        done = {r.id for r in (resp.results or [])}
+        self.written += len(done)
+        for cid in done:
+            self.failed.pop(cid, None)
+        leftovers = [(cid, props) for cid, props in items if cid not in done]
+        if leftovers:
+            self._send_each(leftovers)
+
+    def _send_each(self, items: list[tuple[str, dict]]) -> None:
+        from hubspot.crm.contacts import SimplePublicObjectInput
+        for cid, props in items:
+            try:
+                self.calls += 1
+                with span("hubspot.update"):
+                    call("hubspot", contacts_api("basic", self.hs).update,
+                         cid, simple_public_object_input=SimplePublicObjectInput(properties=props))
+                self.written += 1
+                self.failed.pop(cid, None)
+            except hubspot_error() as e:
+                self.failed[cid] = f"{e.status} {e.reason}"
+                count("hubspot.update_failed")
+
+    # ── shutdown ─────────────────────────────────────────────────
+    def close(self) -> dict[str, str]:
+        """Stop the timer, flush what's left and return {contact_id: reason} failures."""
+        self._stop.set()
+        self.flush()
+        return dict(self.failed)
+
+
+_shared: ContactWriter | None = None
+
+
+def shared_writer(hs) -> ContactWriter:
+    """One writer per process so every agent's updates coalesce together."""
+    global _shared
+    if _shared is None:
+        _shared = ContactWriter(hs)
+        atexit.register(_shared.close)
+    return _shared
+
+
+def close_shared_writer() -> dict[str, str]:
+    """Flush the shared writer (if any), print a summary and return failures."""
+    global _shared
+    if _shared is None:
+        return {}
+    w, _shared = _shared, None
+    failed = w.close()
+    print(f"✔ HubSpot: {w.written} contacts written in {w.calls} API calls")
+    for cid, reason in failed.items():
+        print(f"❌ Failed to update {cid}: {reason}")
+    return failed
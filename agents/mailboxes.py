@@ -0,0 +1,257 @@
+"""Several sending mailboxes behind one pool, with per-account quotas.
+
+config/mailboxes.json (MAILBOXES_PATH) lists the accounts:
+
+    [
+      {"user": "matthias@bilby.ai", "password_env": "SMTP_PASS_MATTHIAS",
+       "daily": 400, "hourly": 60, "rate": "30/1m:1"},
+      {"user": "research@bilby.ai", "password_env": "SMTP_PASS_RESEARCH",
+       "host": "smtp.office365.com", "port": 587, "imap_host": "outlook.office365.com"}
+    ]
+
+Per account (defaults from .env): host/port/ssl (SMTP_*), imap_host/
+imap_port (IMAP_*), pool_size (SMTP_POOL_SIZE), senders (threads,
+SEND_WORKERS), daily and hourly quota (0 = none), rate (pacing, RATE_SMTP).
+Without the file the single SMTP_USER / SMTP_PASS mailbox is used, with
+no quota – same as before.
+
+Routing: a contact goes to the mailbox its last email came from (the
+gtm_sender property / outbox history); new contacts are spread by
+rendezvous hashing on the contact id, so assignments are stable and
+adding an account only moves that account's share. If the chosen
+account is out of daily quota, or down (login refused, connect failed),
+the next account in the contact's hash order takes it; when every
+account is out, the contact is left for the next run – before anything
+is drafted for it.
+
+gtm_sender is a custom single-line text contact property – create it in
+HubSpot before configuring a second mailbox. The sequencer writes it
+only when more than one mailbox is configured (or STAMP_SENDER=on).
+
+The daily quota is counted from the outbox (sent in the last 24 h plus
+queued) and reserved as contacts are routed; a reservation is released
+when the contact's draft or send fails for good, and moves with the
+message when it fails over to another account. Hourly quota and pacing are
+token buckets per account, so one account's senders wait while the
+others keep sending.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Callable
+
+from clients import ROOT                            # also loads .env
+from metrics import span, count
+from outbox import Deferred
+from ratelimit import TokenBucket
+from smtp_pool import SMTPPool
+
+MAILBOXES_PATH = Path(os.getenv("MAILBOXES_PATH", ROOT / "config" / "mailboxes.json"))
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_SSL  = os.getenv("SMTP_SSL", "1" if SMTP_PORT == 465 else "0") == "1"
+SMTP_POOL_SIZE       = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_MAX_PER_SESSION = int(os.getenv("SMTP_MAX_PER_SESSION", 90))
+SEND_WORKERS         = int(os.getenv("SEND_WORKERS", SMTP_POOL_SIZE))
+
+
+class MailboxUnavailable(RuntimeError):
+    pass
+
+
+# the account itself is unusable (not this message) → fail over
+_DOWN = (MailboxUnavailable, smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused,
+         smtplib.SMTPConnectError, ConnectionRefusedError, socket.gaierror)
+
+
+class Mailbox:
+    def __init__(self, cfg: dict):
+        self.user = cfg.get("user") or ""
+        env = cfg.get("password_env")
+        self.password = os.getenv(env) if env else cfg.get("password")
+        self._missing = (f"no password for mailbox {self.user} (set {env})" if env
+                         else "SMTP_USER / SMTP_PASS not set in .env")
+        self.host = cfg.get("host", SMTP_HOST)
+        self.port = int(cfg.get("port", SMTP_PORT))
+        self.ssl = bool(cfg["ssl"]) if "ssl" in cfg else (SMTP_SSL if "port" not in cfg
+                                                          else self.port == 465)
+        self.imap_host = cfg.get("imap_host", os.getenv("IMAP_HOST", "imap.gmail.com"))
+        self.imap_port = int(cfg.get("imap_port", os.getenv("IMAP_PORT", 993)))
+        self.pool_size = int(cfg.get("pool_size", SMTP_POOL_SIZE))
+        self.senders = int(cfg.get("senders", SEND_WORKERS if "pool_size" not in cfg
+                                   else self.pool_size))
+        self.daily = int(cfg.get("daily", 0))
+        hourly = int(cfg.get("hourly", 0))
+        self.pace = TokenBucket.from_spec(f"smtp.{self.user}",
+                                          cfg.get("rate") or os.getenv("RATE_SMTP") or "30/1m:1")
+        self.hourly = TokenBucket(f"smtp.{self.user}.hourly", hourly / 3600, hourly) if hourly else None
+        self.down: str | None = None if self.user and self.password else self._missing
+        self.sent = 0
+        self._pool: SMTPPool | None = None
+        self._lock = threading.Lock()
+
+    def pool(self) -> SMTPPool:
+        with self._lock:
+            if self._pool is None:
+                if not (self.user and self.password):
+                    raise MailboxUnavailable(self._missing)
+                self._pool = SMTPPool(
+                    self.host, self.port, self.user, self.password,
+                    size=self.pool_size, max_per_session=SMTP_MAX_PER_SESSION,
+                    use_ssl=self.ssl,
+                )
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+
+def load_mailboxes(path: Path = MAILBOXES_PATH) -> list[Mailbox]:
+    if path.exists():
+        cfgs = json.loads(path.read_text(encoding="utf-8"))
+        if not cfgs:
+            raise ValueError(f"{path}: no mailboxes configured")
+        return [Mailbox(c) for c in cfgs]
+    return [Mailbox({"user": os.getenv("SMTP_USER"), "password": os.getenv("SMTP_PASS")})]
+
+
+def _score(user: str, contact_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{user}|{contact_id}".encode(),
+                                          digest_size=8).digest(), "big")
+
+
+class MailboxPool:
+    def __init__(self, boxes: list[Mailbox]):
+        for b in boxes:
+            if b.down:
+                print(f"⚠️  mailbox {b.user or '(.env)'} not usable: {b.down}")
+        self.boxes = {b.user: b for b in boxes}
+        self._used = {b.user: 0 for b in boxes}            # daily, incl. reservations
+        self._lock = threading.Lock()
+
+    def load_usage(self, outbox) -> None:
+        """Start the daily counts / hourly buckets from what the outbox has sent."""
+        now = time.time()
+        day, hour = outbox.usage(now - 86400), outbox.usage(now - 3600)
+        with self._lock:
+            for user, b in self.boxes.items():
+                self._used[user] = day.get(user, 0)
+                if b.hourly:
+                    b.hourly.observe(max(0, b.hourly.burst - hour.get(user, 0)))
+
+    def lanes(self) -> dict[str, int]:
+        """{mailbox: sender threads} for outbox.run_pipeline."""
+        return {u: b.senders for u, b in self.boxes.items()}
+
+    def order(self, contact_id: str) -> list[Mailbox]:
+        """This contact's mailboxes, most preferred first (rendezvous hashing)."""
+        return sorted(self.boxes.values(), key=lambda b: _score(b.user, contact_id), reverse=True)
+
+    def _available(self, b: Mailbox) -> bool:
+        return b.down is None and (not b.daily or self._used[b.user] < b.daily)
+
+    def assign(self, contact_id: str, prefer: str | None = None,
+               exclude: set[str] = frozenset()) -> str | None:
+        """Pick (and reserve a daily slot on) the mailbox for this contact;
+        None when every mailbox is down or out of quota."""
+        boxes = self.order(str(contact_id))
+        if prefer in self.boxes:                           # sticky: same sender as before
+            boxes.sort(key=lambda b: b.user != prefer)
+        with self._lock:
+            for b in boxes:
+                if b.user not in exclude and self._available(b):
+                    self._used[b.user] += 1
+                    return b.user
+        count("mailboxes.over_quota")
+        return None
+
+    def release(self, sender: str) -> None:
+        """Give back a daily slot reserved by assign() that won't be sent."""
+        with self._lock:
+            if self._used.get(sender, 0) > 0:
+                self._used[sender] -= 1
+
+    def send(self, sender: str, contact_id: str,
+             build: Callable[[str], EmailMessage]) -> str:
+        """Send build(from_addr) through `sender`, failing over along the
+        contact's order if that mailbox is down; returns the mailbox used.
+
+        The caller's slot on `sender` is kept unless the message goes out
+        from another mailbox, whose slot (taken on failover) it then uses."""
+        original, held = sender, None              # held: slot taken on failover
+        box, tried = self.boxes.get(sender), set()
+        try:
+            while True:
+                if box is None or box.down is not None:
+                    tried.add(sender)
+                    if held:
+                        self.release(held)
+                        held = None
+                    sender = self.assign(contact_id, exclude=tried)
+                    if sender is None:
+                        raise Deferred("no mailbox left to send from (all down or over quota)")
+                    held = sender
+                    count("mailboxes.failover")
+                    box = self.boxes[sender]
+                if box.hourly:
+                    box.hourly.acquire()
+                box.pace.acquire()
+                try:
+                    with span("smtp.send"):
+                        box.pool().send(build(box.user))
+                except _DOWN as e:
+                    if box.down is None:
+                        box.down = str(e)
+                        count("mailboxes.down")
+                        print(f"⚠️  mailbox {box.user} is down ({e}) – failing over")
+                    continue
+                box.sent += 1
+                if held:
+                    self.release(original)
+                    held = None
+                return box.user
+        finally:
+            if held:
+                self.release(held)
+
+    def summary(self) -> str:
+        return ", ".join(f"{u or 'default'} {b.sent}" + (" (down)" if b.down else "")
+                         for u, b in self.boxes.items())
+
+    def close(self) -> None:
+        for b in self.boxes.values():
+            b.close()
+
+
+_default: MailboxPool | None = None
+_default_lock = threading.Lock()
+
+
+def mailbox_pool() -> MailboxPool:
+    """Process-wide pool from config/mailboxes.json (or SMTP_USER / SMTP_PASS)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = MailboxPool(load_mailboxes())
+        return _default
+
+
+def close_mailbox_pool() -> None:
+    global _default
+    with _default_lock:
+        if _default is not None:
+            _default.close()
+            _default = None
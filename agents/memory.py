@@ -0,0 +1,376 @@
+"""Vector memory of sent emails and received replies.
+
+Every sent draft and every reply is embedded (text-embedding-3-small) and
+stored with its role ("sent" / "reply"), the contact's email (`ref`), the
+template and a `score` – the number of replies the email earned. Two
+stores behind one interface:
+
+  PgVectorStore  the `agent_memory` table from scripts/db_smoke.py
+                 (DATABASE_URL, pgvector's <=> cosine operator, HNSW index)
+  NumpyIndex     local/offline: L2-normalised float32 rows in a memmap'd
+                 file plus a SQLite sidecar; search() is one batched
+                 matrix product per chunk of rows with argpartition top-k,
+                 so 25 queries × 300k rows is a few BLAS calls, not a loop
+
+copy_crafter uses it to reject near-duplicate drafts and to show the model
+past emails that got replies as few-shot examples.
+
+    GTM_MEMORY        off (default) | numpy | pgvector | auto (pgvector if
+                      DATABASE_URL has the extension, else numpy)
+    MEMORY_DIR        numpy index location (default .cache/memory)
+    EMBED_MODEL       default text-embedding-3-small
+    EMBED_DIM         default 1536 (the agent_memory column width)
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from clients import ROOT, openai_client
+from metrics import span, count
+from ratelimit import limiter
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIM   = int(os.getenv("EMBED_DIM", 1536))
+EMBED_BATCH = 512                # inputs per embeddings call (API max 2048)
+SEARCH_CHUNK = 65_536            # rows per matrix product in NumpyIndex.search
+
+
+class Hit(NamedTuple):
+    id: int
+    role: str
+    content: str
+    ref: str | None
+    template: str | None
+    score: float
+    similarity: float
+
+
+def embed(texts: Sequence[str], client=None) -> np.ndarray:
+    """(len(texts), EMBED_DIM) float32, L2-normalised."""
+    client = client or openai_client()
+    out = []
+    for i in range(0, len(texts), EMBED_BATCH):
+        chunk = [t or " " for t in texts[i:i + EMBED_BATCH]]
+        limiter("openai").acquire()
+        limiter("openai-tokens").acquire(sum(len(t) for t in chunk) // 4)
+        kw = {"dimensions": EMBED_DIM} if EMBED_DIM != 1536 else {}
+        with span("openai.embed"):
+            resp = client.embeddings.create(model=EMBED_MODEL, input=chunk, **kw)
+        out.extend(d.embedding for d in sorted(resp.data, key=lambda d: d.index))
+    return _normalise(np.asarray(out, dtype=np.float32).reshape(-1, EMBED_DIM))
+
+
+def _normalise(v: np.ndarray) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.maximum(norms, 1e-12)
+
+
+# ── local index ──────────────────────────────────────────────────
+class NumpyIndex:
+    def __init__(self, path: str | Path | None = None, dim: int = EMBED_DIM):
+        self.dir = Path(path or os.getenv("MEMORY_DIR", ROOT / ".cache" / "memory"))
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self._vec_path = self.dir / "vectors.f32"
+        self._db = sqlite3.connect(self.dir / "meta.sqlite", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS memory (
+                idx      INTEGER PRIMARY KEY,      -- row in vectors.f32
+                role     TEXT NOT NULL,
+                content  TEXT NOT NULL,
+                ref      TEXT,
+                template TEXT,
+                score    REAL NOT NULL DEFAULT 0,
+                created  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_memory_ref ON memory(ref, role);
+        """)
+        with self._locked():                  # not while another process is mid-add
+            rows = self._db.execute("SELECT role, score FROM memory ORDER BY idx").fetchall()
+            n_vec = self._vec_path.stat().st_size // (4 * dim) if self._vec_path.exists() else 0
+            n = min(len(rows), n_vec)         # drop a half-written tail after a crash
+            if n_vec > n:
+                with open(self._vec_path, "r+b") as f:
+                    f.truncate(n * 4 * dim)
+            if len(rows) > n:
+                self._db.execute("DELETE FROM memory WHERE idx >= ?", (n,))
+                self._db.commit()
+                rows = rows[:n]
+        self._codes: dict[str, int] = {}
+        self._roles = np.array([self._code(r) for r, _ in rows], dtype=np.int16)
+        self._scores = np.array([s for _, s in rows], dtype=np.float32)
+        self._mm: np.memmap | None = None
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def _code(self, role: str) -> int:
+        return self._codes.setdefault(role, len(self._codes))
+
+    @contextmanager
+    def _locked(self):
+        """Thread + inter-process lock: `send` and `watch-replies` run as
+        separate processes appending to the same files."""
+        with self._lock, open(self.dir / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Pick up rows other processes added since we last looked (under _lock)."""
+        rows = self._db.execute("SELECT role, score FROM memory WHERE idx >= ? ORDER BY idx",
+                                (len(self),)).fetchall()
+        if rows:
+            self._roles = np.concatenate(
+                [self._roles, np.array([self._code(r) for r, _ in rows], np.int16)])
+            self._scores = np.concatenate(
+                [self._scores, np.array([sc for _, sc in rows], np.float32)])
+
+    def _matrix(self) -> np.ndarray:
+        n = len(self)
+        if self._mm is None or self._mm.shape[0] != n:
+            self._mm = (np.memmap(self._vec_path, np.float32, "r", shape=(n, self.dim))
+                        if n else np.empty((0, self.dim), np.float32))
+        return self._mm
+
+    def add(self, role: str, texts: Sequence[str], vectors: np.ndarray,
+            refs: Sequence[str | None] | None = None,
+            templates: Sequence[str | None] | None = None) -> None:
+        vectors = _normalise(vectors)
+        refs = refs or [None] * len(texts)
+        templates = templates or [None] * len(texts)
+        with self._locked():
+            self._refresh()
+            # next row from the table, not our count; a tail some crashed
+            # writer left without metadata is overwritten
+            start = self._db.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM memory").fetchone()[0]
+            now = time.time()
+            with open(self._vec_path, "ab") as f:
+                if f.tell() != start * 4 * self.dim:
+                    f.truncate(start * 4 * self.dim)
+                f.write(vectors.tobytes())
+            self._db.executemany(
+                "INSERT INTO memory (idx, role, content, ref, template, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(start + i, role, t, r, tp, now)
+                 for i, (t, r, tp) in enumerate(zip(texts, refs, templates))],
+            )
+            self._db.commit()
+            self._roles = np.concatenate(
+                [self._roles, np.full(len(texts), self._code(role), np.int16)])
+            self._scores = np.concatenate([self._scores, np.zeros(len(texts), np.float32)])
+
+    def mark_replied(self, ref: str) -> int:
+        with self._lock:
+            self._refresh()
+            idx = [r[0] for r in self._db.execute(
+                "SELECT idx FROM memory WHERE ref = ? AND role = 'sent'", (ref,))]
+            if idx:
+                self._db.execute(
+                    "UPDATE memory SET score = score + 1 WHERE ref = ? AND role = 'sent'", (ref,))
+                self._db.commit()
+                self._scores[idx] += 1
+        return len(idx)
+
+    def search(self, queries: np.ndarray, k: int = 5, role: str | None = None,
+               min_score: float | None = None) -> list[list[Hit]]:
+        """Top-k cosine matches for every query row, best first."""
+        with self._lock:
+            self._refresh()
+        q = _normalise(np.atleast_2d(queries))
+        m, n = q.shape[0], len(self)
+        if not n or k <= 0:
+            return [[] for _ in range(m)]
+        mask = np.ones(n, bool)
+        if role is not None:
+            mask &= self._roles[:n] == self._codes.get(role, -1)
+        if min_score is not None:
+            mask &= self._scores[:n] >= min_score
+        M = self._matrix()
+        # a selective filter (e.g. only emails that got replies) gathers just
+        # those rows; otherwise scan contiguous slices and mask afterwards
+        sel = np.flatnonzero(mask)
+        sparse = len(sel) < n // 4
+        total = len(sel) if sparse else n
+        best_s = np.full((m, 0), -np.inf, np.float32)
+        best_i = np.zeros((m, 0), np.int64)
+        with span("memory.search", rows=total):
+            for lo in range(0, total, SEARCH_CHUNK):
+                hi = min(total, lo + SEARCH_CHUNK)
+                if sparse:
+                    rows = sel[lo:hi]
+                    sims = q @ M[rows].T                      # (m, chunk)
+                else:
+                    rows = np.arange(lo, hi)
+                    sims = q @ M[lo:hi].T
+                    if not mask[lo:hi].all():
+                        sims[:, ~mask[lo:hi]] = -np.inf
+                s = np.concatenate([best_s, sims], axis=1)
+                i = np.concatenate([best_i, np.broadcast_to(rows, sims.shape)], axis=1)
+                if s.shape[1] > k:
+                    top = np.argpartition(-s, k - 1, axis=1)[:, :k]
+                    s, i = np.take_along_axis(s, top, 1), np.take_along_axis(i, top, 1)
+                best_s, best_i = s, i
+        order = np.argsort(-best_s, axis=1)
+        best_s, best_i = np.take_along_axis(best_s, order, 1), np.take_along_axis(best_i, order, 1)
+        wanted = {int(x) for x, s in zip(best_i.ravel(), best_s.ravel()) if np.isfinite(s)}
+        meta = self._meta(wanted)
+        return [[Hit(*meta[int(x)], similarity=float(s))
+                 for x, s in zip(row_i, row_s) if np.isfinite(s)]
+                for row_i, row_s in zip(best_i, best_s)]
+
+    def _meta(self, idx: set[int]) -> dict[int, tuple]:
+        out, ids = {}, list(idx)
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                q = (f"SELECT idx, role, content, ref, template, score FROM memory"
+                     f" WHERE idx IN ({','.join('?' * len(chunk))})")
+                out.update((r[0], r) for r in self._db.execute(q, chunk))
+        return out
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# ── pgvector ─────────────────────────────────────────────────────
+class PgVectorStore:
+    """agent_memory(role, content, embedding vector(1536)) + our extra columns."""
+
+    def __init__(self, url: str | None = None):
+        import sqlalchemy                                  # only needed for pgvector
+        from sqlalchemy import text
+        self._text = text
+        self.engine = sqlalchemy.create_engine(url or os.environ["DATABASE_URL"],
+                                               pool_pre_ping=True)
+        with self.engine.begin() as conn:
+            for ddl in (
+                "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS ref TEXT",
+                "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS template TEXT",
+                "ALTER TABLE agent_memory ADD COLUMN IF NOT EXISTS score REAL NOT NULL DEFAULT 0",
+                "CREATE INDEX IF NOT EXISTS agent_memory_ref ON agent_memory (ref, role)",
+            ):
+                conn.execute(text(ddl))
+        try:                                               # pgvector ≥ 0.5
+            with self.engine.begin() as conn:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS agent_memory_embedding_hnsw"
+                                  " ON agent_memory USING hnsw (embedding vector_cosine_ops)"))
+        except Exception as e:
+            print(f"⚠️  memory: no HNSW index ({e.__class__.__name__}) – exact scans")
+
+    @staticmethod
+    def available(url: str | None) -> bool:
+        if not url:
+            return False
+        try:
+            import sqlalchemy
+            eng = sqlalchemy.create_engine(url)
+            with eng.connect() as conn:
+                return conn.execute(sqlalchemy.text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'vector'")).first() is not None
+        except Exception:
+            return False
+
+    def __len__(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(self._text("SELECT COUNT(*) FROM agent_memory")).scalar_one()
+
+    def add(self, role, texts, vectors, refs=None, templates=None) -> None:
+        refs = refs or [None] * len(texts)
+        templates = templates or [None] * len(texts)
+        with self.engine.begin() as conn:
+            conn.execute(self._text(
+                "INSERT INTO agent_memory (role, content, embedding, ref, template)"
+                " VALUES (:r, :c, CAST(:e AS vector), :ref, :t)"
+            ), [{"r": role, "c": t, "e": v.tolist(), "ref": r, "t": tp}
+                for t, v, r, tp in zip(texts, _normalise(vectors), refs, templates)])
+
+    def mark_replied(self, ref: str) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(self._text(
+                "UPDATE agent_memory SET score = score + 1 WHERE ref = :ref AND role = 'sent'"
+            ), {"ref": ref}).rowcount
+
+    def search(self, queries, k=5, role=None, min_score=None) -> list[list[Hit]]:
+        where, args = [], {"k": k}
+        if role is not None:
+            where.append("role = :role"); args["role"] = role
+        if min_score is not None:
+            where.append("score >= :min_score"); args["min_score"] = min_score
+        sql = self._text(
+            "SELECT id, role, content, ref, template, score,"
+            " 1 - (embedding <=> CAST(:q AS vector)) AS sim FROM agent_memory"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+        )
+        out = []
+        with span("memory.search"), self.engine.connect() as conn:   # one connection for the batch
+            for q in _normalise(np.atleast_2d(queries)):
+                rows = conn.execute(sql, {**args, "q": q.tolist()}).all()
+                out.append([Hit(r[0], r[1], r[2], r[3], r[4], float(r[5] or 0), float(r[6]))
+                            for r in rows])
+        return out
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+
+# ── process-wide memory ──────────────────────────────────────────
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def default_memory():
+    """The configured store, or None when GTM_MEMORY is off."""
+    global _memory
+    mode = os.getenv("GTM_MEMORY", "off").lower()
+    if mode in ("", "off", "0", "false"):
+        return None
+    with _memory_lock:
+        if _memory is None:
+            url = os.getenv("DATABASE_URL")
+            if mode == "pgvector" or (mode == "auto" and PgVectorStore.available(url)):
+                _memory = PgVectorStore(url)
+            else:
+                _memory = NumpyIndex()
+        return _memory
+
+
+def remember(role: str, texts: list[str], refs: list[str | None] | None = None,
+             templates: list[str | None] | None = None) -> None:
+    """Embed and store `texts`; never raises (memory is best-effort)."""
+    mem = default_memory()
+    if mem is None or not texts:
+        return
+    try:
+        mem.add(role, texts, embed(texts), refs, templates)
+        count(f"memory.{role}", len(texts))
+    except Exception as e:
+        print(f"⚠️  memory: could not store {len(texts)} {role} item(s): {e}")
+
+
+def record_reply(sender: str, subject: str) -> None:
+    """Store a reply and credit the emails we sent to that address."""
+    mem = default_memory()
+    if mem is None:
+        return
+    remember("reply", [subject], [sender])
+    try:
+        mem.mark_replied(sender)
+    except Exception as e:
+        print(f"⚠️  memory: could not credit reply from {sender}: {e}")
@@ -0,0 +1,226 @@
+"""Timing spans, counters and token accounting for the agents.
+
+    from metrics import span, count, record_tokens
+
+    with span("openai.chat"):
+        ...
+    count("draft_cache.hit")
+    record_tokens("followup_1.md", prompt_tokens=412, completion_tokens=96)
+
+Off unless GTM_METRICS is set, in which case span()/count() are a flag
+check returning a shared no-op. GTM_METRICS is a comma list of sinks:
+
+  json   write .cache/metrics.json at exit (METRICS_DIR to move it)
+  prom   write .cache/metrics.prom (Prometheus text format) at exit
+  otel   also emit OpenTelemetry spans + histograms (configure the SDK /
+         exporter the usual way, e.g. opentelemetry-instrument)
+  print  print a p50/p95 table at exit
+
+Token cost is estimated when OPENAI_PRICE_IN / OPENAI_PRICE_OUT (USD per
+1M tokens) are set; "batch:<template>" rows (Batch API) are billed at
+OPENAI_BATCH_DISCOUNT (default 0.5) of that.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from clients import ROOT                            # also loads .env
+
+SINKS = {s.strip() for s in os.getenv("GTM_METRICS", "").lower().split(",") if s.strip()}
+ENABLED = bool(SINKS)
+
+RESERVOIR = 4096            # latency samples kept per stage
+
+_lock     = threading.Lock()
+_stages: dict[str, "_Stage"] = {}
+_counters: dict[str, float] = {}
+_tokens: dict[str, list[int]] = {}          # template -> [calls, prompt, completion]
+
+_tracer = _hist = None
+if ENABLED and "otel" in SINKS:
+    try:
+        from opentelemetry import trace as _otel_trace, metrics as _otel_metrics
+        _tracer = _otel_trace.get_tracer("gtm-agents")
+        _hist = _otel_metrics.get_meter("gtm-agents").create_histogram(
+            "gtm.stage.duration", unit="s", description="latency per agent stage")
+    except ImportError:
+        print("⚠️  GTM_METRICS=otel but opentelemetry is not installed")
+
+
+class _Stage:
+    __slots__ = ("n", "total", "samples")
+
+    def __init__(self):
+        self.n, self.total, self.samples = 0, 0.0, []
+
+    def add(self, dt: float) -> None:
+        self.n += 1
+        self.total += dt
+        if len(self.samples) < RESERVOIR:
+            self.samples.append(dt)
+        else:                                         # reservoir sampling
+            j = random.randrange(self.n)
+            if j < RESERVOIR:
+                self.samples[j] = dt
+
+    def pct(self, q: float) -> float:
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "t0", "otel")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name, self.attrs, self.otel = name, attrs, None
+
+    def __enter__(self):
+        if _tracer is not None:
+            self.otel = _tracer.start_as_current_span(self.name, attributes=self.attrs)
+            self.otel.__enter__()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        with _lock:
+            st = _stages.get(self.name)
+            if st is None:
+                st = _stages[self.name] = _Stage()
+            st.add(dt)
+            if exc[0] is not None:
+                _counters[self.name + ".errors"] = _counters.get(self.name + ".errors", 0) + 1
+        if _hist is not None:
+            _hist.record(dt, {"stage": self.name})
+        if self.otel is not None:
+            self.otel.__exit__(*exc)
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing one stage; near-free when metrics are off."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def count(name: str, n: float = 1) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def record_tokens(template: str | None, prompt_tokens: int, completion_tokens: int) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        t = _tokens.setdefault(template or "-", [0, 0, 0])
+        t[0] += 1
+        t[1] += prompt_tokens or 0
+        t[2] += completion_tokens or 0
+
+
+# ── export ────────────────────────────────────────────────────────
+def snapshot() -> dict:
+    price_in  = float(os.getenv("OPENAI_PRICE_IN", 0) or 0)
+    price_out = float(os.getenv("OPENAI_PRICE_OUT", 0) or 0)
+    discount  = float(os.getenv("OPENAI_BATCH_DISCOUNT", 0.5))
+    with _lock:
+        return {
+            "stages": {
+                name: {
+                    "count": st.n,
+                    "total_s": round(st.total, 6),
+                    "p50_ms": round(st.pct(0.50) * 1000, 3),
+                    "p95_ms": round(st.pct(0.95) * 1000, 3),
+                }
+                for name, st in sorted(_stages.items())
+            },
+            "counters": dict(sorted(_counters.items())),
+            "tokens": {
+                tpl: {
+                    "calls": c, "prompt": p, "completion": o,
+                    "cost_usd": round((p * price_in + o * price_out) / 1e6
+                                      * (discount if tpl.startswith("batch:") else 1), 6),
+                }
+                for tpl, (c, p, o) in sorted(_tokens.items())
+            },
+        }
+
+
+def prometheus_text() -> str:
+    snap, out = snapshot(), []
+    out.append("# TYPE gtm_stage_seconds summary")
+    for name, s in snap["stages"].items():
+        lbl = f'stage="{name}"'
+        out.append(f'gtm_stage_seconds{{{lbl},quantile="0.5"}} {s["p50_ms"] / 1000}')
+        out.append(f'gtm_stage_seconds{{{lbl},quantile="0.95"}} {s["p95_ms"] / 1000}')
+        out.append(f"gtm_stage_seconds_sum{{{lbl}}} {s['total_s']}")
+        out.append(f"gtm_stage_seconds_count{{{lbl}}} {s['count']}")
+    out.append("# TYPE gtm_events_total counter")
+    for name, v in snap["counters"].items():
+        out.append(f'gtm_events_total{{name="{name}"}} {v}')
+    out.append("# TYPE gtm_tokens_total counter")
+    for tpl, t in snap["tokens"].items():
+        out.append(f'gtm_tokens_total{{template="{tpl}",kind="prompt"}} {t["prompt"]}')
+        out.append(f'gtm_tokens_total{{template="{tpl}",kind="completion"}} {t["completion"]}')
+    return "\n".join(out) + "\n"
+
+
+def report() -> str:
+    snap = snapshot()
+    lines = [f"{'stage':<28}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}"]
+    for name, s in snap["stages"].items():
+        lines.append(f"{name:<28}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['total_s']:>10.2f}")
+    for name, v in snap["counters"].items():
+        lines.append(f"{name:<28}{v:>7g}")
+    for tpl, t in snap["tokens"].items():
+        lines.append(f"tokens {tpl:<21}{t['calls']:>7}  in {t['prompt']}  out {t['completion']}"
+                     + (f"  ${t['cost_usd']:.4f}" if t["cost_usd"] else ""))
+    return "\n".join(lines)
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _tokens.clear()
+
+
+def flush() -> None:
+    """Write the enabled file sinks (also runs at interpreter exit)."""
+    if not ENABLED or not (_stages or _counters or _tokens):
+        return
+    out_dir = Path(os.getenv("METRICS_DIR", ROOT / ".cache"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if "json" in SINKS:
+        (out_dir / "metrics.json").write_text(json.dumps(snapshot(), indent=2))
+    if "prom" in SINKS:
+        (out_dir / "metrics.prom").write_text(prometheus_text())
+    if "print" in SINKS:
+        print(report())
+
+
+if ENABLED:
+    atexit.register(flush)
@@ -0,0 +1,172 @@
+"""Slack notifications, coalesced and sent off the callers' threads.
+
+The watchers used to POST one webhook per event, inline: a burst of opens
+stalled them on Slack, ran into the webhook's rate limit, and the
+resulting "watcher error" went to Slack as well. Now notify() only puts
+the event on a bounded queue and returns. One background thread collects
+whatever arrives within NOTIFY_WINDOW seconds of the first event and
+posts it as a single message over the pooled HTTP session:
+
+    👀 12 opens, 🔗 3 clicks, 📬 1 reply in the last 30 s
+    📬 ↩️  Reply from jane@citadel.com – Re: idea
+    🔗 Click by CID 134368
+    …
+
+A window with a single event is posted as that event's own line. Posting
+goes through the "slack" rate-limit bucket (RATE_SLACK, honours 429
+Retry-After); a failed post is printed and counted, never notified again.
+Pending events are flushed at exit.
+
+    from notify import notify
+    notify("open", "👀 Open by CID 134368")
+
+Env
+  SLACK_WEBHOOK        incoming-webhook URL (unset = nothing is posted)
+  NOTIFY_WINDOW        seconds to coalesce (default 30, 0 = one message per event)
+  NOTIFY_QUEUE         max pending events (default 10 000; overflow is dropped and counted)
+  NOTIFY_DIGEST_LINES  event lines quoted under a digest's summary (default 10)
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from clients import http_session                    # also loads .env
+from metrics import span, count
+from ratelimit import request
+
+SLACK_URL    = os.getenv("SLACK_WEBHOOK")
+WINDOW       = float(os.getenv("NOTIFY_WINDOW", 30))
+QUEUE_SIZE   = int(os.getenv("NOTIFY_QUEUE", 10_000))
+DIGEST_LINES = int(os.getenv("NOTIFY_DIGEST_LINES", 10))
+
+# kind → (emoji, singular, plural); digest order, most important lines first
+KINDS = {
+    "reply": ("📬", "reply", "replies"),
+    "error": ("⚠️", "error", "errors"),
+    "click": ("🔗", "click", "clicks"),
+    "open":  ("👀", "open", "opens"),
+}
+SUMMARY_ORDER = ("open", "click", "reply", "error")
+
+_STOP = object()
+
+
+def digest(events: list[tuple[str, str]], window: float = WINDOW) -> str:
+    """One Slack message for [(kind, text), …] collected in a window."""
+    if len(events) == 1:
+        return events[0][1]
+    kinds = Counter(k for k, _ in events)
+    order = [k for k in SUMMARY_ORDER if k in kinds] + sorted(set(kinds) - set(SUMMARY_ORDER))
+    parts = []
+    for k in order:
+        emoji, one, many = KINDS.get(k, ("•", k, k + "s"))
+        parts.append(f"{emoji} {kinds[k]} {one if kinds[k] == 1 else many}")
+    head = ", ".join(parts) + (f" in the last {window:g} s" if window else "")
+
+    rank = {k: i for i, k in enumerate(KINDS)}
+    lines = Counter()                                   # identical lines (repeated errors) once
+    for k, text in sorted(events, key=lambda e: rank.get(e[0], len(rank))):
+        lines[text] += 1
+    shown = [t + (f" (×{n})" if n > 1 else "") for t, n in list(lines.items())[:DIGEST_LINES]]
+    if len(lines) > DIGEST_LINES:
+        shown.append(f"… and {len(lines) - DIGEST_LINES} more")
+    return "\n".join([head, *shown])
+
+
+class Notifier:
+    def __init__(self, url: str | None = SLACK_URL, window: float = WINDOW,
+                 maxsize: int = QUEUE_SIZE):
+        self.url, self.window = url, window
+        self._q: queue.Queue = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def notify(self, kind: str, text: str) -> bool:
+        """Queue an event for the next digest; never blocks. False if dropped."""
+        if not self.url:
+            return False
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="notify")
+                self._thread.start()
+        try:
+            self._q.put_nowait((kind, text))
+            return True
+        except queue.Full:
+            count("notify.dropped")
+            return False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._q.get()
+            if item is _STOP:
+                break
+            batch, deadline = [item], time.monotonic() + self.window
+            while (left := deadline - time.monotonic()) > 0:
+                try:
+                    item = self._q.get(timeout=left)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._post(digest(batch, self.window))
+            count("notify.events", len(batch))
+
+    def _post(self, text: str) -> None:
+        try:
+            with span("slack.post"):
+                r = request("slack", http_session(), "POST", self.url,
+                            json={"text": text}, timeout=10)
+            r.raise_for_status()
+            count("notify.posted")
+        except Exception as e:                          # don't notify about notifying
+            count("notify.failed")
+            print(f"⚠️  Slack notification failed: {e}")
+
+    def close(self, timeout: float = 15) -> None:
+        """Post whatever is pending and stop the sender thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+
+# ── process-wide access ──────────────────────────────────────────
+_default: Notifier | None = None
+_default_lock = threading.Lock()
+
+
+def notifier() -> Notifier:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Notifier()
+        return _default
+
+
+def notify(kind: str, text: str) -> bool:
+    """Queue a Slack notification ("open", "click", "reply", "error", …)."""
+    return notifier().notify(kind, text)
+
+
+@atexit.register
+def close_notifier() -> None:
+    global _default
+    with _default_lock:
+        n, _default = _default, None
+    if n is not None:
+        n.close()
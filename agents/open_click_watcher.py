@@ -1,50 +1,161 @@
 #!/usr/bin/env python3
-"""Poll Cloudflare KV for open:/click: keys and alert Slack."""
+"""Poll Cloudflare KV for open:/click: keys and alert Slack (via notify.py).
 
-import os, time, json, requests
-from dotenv import load_dotenv
+Each poll follows the KV list cursor until every key is seen, handles the
+events on a small worker pool over one pooled HTTP session, then removes
+the handled keys with the bulk-delete endpoint (10k keys per call).
 
-load_dotenv()
+When the tracker pushes events to event_ingest.py this poller is only the
+catch-up path: keys already handled from a push are deleted without a
+second alert (HANDLED, shared within the process). Every handled event
+is also appended to the engagement log (event_store.py).
+"""
+
+import os, time, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import http_session                    # also loads .env
+from event_store import record_event
+from metrics import span, count
+from notify import notify
+from ratelimit import request
 
 ACCOUNT   = os.getenv("CF_ACCOUNT_ID")
 NS_ID     = os.getenv("CF_KV_NS")
 TOKEN     = os.getenv("CF_API_TOKEN")
-SLACK_URL = os.getenv("SLACK_WEBHOOK")
 INTERVAL  = 60   # seconds between polls
+WORKERS   = int(os.getenv("WATCHER_WORKERS", 8))
+
+API_BASE  = os.getenv("CF_API_BASE", "https://api.cloudflare.com/client/v4")
+KV_URL    = f"{API_BASE}/accounts/{ACCOUNT}/storage/kv/namespaces/{NS_ID}"
+LIST_LIMIT  = 1000     # KV max keys per list page
+BULK_DELETE = 10_000   # KV max keys per bulk delete
 
 HEAD = {"Authorization": f"Bearer {TOKEN}"}
 
-def slack(msg: str):
-    if SLACK_URL:
-        requests.post(SLACK_URL, json={"text": msg})
+
+class Recent:
+    """Bounded memory of event keys: in flight (False) or handled (True)."""
+
+    def __init__(self, maxlen: int = 100_000):
+        self.maxlen = maxlen
+        self._keys: OrderedDict[str, bool] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> bool:
+        """True if the key is new (now in flight), False for a duplicate."""
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys[key] = False
+            while len(self._keys) > self.maxlen:
+                self._keys.popitem(last=False)
+            return True
+
+    def done(self, key: str) -> None:
+        with self._lock:
+            self._keys[key] = True
+            self._keys.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        """Forget a failed key so a retry (push or KV) is handled again."""
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def handled(self, key: str) -> bool:
+        with self._lock:
+            return self._keys.get(key, False)
+
+
+HANDLED = Recent()
 
 def list_keys(prefix: str):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{ACCOUNT}/storage/kv/namespaces/{NS_ID}/keys"
-    r = requests.get(url, params={"prefix": prefix, "limit": 100}, headers=HEAD, timeout=10)
-    r.raise_for_status()
-    return [k["name"] for k in r.json()["result"]]
+    """Yield every key name under `prefix`, following the KV cursor."""
+    cursor = None
+    while True:
+        params = {"prefix": prefix, "limit": LIST_LIMIT}
+        if cursor:
+            params["cursor"] = cursor
+        with span("kv.list"):
+            r = request("cloudflare", http_session(), "GET", f"{KV_URL}/keys",
+                        params=params, headers=HEAD, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        for k in data["result"]:
+            yield k["name"]
+        cursor = (data.get("result_info") or {}).get("cursor")
+        if not cursor:
+            return
 
 def delete_key(key: str):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{ACCOUNT}/storage/kv/namespaces/{NS_ID}/values/{key}"
-    requests.delete(url, headers=HEAD, timeout=10)
+    request("cloudflare", http_session(), "DELETE", f"{KV_URL}/values/{key}", headers=HEAD, timeout=10)
 
-def handle_event(key: str):
-    _, ts, cid = key.split(":")        # open:17485…:134368…
-    emoji = "👀" if key.startswith("open:") else "🔗"
-    msg   = f"{emoji} {key.split(':')[0].title()} by CID {cid}"
-    slack(msg)
-    print(msg) 
-    delete_key(key)
+def delete_keys(keys: list[str]):
+    """Bulk-delete handled keys, BULK_DELETE at a time."""
+    for i in range(0, len(keys), BULK_DELETE):
+        with span("kv.bulk_delete"):
+            r = request("cloudflare", http_session(), "DELETE", f"{KV_URL}/bulk",
+                        json=keys[i:i + BULK_DELETE], headers=HEAD, timeout=30)
+        r.raise_for_status()
 
-if __name__ == "__main__":
-    print("Open/Click watcher started …")
-    while True:
+def alert(key: str):
+    kind, ts, cid = key.split(":")     # open:17485…:134368…
+    emoji = "👀" if kind == "open" else "🔗"
+    msg   = f"{emoji} {kind.title()} by CID {cid}"
+    notify(kind, msg)                  # queued; posted as a digest (notify.py)
+    record_event(kind, cid, ts)        # engagement for signal_ranker
+    print(msg)
+
+def handle_event(key: str, delete: bool = True):
+    alert(key)
+    if delete:
+        delete_key(key)
+
+def poll_once(pool: ThreadPoolExecutor) -> int:
+    """Drain every open:/click: key once; returns the number handled."""
+    keys = [k for ev_prefix in ("open:", "click:") for k in list_keys(ev_prefix)]
+
+    def one(key):
+        if not HANDLED.claim(key):                     # pushed to event_ingest already
+            if HANDLED.handled(key):
+                count("events.already_pushed")
+                return key
+            return None                                # still in flight – next poll
         try:
-            for ev_prefix in ("open:", "click:"):
-                for k in list_keys(ev_prefix):
-                    handle_event(k)
-            print("✓ poll", time.strftime("%H:%M:%S"))
+            handle_event(key, delete=False)
+            HANDLED.done(key)
+            return key
         except Exception as e:
-            print("⚠️  watcher error:", e)
-            slack(f"⚠️ watcher error: {e}")
-        time.sleep(INTERVAL)
\ No newline at end of file
+            HANDLED.release(key)
+            print(f"⚠️  event {key} failed: {e}")     # left in KV for next poll
+            return None
+
+    done = [k for k in pool.map(one, keys) if k]
+    delete_keys(done)
+    count("events.handled", len(done))
+    return len(done)
+
+def run(stop=None, interval=INTERVAL):
+    """Poll every `interval` s (a number, or a callable returning one)
+    until `stop` (a threading.Event) is set."""
+    print("Open/Click watcher started …")
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        while stop is None or not stop.is_set():
+            try:
+                t0 = time.perf_counter()
+                n  = poll_once(pool)
+                dt = time.perf_counter() - t0
+                print("✓ poll", time.strftime("%H:%M:%S"),
+                      f"– {n} events in {dt:.2f}s ({n / dt if dt else 0:.0f} ev/s)")
+            except Exception as e:
+                print("⚠️  watcher error:", e)
+                notify("error", f"⚠️ watcher error: {e}")
+            wait = interval() if callable(interval) else interval
+            if stop is not None:
+                stop.wait(wait)
+            else:
+                time.sleep(wait)
+
+if __name__ == "__main__":
+    run()
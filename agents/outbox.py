@@ -0,0 +1,442 @@
+"""Durable outbox that decouples drafting, sending and CRM stamping.
+
+Each message is one row keyed by "<contact_id>:<step>" (step = template
+name), so a contact can never get the same step twice, and moves through
+
+    drafted → sending → sent → stamped          (or → failed)
+
+run_pipeline() runs the three stages concurrently: a drafting thread
+enqueues finished drafts while sender workers drain them and a stamper
+marks sent rows in HubSpot. Everything lives in SQLite (WAL), so a crash
+loses nothing: the next run sends the remaining `drafted` rows and stamps
+the `sent` ones. A row caught in `sending` by a crash is marked failed,
+not re-sent – we can't tell if the server accepted it, and a duplicate
+email to a prospect is worse than a missing one. A send that raises is
+retried after OUTBOX_RETRY_DELAY s, doubling each time, up to
+MAX_ATTEMPTS – so one SMTP hiccup doesn't use up every attempt at once.
+
+A stamp that fails (contact deleted, HubSpot down) leaves the row `sent`
+for the next run; after OUTBOX_STAMP_ATTEMPTS runs that all failed it is
+parked as `stamp_failed` instead of being retried forever.
+
+Each row also records the mailbox (`sender`) it is assigned to / went
+out from and when it was sent, so per-mailbox quotas and sticky routing
+(mailboxes.py) can be derived from the outbox.
+
+    OUTBOX_PATH            default .cache/outbox.sqlite
+    OUTBOX_RETRY_DELAY     seconds before a failed send's first retry (default 30)
+    OUTBOX_STAMP_ATTEMPTS  runs a stamp may fail before it's given up (default 5)
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+
+from clients import ROOT, _once
+from metrics import span, count
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY  = float(os.getenv("OUTBOX_RETRY_DELAY", 30))          # doubles per attempt
+MAX_STAMP_ATTEMPTS = int(os.getenv("OUTBOX_STAMP_ATTEMPTS", 5))     # runs, not calls
+
+
+class Deferred(Exception):
+    """Raised by send() when a message can't go out this run (e.g. every
+    mailbox is over quota): the row stays drafted, no attempt is counted
+    and that sender thread stops."""
+
+
+class Row(NamedTuple):
+    key: str
+    contact_id: str
+    step: str
+    email: str
+    subject: str
+    body: str
+    attempts: int
+    sender: str = ""
+
+
+class Outbox:
+    def __init__(self, path: str | Path | None = None):
+        path = Path(path or os.getenv("OUTBOX_PATH", ROOT / ".cache" / "outbox.sqlite"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   timeout=30)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS outbox (
+                key        TEXT PRIMARY KEY,
+                contact_id TEXT NOT NULL,
+                step       TEXT NOT NULL,
+                email      TEXT NOT NULL,
+                subject    TEXT NOT NULL DEFAULT '',
+                body       TEXT NOT NULL,
+                state      TEXT NOT NULL,
+                attempts   INTEGER NOT NULL DEFAULT 0,
+                error      TEXT,
+                created    REAL NOT NULL,
+                updated    REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_outbox_state ON outbox(state, created);
+            CREATE INDEX IF NOT EXISTS ix_outbox_contact ON outbox(contact_id);
+        """)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(outbox)")}
+        if "sender" not in cols:                          # outboxes from before mailboxes.py
+            self._db.execute("ALTER TABLE outbox ADD COLUMN sender TEXT NOT NULL DEFAULT ''")
+            self._db.execute("ALTER TABLE outbox ADD COLUMN sent_at REAL")
+        if "stamp_attempts" not in cols:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN stamp_attempts INTEGER NOT NULL DEFAULT 0")
+        if "next_attempt" not in cols:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN next_attempt REAL NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_outbox_sent_at ON outbox(sent_at)")
+
+    @staticmethod
+    def key(contact_id: str, step: str) -> str:
+        return f"{contact_id}:{step}"
+
+    # ── producer ─────────────────────────────────────────────────
+    def known(self, keys: Iterable[str]) -> set[str]:
+        """Keys already in the outbox, whatever their state."""
+        keys, out = list(keys), set()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                q = f"SELECT key FROM outbox WHERE key IN ({','.join('?' * len(chunk))})"
+                out.update(r[0] for r in self._db.execute(q, chunk))
+        return out
+
+    def enqueue(self, contact_id: str, step: str, email: str,
+                subject: str, body: str, sender: str = "") -> bool:
+        """Add a drafted message; False if this contact already has this step."""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO outbox"
+                " (key, contact_id, step, email, subject, body, state, created, updated, sender)"
+                " VALUES (?, ?, ?, ?, ?, ?, 'drafted', ?, ?, ?)",
+                (self.key(contact_id, step), str(contact_id), step, email,
+                 subject or "", body, now, now, sender or ""),
+            )
+        return cur.rowcount == 1
+
+    # ── state machine ────────────────────────────────────────────
+    def claim(self, from_state: str, to_state: str, limit: int = 1,
+              sender: str | None = None) -> list[Row]:
+        """Atomically move up to `limit` oldest rows (of one sender) between
+        states; rows waiting out a retry delay are skipped."""
+        where, args = ("state = ? AND sender = ?", (from_state, sender)) if sender is not None \
+            else ("state = ?", (from_state,))
+        where, args = where + " AND next_attempt <= ?", (*args, time.time())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT key, contact_id, step, email, subject, body, attempts, sender"
+                    f" FROM outbox WHERE {where} ORDER BY created LIMIT ?",
+                    (*args, limit),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE outbox SET state = ?, updated = ? WHERE key = ?",
+                    [(to_state, time.time(), r[0]) for r in rows],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [Row(*r) for r in rows]
+
+    def mark(self, key: str, state: str, error: str | None = None,
+             bump_attempts: bool = False, sender: str | None = None,
+             delay: float = 0) -> None:
+        """Move a row to `state`; `delay` s keeps it from being claimed again."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET state = ?, error = ?, updated = ?,"
+                " attempts = attempts + ?, sender = COALESCE(?, sender), next_attempt = ?,"
+                " sent_at = CASE WHEN ? = 'sent' THEN COALESCE(sent_at, ?) ELSE sent_at END"
+                " WHERE key = ?",
+                (state, error, now, int(bump_attempts), sender, now + delay, state, now, key),
+            )
+
+    def next_retry(self, sender: str | None = None) -> float | None:
+        """Earliest time a drafted row (of one sender) waiting out a retry
+        delay becomes claimable; None if there is none."""
+        where, args = ("AND sender = ?", (sender,)) if sender is not None else ("", ())
+        with self._lock:
+            return self._db.execute(
+                f"SELECT MIN(next_attempt) FROM outbox WHERE state = 'drafted' {where}",
+                args).fetchone()[0]
+
+    def reassign(self, senders: dict[str, str]) -> None:
+        """{key: sender} for queued rows whose mailbox went away."""
+        with self._lock:
+            self._db.executemany("UPDATE outbox SET sender = ? WHERE key = ? AND state = 'drafted'",
+                                 [(s, k) for k, s in senders.items()])
+
+    def orphans(self, senders: Iterable[str]) -> list[tuple[str, str]]:
+        """(key, contact_id) of drafted rows assigned to none of `senders`."""
+        senders = list(senders)
+        with self._lock:
+            return self._db.execute(
+                "SELECT key, contact_id FROM outbox WHERE state = 'drafted'"
+                f" AND sender NOT IN ({','.join('?' * len(senders))})", senders).fetchall()
+
+    def end_stamping(self, max_attempts: int = MAX_STAMP_ATTEMPTS) -> tuple[int, int]:
+        """End of a run: rows whose stamp failed this run (`unstamped`) go
+        back to `sent` for the next run, or to `stamp_failed` once they have
+        failed in `max_attempts` runs. Returns (retrying, given up)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE outbox SET stamp_attempts = stamp_attempts + 1, updated = ?"
+                             " WHERE state = 'unstamped'", (now,))
+            given_up = self._db.execute(
+                "UPDATE outbox SET state = 'stamp_failed',"
+                " error = 'HubSpot stamp kept failing – not retried'"
+                " WHERE state = 'unstamped' AND stamp_attempts >= ?", (max_attempts,)).rowcount
+            retrying = self._db.execute(
+                "UPDATE outbox SET state = 'sent' WHERE state = 'unstamped'").rowcount
+        return retrying, given_up
+
+    def recover(self) -> int:
+        """After a crash: rows stuck in `sending` are failed, never re-sent;
+        rows caught in `stamping` / `unstamped` just need stamping again."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE outbox SET state = 'failed', updated = ?,"
+                " error = 'interrupted while sending – not retried to avoid a duplicate'"
+                " WHERE state = 'sending'",
+                (time.time(),),
+            )
+            self._db.execute("UPDATE outbox SET state = 'sent'"
+                             " WHERE state IN ('stamping', 'unstamped')")
+        return cur.rowcount
+
+    def steps_sent(self, contact_ids: Iterable[str]) -> dict[str, set[str]]:
+        """{contact_id: steps that went out} – per-contact send history."""
+        ids, out = list(contact_ids), {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                q = (f"SELECT contact_id, step FROM outbox WHERE state IN ('sent', 'stamped', 'stamp_failed')"
+                     f" AND contact_id IN ({','.join('?' * len(chunk))})")
+                for cid, step in self._db.execute(q, chunk):
+                    out.setdefault(cid, set()).add(step)
+        return out
+
+    def senders(self, contact_ids: Iterable[str]) -> dict[str, str]:
+        """{contact_id: mailbox of its latest sent message}."""
+        ids, out = list(contact_ids), {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                q = (f"SELECT contact_id, sender FROM outbox WHERE sent_at IS NOT NULL AND sender != ''"
+                     f" AND contact_id IN ({','.join('?' * len(chunk))}) ORDER BY sent_at")
+                out.update(self._db.execute(q, chunk).fetchall())
+        return out
+
+    def usage(self, since: float) -> dict[str, int]:
+        """{sender: messages sent since `since` (epoch s) or still queued}."""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT sender, COUNT(*) FROM outbox WHERE sent_at >= ?"
+                " OR state IN ('drafted', 'sending') GROUP BY sender", (since,)))
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state"))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE state IN ('drafted', 'sending')"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+@_once
+def default_outbox() -> Outbox:
+    """Process-wide outbox, opened on first use."""
+    return Outbox()
+
+
+# ── pipeline ──────────────────────────────────────────────────────
+def run_pipeline(
+    outbox: Outbox,
+    contacts: list,
+    step: str,
+    *,
+    draft: Callable[[list[dict], str], list[str | None]],
+    split: Callable[[str], tuple[str, str]],
+    send: Callable[[Row], str | None],
+    stamp: Callable[[list[Row]], set[str]],
+    senders: int = 1,
+    draft_chunk: int = 25,
+    stamp_every: float = 2.0,
+    route: Callable[[str], str | None] | None = None,
+    lanes: dict[str, int] | None = None,
+    release: Callable[[str], None] | None = None,
+) -> dict[str, int]:
+    """
+    Draft `contacts` for `step`, send and stamp them as three overlapping
+    stages; also drains rows left over from an interrupted run.
+
+    draft(props_list, step) -> bodies | None, split(raw) -> (subject, body),
+    send(row) raises on failure and may return the sender it actually used,
+    stamp(rows) -> keys that were stamped OK.
+
+    With route(contact_id) -> sender | None every contact is assigned a
+    sender before it is drafted (None = no capacity, left for a later run)
+    and `lanes` ({sender: threads}) replaces `senders`: each sender's rows
+    are drained by its own threads, so a slow or paced mailbox doesn't hold
+    up the others. release(sender) is called for a routed contact that
+    won't be sent after all (no draft, or its send gave up), so whatever
+    route() reserved for it is given back.
+    """
+    stuck = outbox.recover()
+    if stuck:
+        print(f"⚠️  outbox: {stuck} message(s) were mid-send during a crash – marked failed")
+
+    todo = [c for c in contacts if c.properties.get("email")]
+    done = outbox.known(outbox.key(c.id, step) for c in todo)
+    todo = [c for c in todo if outbox.key(c.id, step) not in done]
+    if len(done):
+        print(f"🛈 outbox: {len(done)} contact(s) already have {step} – skipped")
+
+    if lanes and route:                      # queued rows whose mailbox is gone
+        moved = {k: s for k, cid in outbox.orphans(lanes) if (s := route(cid)) is not None}
+        outbox.reassign(moved)
+
+    drafting = threading.Event()
+    drafting.set()
+    stats = {"drafted": 0, "sent": 0, "stamped": 0, "failed": 0, "deferred": 0}
+    stats_lock = threading.Lock()
+    errors: list[BaseException] = []           # drafter crash, re-raised at the end
+
+    def bump(k: str, n: int = 1):
+        with stats_lock:
+            stats[k] += n
+
+    def drafter():
+        held: dict[str, str] = {}                 # routed, not yet enqueued
+        try:
+            for i in range(0, len(todo), draft_chunk):
+                chunk, routed = todo[i:i + draft_chunk], {}
+                if route:
+                    routed = {c.id: route(c.id) for c in chunk}
+                    chunk = [c for c in chunk if routed[c.id] is not None]
+                    held = {c.id: routed[c.id] for c in chunk}
+                    if len(routed) > len(chunk):
+                        bump("deferred", len(routed) - len(chunk))
+                        count("pipeline.deferred", len(routed) - len(chunk))
+                    if not chunk:
+                        continue
+                with span("pipeline.draft", step=step):
+                    bodies = draft([c.properties for c in chunk], step)
+                for c, raw in zip(chunk, bodies):
+                    if raw is not None:
+                        subject, body = split(raw)
+                        if outbox.enqueue(c.id, step, c.properties["email"], subject, body,
+                                          routed.get(c.id, "")):
+                            bump("drafted")
+                            held.pop(c.id, None)
+                for cid in list(held):            # not drafted / already queued
+                    if release:
+                        release(held[cid])
+                    del held[cid]
+        except BaseException as e:
+            errors.append(e)
+            print(f"❌ drafting {step} stopped: {e!r} – sending what was drafted")
+        finally:
+            if release:
+                for s in held.values():
+                    release(s)
+            drafting.clear()
+
+    def sender(lane: str | None = None):
+        while True:
+            rows = outbox.claim("drafted", "sending", sender=lane)
+            if not rows:
+                if drafting.is_set():
+                    time.sleep(0.05)
+                    continue
+                wake = outbox.next_retry(lane)               # failed sends backing off
+                if wake is None:
+                    return
+                time.sleep(min(max(wake - time.time(), 0.05), 1))
+                continue
+            row = rows[0]
+            try:
+                used = send(row)
+                outbox.mark(row.key, "sent", sender=used)
+                bump("sent")
+            except Deferred as e:
+                outbox.mark(row.key, "drafted", str(e))
+                bump("deferred")
+                print(f"⏸  {row.email} left for the next run: {e}")
+                return
+            except Exception as e:
+                retry = row.attempts + 1 < MAX_ATTEMPTS
+                outbox.mark(row.key, "drafted" if retry else "failed", str(e), bump_attempts=True,
+                            delay=RETRY_DELAY * 2 ** row.attempts if retry else 0)
+                count("pipeline.send_errors")
+                if not retry:
+                    bump("failed")
+                    if release and row.sender:
+                        release(row.sender)
+                print(f"❌ Send to {row.email} failed "
+                      f"({f'retry in {RETRY_DELAY * 2 ** row.attempts:g} s' if retry else 'giving up'}): {e}")
+
+    def stamp_once(failed: str = "sent") -> int:
+        """Stamp up to 100 sent rows; failures go to `failed`. Returns rows claimed."""
+        rows = outbox.claim("sent", "stamping", limit=100)
+        if not rows:
+            return 0
+        ok = stamp(rows)
+        for r in rows:
+            outbox.mark(r.key, "stamped" if r.key in ok else failed)
+        bump("stamped", len(ok))
+        return len(rows)
+
+    def stamper(stop: threading.Event):
+        while not stop.wait(stamp_every):
+            stamp_once()
+
+    stop_stamper = threading.Event()
+    threads = [threading.Thread(target=drafter, name="drafter")]
+    if lanes:
+        threads += [threading.Thread(target=sender, args=(lane,), name=f"sender-{lane}-{i}")
+                    for lane, n in lanes.items() for i in range(max(1, n))]
+    else:
+        threads += [threading.Thread(target=sender, name=f"sender-{i}") for i in range(senders)]
+    st = threading.Thread(target=stamper, args=(stop_stamper,), name="stamper")
+    for t in threads + [st]:
+        t.start()
+    for t in threads:
+        t.join()
+    stop_stamper.set()
+    st.join()
+    # final drain: every leftover row is tried once more; a failure is parked
+    # in `unstamped` (so this loop ends) and counts one attempt for the row
+    while stamp_once(failed="unstamped"):
+        pass
+    retrying, given_up = outbox.end_stamping()
+    if retrying:
+        print(f"⚠️  outbox: {retrying} sent message(s) not stamped in HubSpot – retried next run")
+    if given_up:
+        count("pipeline.stamp_given_up", given_up)
+        print(f"❌ outbox: {given_up} message(s) still unstamped after "
+              f"{MAX_STAMP_ATTEMPTS} runs – marked stamp_failed")
+    if errors:                                  # what was drafted is sent and stamped
+        raise errors[0]
+    return stats
@@ -1,39 +1,184 @@
 # agents/prospect_scout.py
-import os, json
-from dotenv import load_dotenv
-from hubspot import HubSpot
-from hubspot.crm.contacts import SimplePublicObjectInput
+"""Create or update prospect contacts in HubSpot, keyed by email.
 
-# 1) load credentials & config
-load_dotenv(dotenv_path=".env")
-hs = HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"))
-config = json.load(open("config/icp.json"))
+Prospects stream from config/icp.json (one per company signal) or from a
+CSV (columns email, firstname, lastname, jobtitle, company – extra
+columns are ignored). Each chunk of 100 costs one batch read by email,
+then one batch create for the new addresses; changed contacts go through
+the batched write-behind writer (hs_writer.py) and unchanged ones are
+skipped. Re-running the same list is safe: nothing is created twice and
+fit_score is only set on create.
+
+    python agents/prospect_scout.py                    # ICP signals
+    python agents/prospect_scout.py --csv prospects.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+from collections import Counter
+from typing import Iterable, Iterator
+
+from clients import contacts_api, hubspot_client, hubspot_error, icp_config   # also loads .env
+from hs_writer import BATCH_LIMIT, ContactWriter
+from metrics import span, count
+from ratelimit import call
+
+PROSPECT_PROPERTIES = ["email", "firstname", "lastname", "jobtitle", "company"]
+
+CSV_ALIASES = {             # header (lower-case) → property
+    "first_name": "firstname", "first": "firstname",
+    "last_name": "lastname", "last": "lastname",
+    "title": "jobtitle", "job_title": "jobtitle",
+    "company_name": "company", "e-mail": "email",
+}
 
-def upsert_contact(email, first, last, title, company):
-    props = {
-        "email": email,
-        "firstname": first,
-        "lastname": last,
-        "jobtitle": title,
-        "company": company,
-        "fit_score": "0"
-    }
-    obj = SimplePublicObjectInput(properties=props)
-    hs.crm.contacts.basic_api.create(
-        simple_public_object_input_for_create=obj
-    )
-    print(f"✔ Created contact: {email}")
 
-def main():
+# ── sources ──────────────────────────────────────────────────────
+def icp_prospects(config: dict | None = None) -> Iterator[dict]:
+    config = config or icp_config()
     for company in config["companySignals"]:
         # derive a fake email
         domain = company.replace(" ", "").lower() + ".com"
-        email = f"info@{domain}"
         parts = company.split()
-        first, last = parts[0], parts[-1]
-        # pick first title from config
-        title = config["contactTitles"][0]
-        upsert_contact(email, first, last, title, company)
+        yield {
+            "email": f"info@{domain}",
+            "firstname": parts[0],
+            "lastname": parts[-1],
+            "jobtitle": config["contactTitles"][0],      # pick first title from config
+            "company": company,
+        }
+
+
+def csv_prospects(path: str) -> Iterator[dict]:
+    """Rows of a prospect CSV as property dicts, read lazily."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            props = {}
+            for k, v in row.items():
+                key = (k or "").strip().lower()
+                key = CSV_ALIASES.get(key, key)
+                if key in PROSPECT_PROPERTIES and v and v.strip():
+                    props[key] = v.strip()
+            yield props
+
+
+# ── upsert ───────────────────────────────────────────────────────
+def _chunks(prospects: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for p in prospects:
+        chunk.append(p)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _read_by_email(hs, emails: list[str]) -> dict[str, tuple[str, dict]]:
+    """{email: (contact id, properties)} for the emails HubSpot already has."""
+    from hubspot.crm.contacts import BatchReadInputSimplePublicObjectId, SimplePublicObjectId
+    body = BatchReadInputSimplePublicObjectId(
+        id_property="email",
+        inputs=[SimplePublicObjectId(id=e) for e in emails],
+        properties=PROSPECT_PROPERTIES,
+        properties_with_history=[],
+    )
+    with span("hubspot.batch_read"):
+        resp = call("hubspot", contacts_api("batch", hs).read,
+                    batch_read_input_simple_public_object_id=body)
+    return {(c.properties.get("email") or "").lower(): (c.id, c.properties)
+            for c in resp.results or []}
+
+
+def _create(hs, rows: list[dict]) -> int:
+    from hubspot.crm.contacts import (BatchInputSimplePublicObjectBatchInputForCreate,
+                                      SimplePublicObjectBatchInputForCreate)
+    body = BatchInputSimplePublicObjectBatchInputForCreate(inputs=[
+        SimplePublicObjectBatchInputForCreate(properties={**p, "fit_score": "0"}, associations=[])
+        for p in rows
+    ])
+    with span("hubspot.batch_create"):
+        resp = call("hubspot", contacts_api("batch", hs).create,
+                    batch_input_simple_public_object_batch_input_for_create=body)
+    return len(resp.results or [])
+
+
+def _upsert_chunk(hs, writer: ContactWriter, chunk: list[dict], stats: Counter,
+                  retry_conflicts: bool = True) -> None:
+    rows: dict[str, dict] = {}
+    for p in chunk:
+        email = (p.get("email") or "").strip().lower()
+        if "@" not in email:
+            stats["invalid"] += 1
+            continue
+        rows.setdefault(email, {}).update({**p, "email": email})   # later rows win
+
+    existing = _read_by_email(hs, list(rows))
+    new = [p for e, p in rows.items() if e not in existing]
+    for email, (cid, have) in existing.items():
+        changed = {k: v for k, v in rows[email].items()
+                   if k != "email" and v and v != (have.get(k) or "")}
+        if changed:
+            writer.update(cid, changed)
+            stats["updated"] += 1
+        else:
+            stats["skipped"] += 1
+
+    if not new:
+        return
+    try:
+        stats["created"] += _create(hs, new)
+    except hubspot_error() as e:
+        if e.status != 409 or not retry_conflicts:
+            raise
+        # someone created one of these since our read – re-read and retry once
+        count("prospects.create_conflicts")
+        _upsert_chunk(hs, writer, new, stats, retry_conflicts=False)
+
+
+def upsert_prospects(prospects: Iterable[dict], hs=None,
+                     batch_size: int = BATCH_LIMIT) -> Counter:
+    """Create-or-update `prospects` by email, 100 per call; returns
+    Counter(created, updated, skipped, invalid, failed)."""
+    hs = hs or hubspot_client()
+    writer = ContactWriter(hs)
+    stats = Counter()
+    try:
+        for i, chunk in enumerate(_chunks(prospects, min(batch_size, BATCH_LIMIT)), 1):
+            _upsert_chunk(hs, writer, chunk, stats)
+            if i % 50 == 0:
+                print(f"… {i * batch_size} prospects processed")
+    finally:
+        failed = writer.close()
+    stats["updated"] -= len(failed)
+    stats["failed"] += len(failed)
+    for k in ("created", "updated", "skipped", "invalid", "failed"):
+        count(f"prospects.{k}", stats[k])
+    return stats
+
+
+def upsert_contact(email, first, last, title, company):
+    """Single-prospect convenience wrapper around upsert_prospects()."""
+    return upsert_prospects([{"email": email, "firstname": first, "lastname": last,
+                              "jobtitle": title, "company": company}])
+
+
+def main(csv_path: str | None = None):
+    source = csv_prospects(csv_path) if csv_path else icp_prospects()
+    try:
+        stats = upsert_prospects(source)
+    except hubspot_error() as e:
+        print("❌ HubSpot API error:", e)
+        return
+    print(f"✔ Prospects: {stats['created']} created, {stats['updated']} updated, "
+          f"{stats['skipped']} unchanged"
+          + (f", {stats['invalid']} without a valid email" if stats["invalid"] else "")
+          + (f", {stats['failed']} failed" if stats["failed"] else ""))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Create/update prospect contacts")
+    ap.add_argument("--csv", help="prospect CSV (default: config/icp.json signals)")
+    main(ap.parse_args().csv)
@@ -0,0 +1,313 @@
+"""Token-bucket rate limiting shared by every outbound call.
+
+One bucket per provider, refilled continuously. acquire() blocks only as
+long as the bucket needs to refill, so agents run at the allowed rate
+instead of padding with fixed sleeps. Buckets learn from the provider:
+a 429's Retry-After pauses every caller of that provider, and
+rate-limit headers (HubSpot X-HubSpot-RateLimit-*, OpenAI
+x-ratelimit-*, the IETF RateLimit-*) shrink the local allowance when the
+server has less left than we think.
+
+Limits are "<count>/<period>[:burst]" (period like 10s, 1m, 1h):
+
+    RATE_HUBSPOT    default 100/10s     (private-app burst limit)
+    RATE_OPENAI     default OPENAI_RPM/1m
+    RATE_OPENAI_TOKENS  default OPENAI_TPM/1m
+    RATE_SMTP       default 30/1m:1     (≈ one send every 2 s)
+    RATE_CLOUDFLARE default 1200/5m
+    RATE_SLACK      default 1/1s:3      (incoming-webhook limit)
+    RATE_LIMIT_DB   optional SQLite file; processes pointing at the same
+                    file share their buckets (e.g. scout + sequencer
+                    running at once against one HubSpot portal)
+    RATE_RETRIES    default 4 – retries of 429/5xx in call()/request()
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import span, count
+
+def _defaults() -> dict[str, str]:
+    return {
+        "hubspot":        "100/10s",
+        "openai":         f"{os.getenv('OPENAI_RPM', 500)}/1m",
+        "openai-tokens":  f"{os.getenv('OPENAI_TPM', 200_000)}/1m",
+        "smtp":           "30/1m:1",
+        "cloudflare":     "1200/5m",
+        "slack":          "1/1s:3",
+    }
+
+RETRIES = int(os.getenv("RATE_RETRIES", 4))
+
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_limit(spec: str) -> tuple[float, float]:
+    """'100/10s:20' → (rate per second, burst). Burst defaults to the count."""
+    m = re.fullmatch(r"\s*([\d.]+)\s*/\s*([\d.]*)\s*(ms|s|m|h|d)?\s*(?::\s*([\d.]+))?\s*", spec)
+    if not m:
+        raise ValueError(f"bad rate limit {spec!r} (want e.g. '100/10s' or '30/1m:1')")
+    n, per, unit, burst = m.groups()
+    period = float(per or 1) * _UNITS[unit or "s"]
+    return float(n) / period, float(burst or n)
+
+
+def _duration(v: str) -> float | None:
+    """'1.5' | '6m0s' | '20ms' | '1h2m3s' → seconds (OpenAI reset header style)."""
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        pass
+    parts = re.findall(r"([\d.]+)(ms|s|m|h|d)", v or "")
+    return sum(float(x) * _UNITS[u] for x, u in parts) if parts else None
+
+
+def retry_after(headers) -> float | None:
+    """Seconds from a Retry-After header (delta or HTTP date), if any."""
+    v = _get(headers, "retry-after")
+    if v is None:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _get(headers, name: str):
+    if not headers:
+        return None
+    try:
+        return headers.get(name)          # requests/httpx/urllib3 are case-insensitive
+    except AttributeError:
+        return None
+
+
+# ── buckets ──────────────────────────────────────────────────────
+class _SharedState:
+    """Bucket state in SQLite so several processes draw from one bucket."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=30,
+                                   check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS buckets (
+                name    TEXT PRIMARY KEY,
+                tokens  REAL NOT NULL,
+                stamp   REAL NOT NULL,
+                blocked REAL NOT NULL DEFAULT 0
+            );
+        """)
+        self._lock = threading.Lock()
+
+    def update(self, name: str, burst: float, fn):
+        """Run fn(tokens, stamp, blocked) -> (state, result) in one transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT tokens, stamp, blocked FROM buckets WHERE name = ?", (name,)
+                ).fetchone() or (burst, time.time(), 0.0)
+                state, result = fn(*row)
+                self._db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+                                 (name, *state))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return result
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float,
+                 shared: _SharedState | None = None):
+        self.name, self.rate, self.burst = name, rate, max(1.0, burst)
+        self._shared = shared
+        self._state = (self.burst, time.time(), 0.0)     # tokens, stamp, blocked-until
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    @classmethod
+    def from_spec(cls, name: str, spec: str, shared: _SharedState | None = None) -> "TokenBucket":
+        return cls(name, *parse_limit(spec), shared=shared)
+
+    def _update(self, fn):
+        if self._shared is not None:
+            return self._shared.update(self.name, self.burst, fn)
+        with self._lock:
+            self._state, result = fn(*self._state)
+            return result
+
+    def _refill(self, tokens: float, stamp: float, now: float) -> float:
+        return min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+
+    def try_acquire(self, n: float = 1) -> float:
+        """Take n tokens if available (returns 0) or return the seconds to wait."""
+        n = min(n, self.burst)
+
+        def take(tokens, stamp, blocked):
+            now = time.time()
+            tokens = self._refill(tokens, stamp, now)
+            if now < blocked:
+                return (tokens, now, blocked), blocked - now
+            if tokens >= n:
+                return (tokens - n, now, blocked), 0.0
+            return (tokens, now, blocked), (n - tokens) / self.rate
+
+        return self._update(take)
+
+    def acquire(self, n: float = 1) -> float:
+        """Block until n tokens are available; returns the seconds waited."""
+        waited = 0.0
+        while (wait := self.try_acquire(n)) > 0:
+            with span(f"ratelimit.{self.name}"):
+                time.sleep(wait)
+            waited += wait
+        if waited:
+            self.waited += waited
+            count(f"ratelimit.{self.name}.waits")
+        return waited
+
+    def backoff(self, seconds: float) -> None:
+        """Pause every caller of this bucket for `seconds` (e.g. Retry-After)."""
+        def block(tokens, stamp, blocked):
+            now = time.time()
+            return (0.0, now, max(blocked, now + seconds)), None
+        self._update(block)
+
+    def observe(self, remaining: float | None, reset: float | None = None) -> None:
+        """Server says `remaining` calls are left (resetting in `reset` s)."""
+        if remaining is None:
+            return
+
+        def clamp(tokens, stamp, blocked):
+            now = time.time()
+            tokens = min(self._refill(tokens, stamp, now), float(remaining))
+            if remaining <= 0 and reset:
+                blocked = max(blocked, now + reset)
+            return (tokens, now, blocked), None
+        self._update(clamp)
+
+
+# ── registry ─────────────────────────────────────────────────────
+_buckets: dict[str, TokenBucket] = {}
+_registry_lock = threading.Lock()
+_shared: _SharedState | None = None
+
+
+def limiter(name: str) -> TokenBucket:
+    """The process-wide bucket for a provider (configured from RATE_<NAME>)."""
+    global _shared
+    with _registry_lock:
+        if name not in _buckets:
+            env = "RATE_" + name.upper().replace("-", "_")
+            spec = os.getenv(env) or _defaults().get(name)
+            if spec is None:
+                raise KeyError(f"no rate limit configured for {name!r} (set {env})")
+            if os.getenv("RATE_LIMIT_DB") and _shared is None:
+                _shared = _SharedState(os.environ["RATE_LIMIT_DB"])
+            _buckets[name] = TokenBucket.from_spec(name, spec, _shared)
+        return _buckets[name]
+
+
+def reset() -> None:
+    """Forget all buckets (tests/benchmarks re-read the env afterwards)."""
+    with _registry_lock:
+        _buckets.clear()
+
+
+def observe_headers(name: str, headers) -> None:
+    """Feed provider rate-limit headers from any response into the buckets."""
+    if not headers:
+        return
+    num = lambda k: _float(_get(headers, k))
+    if name == "hubspot":
+        rem = num("x-hubspot-ratelimit-remaining")
+        ms  = num("x-hubspot-ratelimit-interval-milliseconds")
+        limiter(name).observe(rem, ms / 1000 if ms else None)
+        sec = num("x-hubspot-ratelimit-secondly-remaining")
+        if sec is not None and sec <= 0:
+            limiter(name).backoff(1.0)
+    elif name == "openai":
+        limiter("openai").observe(num("x-ratelimit-remaining-requests"),
+                                  _duration(_get(headers, "x-ratelimit-reset-requests")))
+        limiter("openai-tokens").observe(num("x-ratelimit-remaining-tokens"),
+                                         _duration(_get(headers, "x-ratelimit-reset-tokens")))
+    else:
+        rem = num("ratelimit-remaining") if num("ratelimit-remaining") is not None \
+            else num("x-ratelimit-remaining")
+        limiter(name).observe(rem, num("ratelimit-reset") or num("x-ratelimit-reset"))
+
+
+def _float(v) -> float | None:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retryable(status) -> bool:
+    return status == 429 or (status or 0) >= 500
+
+
+def _pause(name: str, headers, attempt: int) -> None:
+    delay = retry_after(headers)
+    if delay is not None:
+        limiter(name).backoff(delay)        # everyone waits, not just this thread
+    else:
+        delay = random.uniform(0, min(30, 2 ** attempt))
+        time.sleep(delay)
+    count(f"ratelimit.{name}.retries")
+
+
+# ── call wrappers ────────────────────────────────────────────────
+def call(name: str, fn, *args, cost: float = 1, retries: int | None = None, **kw):
+    """
+    fn(*args, **kw) behind the `name` bucket, retrying 429/5xx with
+    Retry-After (or full-jitter) backoff. Errors carrying `.status` and
+    `.headers` (HubSpot's ApiException) are understood; anything else is
+    raised as-is.
+    """
+    retries = RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        limiter(name).acquire(cost)
+        try:
+            out = fn(*args, **kw)
+        except Exception as e:
+            status = getattr(e, "status", None)
+            if not _retryable(status) or attempt == retries:
+                raise
+            _pause(name, getattr(e, "headers", None), attempt)
+            continue
+        # HubSpot SDK: each *_api property builds its own ApiClient, so
+        # last_response is this call's response
+        last = getattr(getattr(getattr(fn, "__self__", None), "api_client", None),
+                       "last_response", None)
+        if last is not None:
+            observe_headers(name, last.getheaders())
+        return out
+
+
+def request(name: str, session, method: str, url: str, *,
+            retries: int | None = None, **kw):
+    """session.request() behind the `name` bucket with 429/5xx retries.
+    Returns the final response (callers still raise_for_status())."""
+    retries = RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        limiter(name).acquire()
+        r = session.request(method, url, **kw)
+        observe_headers(name, r.headers)
+        if not _retryable(r.status_code) or attempt == retries:
+            return r
+        _pause(name, r.headers, attempt)
+    return r
@@ -1,58 +1,292 @@
 #!/usr/bin/env python3
 """
-Poll Gmail every 60 s for messages that carry the label gtm/replied.
+Watch Gmail for messages that carry the label gtm/replied.
 For each new match:
-  • post a Slack alert
+  • post a Slack alert (coalesced by notify.py)
   • print to stdout
+  • log a reply event for the sender's contact (event_store.py)
+
+One long-lived IMAP session waits in IDLE (falls back to polling every
+POLL_INTERVAL s when the server lacks IDLE). Only UIDs above the last
+checkpoint (persisted in .cache/reply_watcher.json) are fetched, and only
+their From/Subject/Message-ID headers. A reply is marked \\Seen (one UID
+STORE per chunk) and the checkpoint moves past it only once it has been
+handled, so a failing handler retries it instead of losing it.
+
+With several sending mailboxes (mailboxes.py) every one of them is
+watched, each on its own session and checkpoint; replies carry the
+mailbox they arrived in.
 """
 
 import imaplib
 import email
+import email.utils
+import json
+import re
+import select
+import threading
 import time
 import os
-import requests
-from dotenv import load_dotenv
+from pathlib import Path
 
-load_dotenv()
+from clients import ROOT                            # also loads .env
+from contact_mirror import contact_mirror
+from copy_crafter import MEMORY_ON
+from event_store import record_event
+from metrics import span, count
+from notify import notify
+from suppression import suppress
 
-IMAP_HOST = "imap.gmail.com"
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
+IMAP_SSL  = os.getenv("IMAP_SSL", "1") == "1"
 USER      = os.getenv("SMTP_USER")
 PW        = os.getenv("SMTP_PASS")          # same app-password as SMTP
-SLACK_URL = os.getenv("SLACK_WEBHOOK")
 
-def slack(msg: str):
-    if SLACK_URL:
-        requests.post(SLACK_URL, json={"text": msg})
+MAILBOX       = '"[Gmail]/All Mail"'       # All Mail lets us search by label
+CRITERIA      = 'X-GM-LABELS "gtm/replied" UNSEEN'
+STATE_PATH    = Path(os.getenv("REPLY_STATE_PATH", ROOT / ".cache" / "reply_watcher.json"))
+POLL_INTERVAL = 60          # seconds, when IDLE isn't available
+IDLE_CYCLE    = 5 * 60      # re-issue IDLE well inside the 29-min server limit
+FETCH_CHUNK   = 500         # UIDs per FETCH/STORE command
+HEADERS       = "BODY.PEEK[HEADER.FIELDS (FROM SUBJECT MESSAGE-ID)]"
+HANDLE_TRIES  = 3           # fetches a failing reply is retried on before it's skipped
 
-def fetch_replies():
-    """Yield dicts for every unread ‘gtm/replied’ message."""
-    with imaplib.IMAP4_SSL(IMAP_HOST) as M:
-        M.login(USER, PW)
-        # All Mail lets us search by label
-        M.select('"[Gmail]/All Mail"')
-        typ, data = M.search(
-            None,
-            'X-GM-LABELS "gtm/replied" UNSEEN'
-        )
-        for num in data[0].split():
-            typ, raw = M.fetch(num, "(RFC822)")
-            msg = email.message_from_bytes(raw[0][1])
-            frm = email.utils.parseaddr(msg["From"])[1]
-            subj = msg["Subject"]
-            # mark as seen so we don't alert again
-            M.store(num, "+FLAGS", "\\Seen")
-            yield {"from": frm, "subject": subj}
 
-if __name__ == "__main__":
-    while True:
-        new_msgs = list(fetch_replies())
-
-        if new_msgs:
-            for m in new_msgs:
-                line = f"↩️  Reply from {m['from']} – {m['subject']}"
-                print(line)
-                slack(f"📬 {line}")
+class ReplyWatcher:
+    def __init__(self, state_path: Path = STATE_PATH, user: str | None = USER,
+                 password: str | None = PW, host: str = IMAP_HOST, port: int = IMAP_PORT):
+        self.state_path = state_path
+        self.user, self.password, self.host, self.port = user, password, host, port
+        self.state = {"uidvalidity": None, "last_uid": 0}
+        if state_path.exists():
+            self.state.update(json.loads(state_path.read_text()))
+        self.M: imaplib.IMAP4 | None = None
+        self.can_idle = False
+        self._buf = b""
+        self._tries: dict[int, int] = {}          # uid → handler failures
+
+    # ── session ──────────────────────────────────────────────────
+    def connect(self):
+        cls = imaplib.IMAP4_SSL if IMAP_SSL else imaplib.IMAP4
+        with span("imap.connect"):
+            self.M = cls(self.host, self.port)
+            self.M.login(self.user, self.password)
+        self.can_idle = "IDLE" in self.M.capabilities
+        typ, _ = self.M.select(MAILBOX)
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"cannot select {MAILBOX}")
+        validity = (self.M.response("UIDVALIDITY")[1] or [None])[0]
+        validity = validity.decode() if isinstance(validity, bytes) else validity
+        if validity != self.state["uidvalidity"]:       # mailbox rebuilt → UIDs reset
+            self.state = {"uidvalidity": validity, "last_uid": 0}
+            self._save()
+
+    def close(self):
+        if self.M is not None:
+            try:
+                self.M.logout()
+            except Exception:
+                pass
+            self.M = None
+
+    def _save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state))
+        tmp.replace(self.state_path)
+
+    # ── fetching ─────────────────────────────────────────────────
+    def fetch_new(self, on_reply=None) -> list[dict]:
+        """Header-only fetch of labelled, unseen messages above the checkpoint.
+
+        With `on_reply`, each message is handled before it is marked \\Seen
+        and before the checkpoint moves past it; a message whose handler
+        raises stays unseen below the checkpoint and is retried on the next
+        fetch (HANDLE_TRIES times, then skipped). Returns the messages
+        handled (all of them without `on_reply`)."""
+        last = int(self.state["last_uid"])
+        with span("imap.search"):
+            typ, data = self.M.uid("SEARCH", None, f"UID {last + 1}:*", CRITERIA)
+        uids = sorted(u for u in map(int, (data[0] or b"").split()) if u > last)  # "n:*" can echo the max UID
+        out, failed = [], []
+        for i in range(0, len(uids), FETCH_CHUNK):
+            chunk = ",".join(map(str, uids[i:i + FETCH_CHUNK]))
+            with span("imap.fetch"):
+                typ, data = self.M.uid("FETCH", chunk, f"(UID {HEADERS})")
+            seen = []
+            for part in data:
+                if not isinstance(part, tuple):
+                    continue
+                m = re.search(rb"UID (\d+)", part[0])
+                msg = email.message_from_bytes(part[1])
+                reply = {
+                    "uid": int(m.group(1)) if m else None,
+                    "from": email.utils.parseaddr(msg["From"] or "")[1],
+                    "subject": msg["Subject"],
+                    "message_id": msg["Message-ID"],
+                    "mailbox": self.user,
+                }
+                done = True if on_reply is None else self._handle(on_reply, reply)
+                if done is False:
+                    failed.append(reply["uid"])
+                    continue
+                if done:
+                    out.append(reply)
+                if reply["uid"] is not None:
+                    seen.append(reply["uid"])
+            # mark as seen so we don't alert again – one STORE per chunk
+            if seen:
+                self.M.uid("STORE", ",".join(map(str, seen)), "+FLAGS.SILENT", "(\\Seen)")
+        if uids:
+            count("replies.seen", len(uids))
+            # stop short of the first failure; handled ones above it are \Seen
+            self.state["last_uid"] = min(failed) - 1 if failed else uids[-1]
+            self._save()
+        return out
+
+    def _handle(self, on_reply, reply: dict) -> bool:
+        """on_reply(reply): True if handled, False if it raised and should be
+        retried, None if it kept failing and is skipped."""
+        try:
+            on_reply(reply)
+            self._tries.pop(reply["uid"], None)
+            return True
+        except Exception as e:
+            tries = self._tries[reply["uid"]] = self._tries.get(reply["uid"], 0) + 1
+            count("replies.handler_errors")
+            if tries >= HANDLE_TRIES or reply["uid"] is None:
+                self._tries.pop(reply["uid"], None)
+                print(f"❌ reply from {reply['from']} failed {tries}× ({e}) – skipped")
+                return None
+            print(f"⚠️  reply from {reply['from']} failed ({e}) – retried next fetch")
+            return False
+
+    # ── waiting ──────────────────────────────────────────────────
+    def _line(self, deadline: float) -> bytes | None:
+        """Next CRLF-terminated line straight off the socket, None on timeout."""
+        sock = self.M.sock
+        while b"\r\n" not in self._buf:
+            left = deadline - time.monotonic()
+            pending = getattr(sock, "pending", lambda: 0)()      # TLS-buffered bytes
+            if not pending and (left <= 0 or not select.select([sock], [], [], left)[0]):
+                return None
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise imaplib.IMAP4.abort("server closed connection during IDLE")
+            self._buf += chunk
+        line, _, self._buf = self._buf.partition(b"\r\n")
+        return line
+
+    def idle(self, timeout: float = IDLE_CYCLE, stop=None) -> bool:
+        """IDLE until the mailbox changes, `timeout` or `stop` is set;
+        True if something arrived."""
+        M = self.M
+        tag = M._new_tag()
+        M.tagged_commands.pop(tag, None)       # we read the completion ourselves
+        M.send(tag + b" IDLE\r\n")
+        line = self._line(time.monotonic() + 30)
+        if not line or not line.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"IDLE refused: {line!r}")
+
+        changed, deadline = False, time.monotonic() + timeout
+        while not changed and time.monotonic() < deadline:
+            if stop is not None and stop.is_set():
+                break
+            line = self._line(min(deadline, time.monotonic() + 1))   # 1 s slices for stop
+            if line is not None:
+                changed = line.startswith(b"*") and (b"EXISTS" in line or b"FETCH" in line)
+
+        M.send(b"DONE\r\n")
+        while True:
+            line = self._line(time.monotonic() + 30)
+            if line is None:
+                raise imaplib.IMAP4.abort("no IDLE completion")
+            if line.startswith(tag):
+                return changed
+
+    def wait(self, stop=None):
+        if self.can_idle:
+            self.idle(stop=stop)
+        elif stop is not None:
+            stop.wait(POLL_INTERVAL)
         else:
-            print("⏳ No replies yet")
+            time.sleep(POLL_INTERVAL)
+
+    # ── loop ─────────────────────────────────────────────────────
+    def run(self, on_reply, stop=None):
+        """Call on_reply(dict) for each new reply until `stop` (an Event) is set."""
+        backoff = 1
+        while stop is None or not stop.is_set():
+            try:
+                if self.M is None:
+                    self.connect()
+                    backoff = 1
+                self.fetch_new(on_reply)
+                self.wait(stop)
+            except (imaplib.IMAP4.error, OSError) as e:
+                print("⚠️  IMAP connection lost:", e)
+                self.M, self._buf = None, b""
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+        self.close()
+
+
+def watchers() -> list[ReplyWatcher]:
+    """One watcher per sending mailbox (the .env one keeps the old checkpoint)."""
+    from mailboxes import load_mailboxes                 # SMTP side not needed here
+    boxes = load_mailboxes()
+    if len(boxes) == 1:
+        b = boxes[0]
+        return [ReplyWatcher(STATE_PATH, b.user, b.password, b.imap_host, b.imap_port)]
+    return [ReplyWatcher(STATE_PATH.with_name(f"{STATE_PATH.stem}.{b.user}.json"),
+                         b.user, b.password, b.imap_host, b.imap_port) for b in boxes]
+
+
+def run_all(on_reply, stop=None):
+    """ReplyWatcher.run() for every mailbox, each in its own thread."""
+    ws = watchers()
+    if len(ws) == 1:
+        return ws[0].run(on_reply, stop)
+    stop = stop or threading.Event()
+    threads = [threading.Thread(target=w.run, args=(on_reply, stop), name=f"replies-{w.user}",
+                                daemon=True) for w in ws]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+
 
-        time.sleep(60)
\ No newline at end of file
+def fetch_replies():
+    """Yield dicts for every new ‘gtm/replied’ message (one-shot)."""
+    for w in watchers():
+        w.connect()
+        try:
+            yield from w.fetch_new()
+        finally:
+            w.close()
+
+
+def announce(m: dict):
+    line = f"↩️  Reply from {m['from']} – {m['subject']}"
+    if m.get("mailbox") and m["mailbox"] != USER:      # one of the extra mailboxes
+        line += f" (to {m['mailbox']})"
+    print(line)
+    notify("reply", f"📬 {line}")              # digested with other events (notify.py)
+    suppress(m["from"], "replied")              # never sequenced again
+    cid = contact_mirror().id_for_email(m["from"])
+    if cid:
+        record_event("reply", cid)              # engagement for signal_ranker
+    if MEMORY_ON:                               # vector memory credits the email (memory.py)
+        from memory import record_reply         # numpy only with GTM_MEMORY on
+        record_reply(m["from"], m["subject"])
+
+
+if __name__ == "__main__":
+    print("Reply watcher started …")
+    run_all(announce)
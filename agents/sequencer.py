@@ -2,61 +2,57 @@
 """Send first-touch emails to the top-scored HubSpot contacts and stamp
 `last_emailed` (custom date property) so follow-ups know when to trigger.
 
-✦  Uses the same `draft_email()` helper from copy_crafter.py to keep copy logic in one place.
+✦  Uses the same `draft_emails()` helper from copy_crafter.py to keep copy logic in one place.
 ✦  Reads SMTP + HubSpot creds from .env.
-✦  Sorts locally by `fit_score` because the HubSpot SDK no longer supports `sorts=`.
-✦  Random 1.5–2.5 s pause between sends to stay under Gmail/Mailgun limits.
+✦  Sends through pooled, persistent SMTP sessions (smtp_pool.py) – one login per run –
+   spread over one or more mailboxes with their own quotas (mailboxes.py); a
+   contact's follow-ups come from the mailbox that sent the first touch.
+✦  Picks the top 5 by `fit_score` from the local contact mirror (contact_mirror.py).
+✦  Drops suppressed contacts (replied, bounced, unsubscribed, excluded – see
+   suppression.py) before anything is drafted.
+✦  Sends are paced per mailbox by token buckets (ratelimit.py, RATE_SMTP).
 ✦  Marks each contact’s `last_emailed` property to today’s UTC date (YYYY-MM-DD).
+✦  HubSpot custom contact properties this needs: last_emailed (date),
+   last_emailed_at, followup_step and – with more than one mailbox, or
+   STAMP_SENDER=on – gtm_sender (single-line text). A missing one makes
+   HubSpot reject the stamp.
+✦  Drafts, sends and stamps overlap through a durable outbox (outbox.py), so a
+   crash mid-run resumes where it stopped and never emails anyone twice.
 """
 
 
 from __future__ import annotations
 
 import os
-import ssl
-import smtplib
-import time
-import random
 import html
 import re
+import smtplib
 from datetime import datetime, timezone
 from email.message import EmailMessage
-from pathlib import Path
-import importlib.util, sys
-
-from dotenv import load_dotenv
-from hubspot import HubSpot
-from hubspot.crm.contacts import ApiException, SimplePublicObjectInput
 
-# ── project paths & env ───────────────────────────────────────────
-ROOT = Path(__file__).resolve().parent.parent  # project root
-load_dotenv(ROOT / ".env")
+from clients import hubspot_client, hubspot_error   # also loads .env
 
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
+from contact_mirror import contact_mirror
+from copy_crafter import MEMORY_ON, draft_emails, is_literal, split_subject
+from hs_writer import shared_writer, close_shared_writer
+from mailboxes import mailbox_pool, close_mailbox_pool
+from metrics import span, count
+from outbox import default_outbox, run_pipeline, Row
+from suppression import suppress, suppression_index
 
-if not (SMTP_USER and SMTP_PASS):
-    raise RuntimeError("SMTP_USER / SMTP_PASS not set in .env")
+FIRST_TOUCH = "first_touch_email.md"
 
-# ── HubSpot client ────────────────────────────────────────────────
-hs = HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"))
-
-# ── import draft_email from copy_crafter.py -----------------------
-spec = importlib.util.spec_from_file_location(
-    "copy_crafter", ROOT / "agents" / "copy_crafter.py"
-)
-copy_crafter = importlib.util.module_from_spec(spec)  # type: ignore
-sys.modules[spec.name] = copy_crafter  # type: ignore
-spec.loader.exec_module(copy_crafter)  # type: ignore
-
-draft_email = copy_crafter.draft_email  # type: ignore
+# gtm_sender (custom single-line text contact property) records the mailbox
+# a contact was emailed from; HubSpot rejects the whole update if the
+# property doesn't exist, so it's only written when it matters:
+# auto = more than one mailbox configured, on / off = always / never
+STAMP_SENDER = os.getenv("STAMP_SENDER", "auto").lower()
 
 # ── helpers -------------------------------------------------------
 
-def send_email(to_addr: str, body_plain: str, subject_hint: str = "") -> None:
-    """Send HTML + plain-text email via SSL SMTP."""
+def build_message(to_addr: str, body_plain: str, subject_hint: str = "",
+                  from_addr: str | None = None) -> EmailMessage:
+    """HTML + plain-text multipart message for one draft."""
     # Split off pixel (if present)
     if "<img" in body_plain:
         txt_part, pixel = body_plain.rsplit("\n\n", 1)
@@ -91,65 +87,131 @@ def send_email(to_addr: str, body_plain: str, subject_hint: str = "") -> None:
 
     # assemble multipart email
     msg = EmailMessage()
-    msg["From"] = SMTP_USER
+    msg["From"] = from_addr or os.getenv("SMTP_USER")
     msg["To"] = to_addr
     msg["Subject"] = subject_hint or "Quick idea on policy-driven alpha"
     msg.set_content(txt_part)                   # text/plain
     msg.add_alternative(html_body, subtype="html")  # text/html
-
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context) as s:
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
-    print(f"✉️  Sent to {to_addr}")
+    return msg
 
 
-def stamp_last_emailed(contact_id: str):
+def send_email(to_addr: str, body_plain: str, subject_hint: str = "",
+               sender: str | None = None, contact_id: str | None = None) -> str:
+    """Send HTML + plain-text email from `sender` (default: the contact's
+    mailbox) over a pooled SMTP session; returns the mailbox used."""
+    pool = mailbox_pool()
+    key = contact_id or to_addr
+    if sender is None:
+        sender = pool.assign(key)
+    try:
+        used = pool.send(sender, key, lambda frm: build_message(to_addr, body_plain,
+                                                                 subject_hint, frm))
+    except smtplib.SMTPRecipientsRefused:
+        suppress(to_addr, "bounced")
+        raise
+    count("emails.sent")
+    print(f"✉️  Sent to {to_addr}" + (f" from {used}" if len(pool.boxes) > 1 else ""))
+    return used
+
+
+def stamp_last_emailed(contact_id: str, followup_step: int | None = None,
+                       sender: str | None = None):
+    """Queue the last_emailed stamp (plus sequence position, 0 = first touch,
+    and sending mailbox); flushed in batches by hs_writer."""
     now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
-    obj = SimplePublicObjectInput(
-        properties={
-            "last_emailed": datetime.now(timezone.utc).strftime("%Y-%m-%d"),  # keep date
-            "last_emailed_at": str(now_ms),                                   # new datetime
-        }
-    )
-    hs.crm.contacts.basic_api.update(contact_id, simple_public_object_input=obj)
+    props = {
+        "last_emailed": datetime.now(timezone.utc).strftime("%Y-%m-%d"),  # keep date
+        "last_emailed_at": str(now_ms),                                   # new datetime
+    }
+    if followup_step is not None:
+        props["followup_step"] = str(followup_step)
+    if sender:
+        props["gtm_sender"] = sender
+    shared_writer(hubspot_client()).update(contact_id, props)
+
+def step_number(template: str) -> int | None:
+    """Sequence position of a template: 0 first touch, i for follow-up i
+    (followup_sequencer.STEPS), None for anything else."""
+    from followup_sequencer import STEPS                # it imports this module
+    if template == FIRST_TOUCH:
+        return 0
+    return next((i for i, (_, tmpl) in enumerate(STEPS, 1) if tmpl == template), None)
+
+
+def stamp_sent(rows: list[Row]) -> set[str]:
+    """Stamp a batch of sent outbox rows; returns the keys HubSpot accepted.
+    Each row's followup_step comes from its own step – the pipeline also
+    drains rows left over from other steps' runs."""
+    writer = shared_writer(hubspot_client())
+    with_sender = STAMP_SENDER in ("on", "1", "true") or (
+        STAMP_SENDER == "auto" and len(mailbox_pool().boxes) > 1)
+    for r in rows:
+        stamp_last_emailed(r.contact_id, step_number(r.step),
+                           r.sender if with_sender else None)
+    writer.flush()
+    if MEMORY_ON:                                        # vector memory (memory.py)
+        from memory import remember
+        remember("sent", [r.body for r in rows], [r.email for r in rows],
+                 [r.step for r in rows])
+    return {r.key for r in rows if r.contact_id not in writer.failed}
+
+
+def deliver(contacts: list, template: str = FIRST_TOUCH,
+            split: bool = False, batch: bool = False) -> dict[str, int]:
+    """Draft → send → stamp `contacts` for one sequence step via the outbox.
+
+    `split` takes the subject from a "Subject:" first line (follow-ups;
+    always for literal templates, whose front-matter subject comes that way);
+    `batch` drafts everything in one Batch API job (batch_drafts.py).
+    Each contact is routed to a mailbox before it is drafted – the one it
+    was last emailed from if there is one."""
+    contacts = suppression_index().filter(contacts)          # before any LLM spend
+    outbox, pool = default_outbox(), mailbox_pool()
+    pool.load_usage(outbox)
+    prefer = outbox.senders(c.id for c in contacts)
+    prefer.update((c.id, s) for c in contacts if (s := c.properties.get("gtm_sender")))
+    if batch:
+        from batch_drafts import draft_emails_batch as draft_many
+    else:
+        draft_many = draft_emails
+    with span("sequencer.deliver", template=template):
+        stats = run_pipeline(
+            outbox, contacts, template,
+            draft=lambda props, tmpl: draft_many(props, template=tmpl),
+            split=split_subject if split or is_literal(template) else (lambda raw: ("", raw)),
+            send=lambda r: send_email(r.email, r.body, r.subject, r.sender, r.contact_id),
+            stamp=stamp_sent,
+            route=lambda cid: pool.assign(cid, prefer.get(cid)),
+            lanes=pool.lanes(),
+            release=pool.release,
+            draft_chunk=max(1, len(contacts)) if batch else 25,
+        )
+    print(f"📬 {template}: {stats['sent']} sent, {stats['stamped']} stamped, "
+          f"{stats['failed']} failed"
+          + (f", {stats['deferred']} left for the next run (no mailbox capacity)" if stats["deferred"] else ""))
+    if len(pool.boxes) > 1:
+        print(f"📮 by mailbox: {pool.summary()}")
+    return stats
 
 # ── main ----------------------------------------------------------
 
 def main() -> None:
     try:
-        page = hs.crm.contacts.basic_api.get_page(
-            limit=100,
-            properties=[
-                "email",
-                "firstname",
-                "lastname",
-                "jobtitle",
-                "company",
-                "fit_score",
-                "last_emailed",
-            ],
-        )
-    except ApiException as e:
+        mirror = contact_mirror()
+        with span("sequencer.select"):
+            mirror.sync(hubspot_client())                 # incremental since last run
+    except hubspot_error() as e:
         print("❌ HubSpot API error:", e)
         return
 
-    # sort contacts locally by fit_score desc and pick top-5
-    leads = sorted(
-        page.results,
-        key=lambda c: int(c.properties.get("fit_score") or 0),
-        reverse=True,
-    )[:5]
-
-    for c in leads:
-        email = c.properties.get("email")
-        if not email:
-            continue
-
-        body = draft_email(c.properties, template=tmpl)
-        send_email(email, body)
-        stamp_last_emailed(c.id)
-        time.sleep(random.uniform(1.5, 2.5))  # gentle throttling
+    # top-5 by fit_score across the whole portal that we haven't emailed yet
+    # (over-fetched so suppressed contacts don't shrink the batch)
+    leads = suppression_index().filter(mirror.top_k(5 * 4, unemailed=True))[:5]
+    try:
+        deliver(leads)
+    finally:
+        close_mailbox_pool()
+        close_shared_writer()
 
 
 if __name__ == "__main__":
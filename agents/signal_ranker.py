@@ -1,61 +1,73 @@
-import os
-import json
-from dotenv import load_dotenv
-from hubspot import HubSpot
-from hubspot.crm.contacts import ApiException, SimplePublicObjectInput
+from functools import lru_cache
 
-# Load environment variables from .env
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+from clients import hubspot_client, hubspot_error, icp_config   # also loads .env
+from contact_mirror import contact_mirror
+from domain_matcher import DomainMatcher
+from event_store import engagement
+from hs_writer import shared_writer, close_shared_writer
+from metrics import span, count
 
-# Initialize HubSpot client
-hs = HubSpot(access_token=os.getenv("HUBSPOT_TOKEN"))
 
-# Load ICP configuration
-config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'icp.json')
-with open(config_path) as f:
-    config = json.load(f)
-signals = [s.lower().replace(" ", "") for s in config["companySignals"]]
+@lru_cache(maxsize=None)
+def matcher() -> DomainMatcher:
+    """ICP company signals, compiled once on first use."""
+    return DomainMatcher(icp_config()["companySignals"])
 
 
 def update_score(contact_id: str, score: int):
     """
-    Update the HubSpot contact's fit_score property.
+    Queue the HubSpot contact's fit_score update; it is sent in batches of
+    100 by the shared write-behind buffer (see hs_writer.py).
     """
-    props = {"fit_score": str(score)}
-    obj = SimplePublicObjectInput(properties=props)
-    try:
-        hs.crm.contacts.basic_api.update(
-            contact_id,
-            simple_public_object_input=obj
-        )
-        print(f"✔ Updated contact {contact_id} → score {score}")
-    except ApiException as e:
-        print(f"❌ Failed to update {contact_id}: {e}")
+    shared_writer(hubspot_client()).update(contact_id, {"fit_score": str(score)})
+
+
+def domain_of(props: dict) -> str:
+    email = (props.get("email") or "").lower()
+    return email.split("@")[-1] if "@" in email else ""
 
 
-def main():
+def main(batch: int = 5000):
     """
-    Fetch contacts from HubSpot and assign fit_score based on email domain matching.
+    Fetch contacts from HubSpot and assign fit_score based on email domain
+    matching plus an engagement bonus from logged opens/clicks/replies
+    (event_store.py); only contacts whose score actually changed are
+    written back.
     """
+    seen = changed = 0
     try:
-        page = hs.crm.contacts.basic_api.get_page(limit=100)
-    except ApiException as e:
-        print(f"❌ Failed to fetch contacts: {e}")
-        return
-
-    for c in page.results:
-        props = c.properties
-        email = props.get("email", "").lower()
-        domain = email.split("@")[-1] if "@" in email else ""
+        mirror = contact_mirror()
+        with span("ranker.sync"):
+            mirror.sync(hubspot_client())                                 # incremental
 
-        # Determine score by matching domain against signals
-        score = 0
-        for idx, sig in enumerate(signals):
-            if sig in domain:
-                score = 100 - idx * 10
-                break
+        eng = engagement()                  # per-contact aggregates, None if no events yet
+        chunk = []
+        def rescore():
+            nonlocal changed
+            with span("ranker.score_batch"):
+                scores = matcher().score_many(domain_of(c.properties) for c in chunk)
+                if eng is not None:
+                    bonus = eng.points(c.id for c in chunk)
+                    scores = [s + int(b) for s, b in zip(scores, bonus)]
+            for c, score in zip(chunk, scores):
+                if c.properties.get("fit_score") != str(score):   # diff-only
+                    update_score(c.id, score)
+                    changed += 1
+            chunk.clear()
 
-        update_score(c.id, score)
+        for c in mirror.iter_all():                         # whole portal, local
+            chunk.append(c)
+            seen += 1
+            if len(chunk) >= batch:
+                rescore()
+        rescore()
+        count("ranker.scored", seen)
+        count("ranker.changed", changed)
+        print(f"✔ Scored {seen} contacts, {changed} changed")
+    except hubspot_error() as e:
+        print(f"❌ Failed to fetch contacts: {e}")
+    finally:
+        close_shared_writer()             # flush + report failed IDs
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+"""Small pool of authenticated, reusable SMTP connections.
+
+One TLS handshake + LOGIN per session instead of per message:
+
+    with SMTPPool(host, port, user, pw, size=2) as pool:
+        for msg in messages:
+            pool.send(msg)
+
+A connection is NOOP-checked when it has been idle for `noop_after`
+seconds, recycled after `max_per_session` messages (Gmail and friends
+cap messages per session) and transparently re-opened once if the
+server hangs up mid-send.
+"""
+
+from __future__ import annotations
+
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import EmailMessage
+
+from metrics import span, count
+
+
+class _Conn:
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp, self.sent, self.last_used = smtp, 0, time.monotonic()
+
+
+# server said "come back later / new session please" → reconnect + retry
+_RECONNECT = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+_RECONNECT_CODES = {421, 451, 454}
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str | None = None,
+        password: str | None = None,
+        *,
+        size: int = 2,
+        max_per_session: int = 90,
+        noop_after: float = 30.0,
+        use_ssl: bool | None = None,
+        timeout: float = 30.0,
+    ):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.size = size
+        self.max_per_session = max_per_session
+        self.noop_after = noop_after
+        self.use_ssl = (port == 465) if use_ssl is None else use_ssl
+        self.timeout = timeout
+
+        self._idle: queue.LifoQueue[_Conn] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._ctx = ssl.create_default_context() if self.use_ssl else None
+        self.connects = self.sent = 0
+
+    # ── connection lifecycle ─────────────────────────────────────
+    def _open(self) -> _Conn:
+        with span("smtp.connect"):
+            return self._connect()
+
+    def _connect(self) -> _Conn:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, context=self._ctx, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+        if self.user:
+            smtp.login(self.user, self.password or "")
+        self.connects += 1
+        return _Conn(smtp)
+
+    @staticmethod
+    def _drop(conn: _Conn) -> None:
+        try:
+            conn.smtp.quit()
+        except Exception:
+            try:
+                conn.smtp.close()
+            except Exception:
+                pass
+
+    def _healthy(self, conn: _Conn) -> bool:
+        if conn.sent >= self.max_per_session:
+            return False
+        if time.monotonic() - conn.last_used < self.noop_after:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> _Conn:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if self._healthy(conn):
+                    return conn
+                self._drop(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: _Conn | None) -> None:
+        if conn is not None:
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+        self._slots.release()
+
+    # ── public API ───────────────────────────────────────────────
+    def send(self, msg: EmailMessage) -> None:
+        """Send one message on a pooled session; reconnect once if it went stale."""
+        conn = self._checkout()
+        try:
+            for attempt in (0, 1):
+                try:
+                    conn.smtp.send_message(msg)
+                    conn.sent += 1
+                    self.sent += 1
+                    return
+                except smtplib.SMTPResponseException as e:
+                    if attempt or e.smtp_code not in _RECONNECT_CODES:
+                        raise
+                except _RECONNECT:
+                    if attempt:
+                        raise
+                count("smtp.reconnects")
+                self._drop(conn)
+                conn = None
+                conn = self._open()
+        except BaseException:
+            if conn is not None:
+                self._drop(conn)
+            conn = None
+            raise
+        finally:
+            self._checkin(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._drop(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def __enter__(self) -> "SMTPPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,279 @@
+"""Who we must never email, checked before any draft is paid for.
+
+Sources, compiled into one membership index:
+
+  • config/icp.json "exclusionRules" – each rule is one of
+        "citadel.com" / "@citadel.com"     a domain (and its subdomains)
+        "jane@citadel.com"                 one address
+        {"property": "jobtitle", "contains": "recruit"}
+        {"property": "company",  "equals": "Acme"}
+        {"property": "jobtitle", "regex": "^intern"}
+  • HubSpot unsubscribes / hard bounces (hs_email_optout,
+    hs_email_hard_bounce_reason_enum on the mirrored contact)
+  • reply senders (reply_watcher) and SMTP-refused recipients (sequencer),
+    persisted in .cache/suppression.sqlite as they happen
+  • a do-not-contact file, one address or domain per line (# comments),
+    imported into the same SQLite table whenever it changes (removing a
+    line later doesn't lift it – delete the row)
+
+Addresses and domains live in hash sets. Past SUPPRESSION_SET_MAX rows
+the stored list is held as a Bloom filter instead and its (rare) hits are
+confirmed against SQLite in one query per batch, so memory stays flat for
+very large lists and answers stay exact.
+
+    index = suppression_index()
+    keep  = index.filter(contacts)          # counts suppression.skipped.<reason>
+
+Env
+  SUPPRESSION_PATH     default .cache/suppression.sqlite
+  DNC_PATH             default config/do_not_contact.txt (optional)
+  SUPPRESSION_SET_MAX  default 200 000 stored entries before switching to Bloom
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from clients import ROOT, icp_config
+from metrics import count
+
+try:
+    import mmh3
+except ImportError:                       # hashlib fallback, same bit layout idea
+    mmh3 = None
+
+SET_MAX  = int(os.getenv("SUPPRESSION_SET_MAX", 200_000))
+DNC_PATH = Path(os.getenv("DNC_PATH", ROOT / "config" / "do_not_contact.txt"))
+
+def _norm(value: str) -> str:
+    return (value or "").strip().lower().lstrip("@")
+
+
+def _domains(addr: str) -> list[str]:
+    """'a@mail.citadel.com' → ['mail.citadel.com', 'citadel.com', 'com']."""
+    host = addr.rpartition("@")[2]
+    parts = host.split(".")
+    return [".".join(parts[i:]) for i in range(len(parts))] if host else []
+
+
+# ── Bloom filter ─────────────────────────────────────────────────
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing, k probes)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.m = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _probes(self, s: str):
+        if mmh3 is not None:
+            h1, h2 = mmh3.hash64(s, signed=False)
+        else:
+            d = hashlib.blake2b(s.encode(), digest_size=16).digest()
+            h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little")
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, s: str) -> None:
+        for p in self._probes(s):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, s: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._probes(s))
+
+
+# ── persisted list (replies, bounces, imported DNC) ─────────────
+class SuppressionStore:
+    def __init__(self, path: str | Path | None = None):
+        path = Path(path or os.getenv("SUPPRESSION_PATH", ROOT / ".cache" / "suppression.sqlite"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   timeout=30)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS suppressed (
+                value  TEXT PRIMARY KEY,          -- address or domain, lower-case
+                reason TEXT NOT NULL,
+                added  REAL NOT NULL
+            );
+        """)
+
+    def add(self, values, reason: str) -> int:
+        rows = [(v, reason, time.time()) for v in map(_norm, values) if v]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO suppressed VALUES (?, ?, ?)", rows)
+            return self._db.total_changes - before
+
+    def version(self) -> tuple[int, int]:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM suppressed").fetchone()
+
+    def iter_all(self, batch: int = 10_000):
+        with self._lock:
+            cur = self._db.execute("SELECT value, reason FROM suppressed")
+            while rows := cur.fetchmany(batch):
+                yield from rows
+
+    def lookup(self, values: list[str]) -> dict[str, str]:
+        """{value: reason} for the values that are stored (exact check)."""
+        out = {}
+        with self._lock:
+            for i in range(0, len(values), 500):
+                chunk = values[i:i + 500]
+                q = f"SELECT value, reason FROM suppressed WHERE value IN ({','.join('?' * len(chunk))})"
+                out.update(self._db.execute(q, chunk).fetchall())
+        return out
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# ── compiled index ───────────────────────────────────────────────
+def _compile_rules(rules: list) -> tuple[dict[str, str], list]:
+    """exclusionRules → ({address|domain: reason}, [(property, predicate, reason)])."""
+    values, preds = {}, []
+    for rule in rules or []:
+        if isinstance(rule, str):
+            values[_norm(rule)] = "excluded"
+            continue
+        prop = rule.get("property")
+        if not prop:
+            raise ValueError(f"exclusion rule needs a property: {rule!r}")
+        if "equals" in rule:
+            want = str(rule["equals"]).strip().lower()
+            preds.append((prop, lambda v, w=want: v.strip().lower() == w, "excluded"))
+        elif "contains" in rule:
+            want = str(rule["contains"]).lower()
+            preds.append((prop, lambda v, w=want: w in v.lower(), "excluded"))
+        elif "regex" in rule:
+            rx = re.compile(rule["regex"], re.I)
+            preds.append((prop, lambda v, r=rx: bool(r.search(v)), "excluded"))
+        else:
+            raise ValueError(f"exclusion rule needs equals/contains/regex: {rule!r}")
+    preds += [
+        ("hs_email_optout", lambda v: v.lower() == "true", "unsubscribed"),
+        ("hs_email_hard_bounce_reason_enum", bool, "bounced"),
+    ]
+    return values, preds
+
+
+def _read_dnc(path: Path) -> list[str]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [v for v in (_norm(line.split("#", 1)[0]) for line in f) if v]
+
+
+class SuppressionIndex:
+    def __init__(self, store: SuppressionStore, rules: list | None = None,
+                 set_max: int = SET_MAX):
+        self.store = store
+        self.values, self.preds = _compile_rules(rules)
+        n, _ = store.version()
+        self.bloom = None
+        if n > set_max:                    # big list: Bloom in memory, SQLite confirms
+            self.bloom = BloomFilter(n)
+            for v, _ in store.iter_all():
+                self.bloom.add(v)
+        else:
+            for v, reason in store.iter_all():
+                self.values.setdefault(v, reason)
+
+    def _stored(self, keys: list[str]) -> dict[str, str]:
+        if self.bloom is None:
+            return {}
+        maybe = [k for k in keys if k in self.bloom]
+        return self.store.lookup(maybe) if maybe else {}
+
+    def reasons(self, contacts: list) -> list[str | None]:
+        """Why each contact is suppressed (None = OK to email), in bulk."""
+        emails = [_norm(c.properties.get("email") or "") for c in contacts]
+        keys = {k for e in emails for k in [e, *_domains(e)] if k}
+        stored = self._stored(sorted(keys))
+        out = []
+        for c, e in zip(contacts, emails):
+            reason = None
+            for k in (e, *_domains(e)):
+                reason = self.values.get(k) or stored.get(k)
+                if reason:
+                    break
+            if reason is None:
+                for prop, pred, why in self.preds:
+                    v = c.properties.get(prop)
+                    if v and pred(str(v)):
+                        reason = why
+                        break
+            out.append(reason)
+        return out
+
+    def filter(self, contacts: list) -> list:
+        """Contacts that may be emailed; skips are counted and printed."""
+        if not contacts:
+            return contacts
+        keep, skipped = [], Counter()
+        for c, reason in zip(contacts, self.reasons(contacts)):
+            if reason is None:
+                keep.append(c)
+            else:
+                skipped[reason] += 1
+        if skipped:
+            count("suppression.skipped", sum(skipped.values()))
+            for reason, n in skipped.items():
+                count(f"suppression.skipped.{reason}", n)
+            print(f"🚫 {sum(skipped.values())} contact(s) suppressed ("
+                  + ", ".join(f"{r} {n}" for r, n in skipped.most_common()) + ")")
+        return keep
+
+
+# ── process-wide access ──────────────────────────────────────────
+_store: SuppressionStore | None = None
+_index: SuppressionIndex | None = None
+_index_key = None
+_dnc_seen = None
+_lock = threading.Lock()
+
+
+def default_store() -> SuppressionStore:
+    global _store
+    with _lock:
+        if _store is None:
+            _store = SuppressionStore()
+        return _store
+
+
+def suppression_index() -> SuppressionIndex:
+    """The compiled index, rebuilt when the stored list, DNC file or rules change."""
+    global _index, _index_key, _dnc_seen
+    store = default_store()
+    st = DNC_PATH.stat() if DNC_PATH.exists() else None
+    dnc = st and (st.st_mtime_ns, st.st_size)
+    with _lock:
+        if dnc and dnc != _dnc_seen:
+            store.add(_read_dnc(DNC_PATH), "do_not_contact")
+        _dnc_seen = dnc
+    rules = icp_config().get("exclusionRules") or []
+    key = (store.version(), repr(rules))
+    with _lock:
+        if _index is None or key != _index_key:
+            _index, _index_key = SuppressionIndex(store, rules), key
+        return _index
+
+
+def suppress(values, reason: str) -> int:
+    """Persist addresses/domains (e.g. reply senders, bounces); returns how many were new."""
+    if isinstance(values, str):
+        values = [values]
+    added = default_store().add(values, reason)
+    if added:
+        count(f"suppression.added.{reason}", added)
+    return added
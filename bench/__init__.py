@@ -0,0 +1 @@
+"""Offline benchmarks and local stand-ins for the services the agents call."""
@@ -0,0 +1,75 @@
+"""Tiny threaded HTTP server base shared by the fake services.
+
+Every fake takes `latency` (seconds added to each request) and
+`error_rate` (share of requests answered with `error_status`) so a bench
+can see how the agents behave when a provider is slow or flaky.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"          # keep-alive, like the real APIs
+    disable_nagle_algorithm = True         # no 40 ms delayed-ACK stalls
+
+    def log_message(self, *args):          # silence per-request logging
+        pass
+
+    # helpers ---------------------------------------------------------
+    def read_json(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        return json.loads(raw) if raw else None
+
+    def send_json(self, status: int, payload, headers: dict | None = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def chaos(self) -> bool:
+        """Apply latency; answer with an injected error and return True if rolled."""
+        srv = self.server
+        srv.requests += 1
+        if srv.latency:
+            time.sleep(srv.latency)
+        if srv.error_rate and random.random() < srv.error_rate:
+            srv.errors += 1
+            self.send_json(srv.error_status, {"error": {"message": "injected"}},
+                           {"Retry-After": "0"})
+            return True
+        return False
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 429, port: int = 0):
+        super().__init__(("127.0.0.1", port), handler)
+        self.latency, self.error_rate, self.error_status = latency, error_rate, error_status
+        self.requests = self.errors = 0
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
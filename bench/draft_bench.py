@@ -0,0 +1,67 @@
+"""Compare sequential draft_email() with concurrent draft_emails().
+
+    python -m bench.draft_bench --contacts 200 --latency 0.3 --errors 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.fake_openai import FakeOpenAI
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--contacts", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--errors", type=float, default=0.0, help="share of 429s")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--skip-sequential", action="store_true")
+    args = ap.parse_args()
+
+    with FakeOpenAI(latency=args.latency, error_rate=args.errors) as srv:
+        os.environ["OPENAI_BASE_URL"] = srv.url + "/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+        os.environ.setdefault("DRAFT_CACHE_PATH",              # cold cache per run
+                              os.path.join(tempfile.mkdtemp(), "drafts.sqlite"))
+        sys.path.insert(0, str(ROOT / "agents"))
+        import copy_crafter
+
+        contacts = [
+            {"hs_object_id": str(i), "firstname": f"F{i}", "company": f"Co{i}"}
+            for i in range(args.contacts)
+        ]
+
+        if not args.skip_sequential:
+            t0 = time.perf_counter()
+            for p in contacts[: min(20, len(contacts))]:
+                try:                     # distinct ids: don't warm the cache
+                    copy_crafter.draft_email({**p, "firstname": "Seq" + p["firstname"]})
+                except Exception:
+                    pass
+            seq = (time.perf_counter() - t0) / min(20, len(contacts))
+            print(f"sequential : {seq * 1000:7.1f} ms/draft "
+                  f"(≈{seq * args.contacts:.1f}s for {args.contacts})")
+
+        t0 = time.perf_counter()
+        out = copy_crafter.draft_emails(contacts, concurrency=args.concurrency)
+        dt = time.perf_counter() - t0
+        ok = sum(b is not None for b in out)
+        print(f"concurrent : {dt:.2f}s for {args.contacts} "
+              f"({args.contacts / dt:.1f} drafts/s, {ok} ok, "
+              f"{srv.errors} injected errors)")
+
+        t0 = time.perf_counter()
+        copy_crafter.draft_emails(contacts, concurrency=args.concurrency)
+        print(f"re-run     : {time.perf_counter() - t0:.3f}s (draft cache)")
+
+
+if __name__ == "__main__":
+    main()
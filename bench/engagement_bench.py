@@ -0,0 +1,55 @@
+"""Engagement aggregates over the event log, as signal_ranker uses them.
+
+    python -m bench.engagement_bench --contacts 100000 --events 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--contacts", type=int, default=100_000, help="portal size scored")
+    ap.add_argument("--events", default="100000,1000000", help="comma list of log sizes")
+    args = ap.parse_args()
+
+    sys.path.insert(0, str(ROOT / "agents"))
+    from event_store import KINDS, EventStore
+
+    rng = np.random.default_rng(0)
+    store, have = EventStore(tempfile.mkdtemp(prefix="events-bench-")), 0
+    now = time.time()
+    ids = [str(i) for i in range(1, args.contacts + 1)]
+    for n in sorted(int(x) for x in args.events.split(",")):
+        t0 = time.perf_counter()
+        while have < n:
+            step = min(100_000, n - have)
+            store.append(rng.choice(KINDS, step, p=[0.8, 0.17, 0.03]).tolist(),
+                         rng.integers(1, args.contacts * 2, step).tolist(),      # half unknown
+                         (now - rng.exponential(30 * 86400, step)).tolist())
+            have += step
+        append = time.perf_counter() - t0
+        store.aggregate(now)                              # warm the page cache
+        t0 = time.perf_counter()
+        eng = store.aggregate(now)
+        agg = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(0, len(ids), 5000):                # ranker's batches
+            eng.points(ids[i:i + 5000])
+        pts = time.perf_counter() - t0
+        print(f"{n:>9} events ({len(eng.cids)} contacts): aggregate {agg * 1000:7.1f} ms · "
+              f"points for {args.contacts} {pts * 1000:7.1f} ms · "
+              f"total {(agg + pts) * 1000:7.1f} ms  (append {append:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Local stand-in for the HubSpot CRM contacts API (v3).
+
+Point the SDK at it with HubSpot(access_token="x", host=srv.url). Holds an
+in-memory portal of synthetic contacts and implements what the agents
+use: list (get_page), search, single/batch update, create, batch
+read/create/update/upsert. Writes bump `lastmodifieddate`, so
+incremental syncs see them.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+from bench._server import FakeHandler, FakeServer
+
+BASE = "/crm/v3/objects/contacts"
+COMPANIES = ["Man Group", "Bridgewater Associates", "Citadel", "Acme Capital",
+             "Blue Harbor", "Northwind Partners", "Kestrel Macro", "Orchid Funds"]
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _ms(iso: str) -> int:
+    return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def synthetic_portal(n: int, seed: int = 7, emailed_days: tuple = (3, 7)) -> dict[str, dict]:
+    """n contacts; ~10 % were last emailed on each of `emailed_days` days ago,
+    the k-th group being at follow-up step k (so each group is due for one step)."""
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    portal = {}
+    for i in range(1, n + 1):
+        co = rnd.choice(COMPANIES)
+        p = {
+            "hs_object_id": str(i),
+            "email": f"person{i}@{co.replace(' ', '').lower()}.com",
+            "firstname": f"First{i}",
+            "lastname": f"Last{i}",
+            "jobtitle": rnd.choice(["Head of Research", "Portfolio Manager", "Analyst"]),
+            "company": co,
+            "fit_score": str(rnd.choice([0, 0, 0, 50, 80, 90, 100])),
+            "lastmodifieddate": _iso(now - timedelta(minutes=n - i + 1)),
+        }
+        roll = rnd.random()
+        for k, d in enumerate(emailed_days):
+            if roll < 0.1 * (k + 1):
+                p["last_emailed"] = (now - timedelta(days=d)).strftime("%Y-%m-%d")
+                p["followup_step"] = str(k)
+                break
+        portal[str(i)] = p
+    return portal
+
+
+class _Handler(FakeHandler):
+    # ── helpers ─────────────────────────────────────────────────
+    def _obj(self, cid: str, props: list[str] | None = None) -> dict:
+        p = self.server.portal[cid]
+        if props:
+            keep = set(props) | {"hs_object_id", "lastmodifieddate", "createdate"}
+            p = {k: v for k, v in p.items() if k in keep}
+        ts = p.get("lastmodifieddate") or _iso(datetime.now(timezone.utc))
+        return {"id": cid, "properties": dict(p), "createdAt": ts,
+                "updatedAt": ts, "archived": False}
+
+    def _write(self, cid: str, props: dict) -> None:
+        props = {k: (None if v is None else str(v)) for k, v in props.items()}
+        self.server.portal[cid].update(props)
+        self.server.portal[cid]["lastmodifieddate"] = _iso(datetime.now(timezone.utc))
+        self.server.writes += 1
+
+    def _create(self, props: dict) -> str:
+        srv = self.server
+        srv.next_id += 1
+        cid = str(srv.next_id)
+        srv.portal[cid] = {"hs_object_id": cid}
+        self._write(cid, props)
+        return cid
+
+    def _batch(self, results: list) -> dict:
+        now = _iso(datetime.now(timezone.utc))
+        return {"status": "COMPLETE", "results": results, "startedAt": now, "completedAt": now}
+
+    @staticmethod
+    def _match(p: dict, f: dict) -> bool:
+        v, want, op = p.get(f["propertyName"]), f.get("value"), f["operator"]
+        if op == "HAS_PROPERTY":
+            return v not in (None, "")
+        if op == "NOT_HAS_PROPERTY":
+            return v in (None, "")
+        if v is None:
+            return False
+        if f["propertyName"] == "lastmodifieddate":
+            v, want = _ms(v), int(want)
+            hi = int(f.get("highValue") or 0)
+        else:
+            hi = f.get("highValue")
+        return {
+            "EQ": lambda: v == want, "NEQ": lambda: v != want,
+            "GT": lambda: v > want, "GTE": lambda: v >= want,
+            "LT": lambda: v < want, "LTE": lambda: v <= want,
+            "BETWEEN": lambda: want <= v <= hi,
+            "IN": lambda: v in f.get("values", []),
+        }[op]()
+
+    # ── routes ──────────────────────────────────────────────────
+    def do_GET(self):
+        if self.chaos():
+            return
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != BASE:
+            return self.send_json(404, {"message": "not found"})
+        q = parse_qs(url.query)
+        limit = min(int(q.get("limit", ["10"])[0]), 100)
+        start = int(q.get("after", ["0"])[0])
+        props = [p for v in q.get("properties", []) for p in v.split(",") if p] or None
+        with self.server.lock:
+            ids = self.server.ordered_ids()
+            page = ids[start:start + limit]
+            out = {"results": [self._obj(i, props) for i in page]}
+        if start + limit < len(ids):
+            out["paging"] = {"next": {"after": str(start + limit), "link": ""}}
+        self.send_json(200, out)
+
+    def do_PATCH(self):
+        body = self.read_json() or {}
+        if self.chaos():
+            return
+        cid = urlparse(self.path).path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            if cid not in self.server.portal:
+                return self.send_json(404, {"status": "error", "message": "not found"})
+            self._write(cid, body.get("properties", {}))
+            self.send_json(200, self._obj(cid))
+
+    def do_POST(self):
+        body = self.read_json() or {}
+        if self.chaos():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        srv = self.server
+        with srv.lock:
+            if path == BASE:
+                return self.send_json(201, self._obj(self._create(body.get("properties", {}))))
+
+            if path == BASE + "/search":
+                groups = body.get("filterGroups") or [{"filters": []}]
+                hits = [i for i in srv.ordered_ids()
+                        if any(all(self._match(srv.portal[i], f) for f in g.get("filters", []))
+                               for g in groups)]
+                for s in reversed(body.get("sorts") or []):
+                    key = s["propertyName"]
+                    conv = _ms if key == "lastmodifieddate" else (lambda v: v)
+                    hits.sort(key=lambda i: conv(srv.portal[i].get(key) or "0"),
+                              reverse=s.get("direction") == "DESCENDING")
+                start = int(body.get("after") or 0)
+                if start >= 10_000:
+                    return self.send_json(400, {"status": "error", "message": "paging limit"})
+                limit = min(int(body.get("limit") or 10), 200)
+                page = hits[start:start + limit]
+                out = {"total": len(hits),
+                       "results": [self._obj(i, body.get("properties")) for i in page]}
+                if start + limit < len(hits):
+                    out["paging"] = {"next": {"after": str(start + limit), "link": ""}}
+                return self.send_json(200, out)
+
+            if path == BASE + "/batch/update":
+                results = []
+                for inp in body.get("inputs", [])[:100]:
+                    if inp["id"] in srv.portal:
+                        self._write(inp["id"], inp.get("properties", {}))
+                        results.append(self._obj(inp["id"]))
+                return self.send_json(200, self._batch(results))
+
+            if path == BASE + "/batch/create":
+                ids = [self._create(inp.get("properties", {})) for inp in body.get("inputs", [])[:100]]
+                return self.send_json(201, self._batch([self._obj(i) for i in ids]))
+
+            if path in (BASE + "/batch/read", BASE + "/batch/upsert"):
+                id_prop = body.get("idProperty") or "hs_object_id"
+                index = {p.get(id_prop): cid for cid, p in srv.portal.items() if p.get(id_prop)}
+                results = []
+                for inp in body.get("inputs", [])[:100]:
+                    cid = index.get(inp["id"])
+                    if path.endswith("upsert"):
+                        if cid is None:
+                            cid = self._create({id_prop: inp["id"], **inp.get("properties", {})})
+                        else:
+                            self._write(cid, inp.get("properties", {}))
+                    if cid is not None:
+                        results.append(self._obj(cid, body.get("properties")))
+                return self.send_json(200, self._batch(results))
+
+        self.send_json(404, {"message": f"no route {path}"})
+
+
+class FakeHubSpot(FakeServer):
+    def __init__(self, portal: dict[str, dict] | None = None, contacts: int = 0, **kw):
+        super().__init__(_Handler, **kw)
+        self.portal = portal if portal is not None else synthetic_portal(contacts)
+        self.next_id = max((int(i) for i in self.portal), default=0)
+        self.writes = 0
+        self.lock = threading.RLock()
+
+    def ordered_ids(self) -> list[str]:
+        return sorted(self.portal, key=int)
@@ -0,0 +1,171 @@
+"""Local IMAP4rev1 stand-in (plain TCP) for the reply watcher.
+
+Supports CAPABILITY, LOGIN, SELECT, UID SEARCH (UID ranges + UNSEEN; any
+Gmail X-GM-* criteria match everything), UID FETCH of header fields,
+UID STORE of flags, NOOP, IDLE/DONE and LOGOUT. `deliver()` appends a
+message and wakes every IDLE-ing session with `* n EXISTS`.
+"""
+
+from __future__ import annotations
+
+import re
+import socketserver
+import threading
+import time
+
+
+class _Session(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def out(self, line: str | bytes):
+        data = line if isinstance(line, bytes) else line.encode()
+        with self.wlock:
+            self.wfile.write(data + b"\r\n")
+            self.wfile.flush()
+
+    def handle(self):
+        srv = self.server
+        self.wlock = threading.Lock()
+        with srv.lock:
+            srv.sessions += 1
+        self.out("* OK fake-imap ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            if srv.latency:
+                time.sleep(srv.latency)
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            tag, _, rest = line.partition(" ")
+            cmd, _, args = rest.partition(" ")
+            cmd = cmd.upper()
+            if cmd == "CAPABILITY":
+                self.out("* CAPABILITY IMAP4rev1" + (" IDLE" if srv.idle else ""))
+                self.out(f"{tag} OK CAPABILITY completed")
+            elif cmd == "LOGIN":
+                self.out(f"{tag} OK LOGIN completed")
+            elif cmd in ("SELECT", "EXAMINE"):
+                with srv.lock:
+                    n = len(srv.messages)
+                self.out(f"* {n} EXISTS")
+                self.out(f"* OK [UIDVALIDITY {srv.uidvalidity}] UIDs valid")
+                self.out(f"{tag} OK [READ-WRITE] SELECT completed")
+            elif cmd == "UID":
+                self.uid(tag, args)
+            elif cmd == "NOOP":
+                self.out(f"{tag} OK NOOP completed")
+            elif cmd == "IDLE":
+                self.idle(tag)
+            elif cmd == "LOGOUT":
+                self.out("* BYE")
+                self.out(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                self.out(f"{tag} BAD unknown command")
+
+    def idle(self, tag):
+        srv = self.server
+        with srv.lock:
+            srv.idlers.append(self)
+        self.out("+ idling")
+        self.rfile.readline()                       # DONE
+        with srv.lock:
+            srv.idlers.remove(self)
+        self.out(f"{tag} OK IDLE terminated")
+
+    @staticmethod
+    def _uid_set(spec: str, top: int) -> set[int]:
+        out = set()
+        for part in spec.split(","):
+            lo, _, hi = part.partition(":")
+            lo = top if lo == "*" else int(lo)
+            hi = lo if not hi else (top if hi == "*" else int(hi))
+            lo, hi = min(lo, hi), max(lo, hi)
+            out.update(range(lo, hi + 1))
+        return out
+
+    def uid(self, tag, args):
+        srv = self.server
+        sub, _, rest = args.partition(" ")
+        sub = sub.upper()
+        with srv.lock:
+            msgs = dict(srv.messages)
+            top = max(msgs, default=0)
+        if sub == "SEARCH":
+            m = re.search(r"UID (\S+)", rest)
+            uids = self._uid_set(m.group(1), top) if m else set(msgs)
+            if "UNSEEN" in rest.upper():
+                uids = {u for u in uids if u in msgs and "\\Seen" not in msgs[u]["flags"]}
+            if m and not uids and top:
+                uids = {top} if "UNSEEN" not in rest.upper() else set()
+            self.out("* SEARCH " + " ".join(map(str, sorted(u for u in uids if u in msgs))))
+            self.out(f"{tag} OK SEARCH completed")
+        elif sub == "FETCH":
+            spec, _, _ = rest.partition(" ")
+            seqnums = {u: i + 1 for i, u in enumerate(sorted(msgs))}
+            for u in sorted(self._uid_set(spec, top)):
+                if u not in msgs:
+                    continue
+                hdr = msgs[u]["headers"]
+                with srv.lock:
+                    srv.bytes_sent += len(hdr)
+                self.out(f"* {seqnums[u]} FETCH (UID {u} BODY[HEADER.FIELDS (FROM SUBJECT MESSAGE-ID)] {{{len(hdr)}}}")
+                with self.wlock:
+                    self.wfile.write(hdr)
+                self.out(")")
+            self.out(f"{tag} OK FETCH completed")
+        elif sub == "STORE":
+            spec, _, _ = rest.partition(" ")
+            with srv.lock:
+                srv.stores += 1
+                for u in self._uid_set(spec, top):
+                    if u in srv.messages:
+                        srv.messages[u]["flags"].add("\\Seen")
+            self.out(f"{tag} OK STORE completed")
+        else:
+            self.out(f"{tag} BAD unknown UID command")
+
+
+class FakeIMAP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, idle: bool = True, latency: float = 0.0, body_size: int = 50_000,
+                 port: int = 0):
+        super().__init__(("127.0.0.1", port), _Session)
+        self.idle, self.latency, self.body_size = idle, latency, body_size
+        self.uidvalidity = 1
+        self.messages: dict[int, dict] = {}
+        self.idlers: list[_Session] = []
+        self.sessions = self.stores = self.bytes_sent = 0
+        self.lock = threading.RLock()
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def deliver(self, frm: str, subject: str) -> int:
+        with self.lock:
+            uid = max(self.messages, default=0) + 1
+            hdr = (f"From: {frm}\r\nSubject: {subject}\r\n"
+                   f"Message-ID: <{uid}@fake>\r\n\r\n").encode()
+            # the body exists (and would cost bandwidth on RFC822 fetches) but
+            # the header-only fetch never ships it
+            self.messages[uid] = {"headers": hdr, "flags": set(), "size": self.body_size}
+            n = len(self.messages)
+            idlers = list(self.idlers)
+        for s in idlers:
+            s.out(f"* {n} EXISTS")
+        return uid
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,81 @@
+"""Local stand-in for the Cloudflare Workers KV REST API, plus a Slack
+webhook sink.
+
+Implements list keys (cursor-paged), delete value and bulk delete for a
+single namespace; set CF_API_BASE to `srv.url` to point the watcher here.
+"""
+
+from __future__ import annotations
+
+import threading
+from urllib.parse import parse_qs, unquote, urlparse
+
+from bench._server import FakeHandler, FakeServer
+
+
+class _KVHandler(FakeHandler):
+    def do_GET(self):
+        if self.chaos():
+            return
+        url = urlparse(self.path)
+        if not url.path.endswith("/keys"):
+            return self.send_json(404, {"success": False})
+        q = parse_qs(url.query)
+        prefix = q.get("prefix", [""])[0]
+        limit = min(int(q.get("limit", ["1000"])[0]), 1000)
+        start = int(q.get("cursor", ["0"])[0] or 0)
+        with self.server.lock:
+            names = sorted(k for k in self.server.keys if k.startswith(prefix))
+        page = names[start:start + limit]
+        cursor = str(start + limit) if start + limit < len(names) else ""
+        self.send_json(200, {
+            "success": True,
+            "result": [{"name": n} for n in page],
+            "result_info": {"count": len(page), "cursor": cursor},
+        })
+
+    def do_DELETE(self):
+        body = self.read_json()
+        if self.chaos():
+            return
+        path = urlparse(self.path).path
+        with self.server.lock:
+            if path.endswith("/bulk"):
+                for k in body or []:
+                    self.server.keys.discard(k)
+                self.server.bulk_deletes += 1
+            elif "/values/" in path:
+                self.server.keys.discard(unquote(path.rsplit("/values/", 1)[1]))
+                self.server.single_deletes += 1
+            else:
+                return self.send_json(404, {"success": False})
+        self.send_json(200, {"success": True, "result": None})
+
+
+class FakeKV(FakeServer):
+    def __init__(self, keys=(), **kw):
+        super().__init__(_KVHandler, **kw)
+        self.keys = set(keys)
+        self.lock = threading.Lock()
+        self.bulk_deletes = self.single_deletes = 0
+
+
+class _SlackHandler(FakeHandler):
+    def do_POST(self):
+        body = self.read_json() or {}
+        if self.chaos():
+            return
+        with self.server.lock:
+            self.server.messages.append(body.get("text", ""))
+        data = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeSlack(FakeServer):
+    def __init__(self, **kw):
+        super().__init__(_SlackHandler, **kw)
+        self.messages: list[str] = []
+        self.lock = threading.Lock()
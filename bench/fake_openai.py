@@ -0,0 +1,194 @@
+"""Local stand-in for the OpenAI chat-completions, embeddings, files and
+batches endpoints.
+
+    with FakeOpenAI(latency=0.3) as srv:
+        os.environ["OPENAI_BASE_URL"] = srv.url + "/v1"
+
+Embeddings are hashed bags of words, so texts sharing words come out
+similar – enough for near-duplicate checks. Batches finish `batch_delay` seconds after creation (checked on retrieve);
+`batch_error_rate` of their lines land in the error file instead.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import random
+import re
+import struct
+import zlib
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from bench._server import FakeHandler, FakeServer
+
+CANNED = (
+    "Subject: Policy signals for {name}\n"
+    "Hi {name},\n\nBilby.ai turns government policy into quant signals. "
+    "Would a quick chat help? {{cal}}\n\nBest regards, {{sender_name}}"
+)
+
+
+def _completion(srv, body: dict) -> dict:
+    prompt = body["messages"][-1]["content"]
+    with srv.lock:
+        srv.completions += 1
+        n = srv.completions
+    text = CANNED.format(name=f"#{n}")
+    return {
+        "id": f"chatcmpl-{n}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": text},
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(text) // 4,
+            "total_tokens": (len(prompt) + len(text)) // 4,
+        },
+    }
+
+
+def _embedding(text: str, dim: int) -> list[float]:
+    v = [0.0] * dim
+    for tok in re.findall(r"\w+", text.lower()):
+        h = zlib.crc32(tok.encode())
+        v[h % dim] += 1.0 if h & 1 << 31 else -1.0
+    return v
+
+
+class _Handler(FakeHandler):
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/files"):
+            return self._upload()
+        body = self.read_json() or {}
+        if self.chaos():
+            return
+        if path.endswith("/chat/completions"):
+            self.send_json(200, _completion(self.server, body))
+        elif path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif path.endswith("/batches"):
+            self._create_batch(body)
+        else:
+            self.send_json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def do_GET(self):
+        srv, path = self.server, self.path.rstrip("/")
+        srv.requests += 1
+        parts = path.split("/")
+        if "/files/" in path and path.endswith("/content"):
+            data = srv.files.get(parts[-2])
+            if data is None:
+                return self.send_json(404, {"error": {"message": "no such file"}})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif "/batches/" in path:
+            b = srv.batches.get(parts[-1])
+            if b is None:
+                return self.send_json(404, {"error": {"message": "no such batch"}})
+            self._maybe_finish(b)
+            self.send_json(200, b)
+        else:
+            self.send_json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def _embeddings(self, body: dict):
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions") or 1536
+        data = []
+        for i, t in enumerate(texts):
+            v = _embedding(t, dim)
+            if body.get("encoding_format") == "base64":      # the SDK's default
+                v = base64.b64encode(struct.pack(f"<{dim}f", *v)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": v})
+        tokens = sum(len(t) for t in texts) // 4
+        self.send_json(200, {"object": "list", "data": data, "model": body.get("model"),
+                             "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    # ── files / batches ─────────────────────────────────────────
+    def _upload(self):
+        srv = self.server
+        srv.requests += 1
+        n = int(self.headers.get("Content-Length") or 0)
+        head = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        msg = BytesParser(policy=HTTP).parsebytes(head + self.rfile.read(n))
+        fields = {p.get_param("name", header="content-disposition"): p for p in msg.iter_parts()}
+        data = fields["file"].get_payload(decode=True)
+        fid = self._file_id(data)
+        self.send_json(200, {
+            "id": fid, "object": "file", "bytes": len(data),
+            "created_at": int(time.time()), "filename": "drafts.jsonl",
+            "purpose": fields["purpose"].get_content().strip(), "status": "processed",
+        })
+
+    def _file_id(self, data: bytes) -> str:
+        srv = self.server
+        with srv.lock:
+            fid = f"file-{len(srv.files) + 1}"
+            srv.files[fid] = data
+        return fid
+
+    def _create_batch(self, body: dict):
+        srv = self.server
+        lines = srv.files[body["input_file_id"]].decode().splitlines()
+        with srv.lock:
+            bid = f"batch_{len(srv.batches) + 1}"
+            srv.batches[bid] = {
+                "id": bid, "object": "batch", "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "status": "in_progress", "created_at": int(time.time()),
+                "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                "_ready": time.monotonic() + srv.batch_delay,
+            }
+            self.send_json(200, srv.batches[bid])
+
+    def _maybe_finish(self, b: dict):
+        srv = self.server
+        with srv.lock:
+            if b["status"] != "in_progress" or time.monotonic() < b["_ready"]:
+                return
+            b["status"] = "finalizing"
+        ok, bad = [], []
+        for line in srv.files[b["input_file_id"]].decode().splitlines():
+            req = json.loads(line)
+            if random.random() < srv.batch_error_rate:
+                bad.append({"id": f"req_{len(bad)}", "custom_id": req["custom_id"],
+                            "response": {"status_code": 500, "body": {}},
+                            "error": {"code": "server_error", "message": "injected"}})
+            else:
+                ok.append({"id": f"req_{len(ok)}", "custom_id": req["custom_id"],
+                           "response": {"status_code": 200, "request_id": f"r{len(ok)}",
+                                        "body": _completion(srv, req["body"])},
+                           "error": None})
+        dump = lambda recs: "".join(json.dumps(r) + "\n" for r in recs).encode()
+        b["output_file_id"] = self._file_id(dump(ok)) if ok else None
+        b["error_file_id"] = self._file_id(dump(bad)) if bad else None
+        b["request_counts"] = {"total": len(ok) + len(bad), "completed": len(ok), "failed": len(bad)}
+        b["status"] = "completed"
+
+    def send_json(self, status: int, payload, headers: dict | None = None):
+        if isinstance(payload, dict) and any(k.startswith("_") for k in payload):
+            payload = {k: v for k, v in payload.items() if not k.startswith("_")}
+        super().send_json(status, payload, headers)
+
+
+class FakeOpenAI(FakeServer):
+    def __init__(self, batch_delay: float = 0.0, batch_error_rate: float = 0.0, **kw):
+        super().__init__(_Handler, **kw)
+        self.batch_delay, self.batch_error_rate = batch_delay, batch_error_rate
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.completions = 0
+        self.lock = threading.Lock()
@@ -0,0 +1,104 @@
+"""Local SMTP sink: speaks just enough ESMTP (EHLO, AUTH, MAIL/RCPT/DATA,
+NOOP, RSET, QUIT) for smtplib, without TLS.
+
+`connect_latency` models the TLS handshake + LOGIN cost a real provider
+charges per session, `latency` the per-message cost, and
+`max_per_session` makes the server drop a session after N messages with
+a 421 the way Gmail does.
+"""
+
+from __future__ import annotations
+
+import socketserver
+import threading
+import time
+
+
+class _Session(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+        self.wfile.flush()
+
+    def handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.sessions += 1
+        if srv.connect_latency:
+            time.sleep(srv.connect_latency)
+        self.reply("220 fake-smtp ready")
+        sent = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                self.wfile.flush()
+            elif verb == "AUTH":
+                if cmd.upper().startswith("AUTH LOGIN"):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                if srv.max_per_session and sent >= srv.max_per_session:
+                    self.reply("421 4.7.0 Too many messages this session")
+                    return
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk == b".\r\n":
+                        break
+                    size += len(chunk)
+                if srv.latency:
+                    time.sleep(srv.latency)
+                sent += 1
+                with srv.lock:
+                    srv.messages += 1
+                    srv.bytes += size
+                self.reply("250 OK queued")
+            elif verb in ("NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency: float = 0.0, latency: float = 0.0,
+                 max_per_session: int = 0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Session)
+        self.connect_latency, self.latency = connect_latency, latency
+        self.max_per_session = max_per_session
+        self.sessions = self.messages = self.bytes = 0
+        self.lock = threading.Lock()
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,55 @@
+"""Events/second for the open/click watcher against a local KV + Slack.
+
+    python -m bench.kv_bench --events 5000 --latency 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bench.fake_kv import FakeKV, FakeSlack
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--latency", type=float, default=0.005, help="s per KV/Slack call")
+    ap.add_argument("--workers", type=int, default=8)
+    args = ap.parse_args()
+
+    keys = [f"{'open' if i % 3 else 'click'}:{1_700_000_000 + i}:{i}" for i in range(args.events)]
+    with FakeKV(keys, latency=args.latency) as kv, FakeSlack(latency=args.latency) as sl:
+        os.environ.update(CF_API_BASE=kv.url, CF_ACCOUNT_ID="acct", CF_KV_NS="ns",
+                          CF_API_TOKEN="t", SLACK_WEBHOOK=sl.url + "/hook",
+                          WATCHER_WORKERS=str(args.workers))
+        sys.path.insert(0, str(ROOT / "agents"))
+        import open_click_watcher as w
+
+        sample = keys[:200]                   # old path: serial handle + delete
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            for k in sample:
+                w.handle_event(k)
+            serial = len(sample) / (time.perf_counter() - t0)
+        print(f"serial  : {serial:.0f} events/s")
+
+        with ThreadPoolExecutor(args.workers) as pool, contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            n = w.poll_once(pool)
+            dt = time.perf_counter() - t0
+        print(f"drained : {n} events in {dt:.2f}s → {n / dt:.0f} events/s "
+              f"({len(kv.keys)} left, {kv.bulk_deletes} bulk deletes, "
+              f"{len(sl.messages)} Slack posts, {kv.requests} KV requests)")
+
+
+if __name__ == "__main__":
+    main()
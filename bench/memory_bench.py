@@ -0,0 +1,51 @@
+"""Similarity-search latency of the in-process vector memory as it grows.
+
+    python -m bench.memory_bench --rows 100000,300000 --queries 25
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", default="10000,100000,300000", help="comma list of index sizes")
+    ap.add_argument("--queries", type=int, default=25, help="queries per batched search")
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    sys.path.insert(0, str(ROOT / "agents"))
+    from memory import NumpyIndex
+
+    rng = np.random.default_rng(0)
+    idx, have = NumpyIndex(tempfile.mkdtemp(prefix="memory-bench-"), dim=args.dim), 0
+    for n in sorted(int(x) for x in args.rows.split(",")):
+        while have < n:
+            step = min(50_000, n - have)
+            idx.add("sent", ["x"] * step, rng.standard_normal((step, args.dim), dtype=np.float32))
+            have += step
+        q = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        idx.search(q[:1], args.k)                       # warm the page cache
+        t0 = time.perf_counter()
+        idx.search(q, args.k)
+        batched = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for row in q[:5]:
+            idx.search(row, args.k)
+        single = (time.perf_counter() - t0) / 5
+        print(f"{n:>8} rows: {args.queries} queries batched {batched * 1000:7.1f} ms "
+              f"({batched / args.queries * 1000:5.2f} ms/query) · one-by-one {single * 1000:7.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
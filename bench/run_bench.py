@@ -0,0 +1,245 @@
+"""Offline end-to-end benchmarks for the agents.
+
+Every scenario runs the real agent code in a fresh subprocess against
+in-process stand-ins (bench/fake_*.py) for HubSpot, OpenAI, SMTP, IMAP,
+Cloudflare KV and Slack, over a synthetic portal:
+
+    python -m bench.run_bench                         # all scenarios, 1k contacts
+    python -m bench.run_bench -s rank,followup -n 1000,10000,100000
+    python -m bench.run_bench --hs-latency 0.05 --openai-latency 0.4 --error-rate 0.02
+    python -m bench.run_bench --save                  # record as the new baseline
+
+Scenarios
+  rank      signal_ranker.main()  (full mirror sync + score + batched writes)
+  send      sequencer.main()      (top-5 first touch)
+  followup  followup_sequencer.main()
+  replies   reply_watcher: one header-only fetch of n/10 new replies
+  events    open_click_watcher.poll_once() over n/2 KV events
+  ingest    n/2 events POSTed to event_ingest.py in batches of 500, until handled
+
+Reported per run: items/s, wall time, peak RSS and p50/p95 per stage
+(from agents/metrics.py). Results are compared with bench/baselines.json;
+a throughput drop or memory growth beyond --tolerance exits non-zero.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).resolve().parent / "baselines.json"
+SCENARIOS = ["rank", "send", "followup", "replies", "events", "ingest"]
+
+
+# ── child: run one scenario inside the prepared environment ────────
+def _child(scenario: str, n: int) -> dict:
+    sys.path.insert(0, str(ROOT / "agents"))
+    import metrics
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        t0 = time.perf_counter()
+        if scenario == "rank":
+            import signal_ranker
+            signal_ranker.main()
+            items = n
+        elif scenario == "send":
+            import sequencer
+            sequencer.main()
+            items = metrics.snapshot()["counters"].get("emails.sent", 0)
+        elif scenario == "followup":
+            import followup_sequencer
+            followup_sequencer.main()
+            items = metrics.snapshot()["counters"].get("emails.sent", 0)
+        elif scenario == "replies":
+            import reply_watcher
+            w = reply_watcher.ReplyWatcher()
+            w.connect()
+            items = len(w.fetch_new())
+            w.close()
+        elif scenario == "events":
+            from concurrent.futures import ThreadPoolExecutor
+            import open_click_watcher
+            with ThreadPoolExecutor(open_click_watcher.WORKERS) as pool:
+                items = open_click_watcher.poll_once(pool)
+        elif scenario == "ingest":
+            import threading
+            import requests
+            import event_ingest
+            stop = threading.Event()
+            threading.Thread(target=event_ingest.serve, args=(stop,), daemon=True).start()
+            url = f"http://{event_ingest.HOST}:{event_ingest.PORT}"
+            s = requests.Session()
+            while True:
+                try:
+                    s.get(url + "/healthz", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    time.sleep(0.02)
+            t0 = time.perf_counter()                     # don't time uvicorn's startup
+            keys = [f"{'open' if i % 3 else 'click'}:{1_700_000_000 + i}:{i}"
+                    for i in range(max(1, n // 2))]
+            for i in range(0, len(keys), 500):
+                while s.post(url + "/events", json=keys[i:i + 500]).status_code == 429:
+                    time.sleep(0.05)
+            while (items := s.get(url + "/healthz").json()["handled"]) < len(keys):
+                time.sleep(0.01)
+            stop.set()
+        else:
+            raise SystemExit(f"unknown scenario {scenario}")
+        wall = time.perf_counter() - t0
+
+    return {
+        "items": items,
+        "wall_s": round(wall, 4),
+        "items_per_s": round(items / wall, 2) if wall else 0.0,
+        "maxrss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": metrics.snapshot()["stages"],
+    }
+
+
+# ── parent: start fakes, spawn the child, collect results ─────────
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run(scenario: str, n: int, args) -> dict:
+    from bench.fake_hubspot import FakeHubSpot
+    from bench.fake_imap import FakeIMAP
+    from bench.fake_kv import FakeKV, FakeSlack
+    from bench.fake_openai import FakeOpenAI
+    from bench.fake_smtp import FakeSMTP
+
+    tmp = Path(tempfile.mkdtemp(prefix=f"bench-{scenario}-"))
+    http = {"latency": args.hs_latency, "error_rate": args.error_rate}
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(ROOT),
+        GTM_METRICS="json", METRICS_DIR=str(tmp),
+        MIRROR_PATH=str(tmp / "contacts.sqlite"),
+        DRAFT_CACHE_PATH=str(tmp / "drafts.sqlite"),
+        OUTBOX_PATH=str(tmp / "outbox.sqlite"),
+        SUPPRESSION_PATH=str(tmp / "suppression.sqlite"),
+        EVENTS_DIR=str(tmp / "events"),
+        MAILBOXES_PATH=str(tmp / "mailboxes.json"),
+        INGEST_PORT=str(_free_port()),
+        REPLY_STATE_PATH=str(tmp / "replies.json"),
+        HUBSPOT_TOKEN="fake", OPENAI_API_KEY="sk-fake",
+        SMTP_USER="bench@example.com", SMTP_PASS="x", SMTP_SSL="0",
+        IMAP_SSL="0", CF_ACCOUNT_ID="acct", CF_KV_NS="ns", CF_API_TOKEN="t",
+        RATE_SMTP="1000000/1s", RATE_HUBSPOT=f"{args.hs_rate}/10s",
+        RATE_CLOUDFLARE="1000000/1s",
+        OPENAI_RPM=str(args.openai_rpm), OPENAI_TPM=str(args.openai_rpm * 1000),
+        BENCH_RESULT=str(tmp / "result.json"),
+        FOLLOWUP_DRAFT_MODE="batch" if args.batch else "sync", BATCH_POLL="0.2",
+    )
+
+    with contextlib.ExitStack() as stack:
+        hs = stack.enter_context(FakeHubSpot(contacts=n, **http))
+        oa = stack.enter_context(FakeOpenAI(latency=args.openai_latency, error_rate=args.error_rate))
+        smtp = stack.enter_context(FakeSMTP(connect_latency=args.smtp_handshake,
+                                            latency=args.smtp_latency, max_per_session=90))
+        imap = stack.enter_context(FakeIMAP())
+        kv = stack.enter_context(FakeKV(latency=args.kv_latency))
+        slack = stack.enter_context(FakeSlack(latency=args.kv_latency))
+        env.update(
+            HUBSPOT_API_BASE=hs.url, OPENAI_BASE_URL=oa.url + "/v1",
+            SMTP_HOST=smtp.host, SMTP_PORT=str(smtp.port),
+            IMAP_HOST=imap.host, IMAP_PORT=str(imap.port),
+            CF_API_BASE=kv.url, SLACK_WEBHOOK=slack.url + "/hook",
+        )
+        if scenario == "replies":
+            for i in range(max(1, n // 10)):
+                imap.deliver(f"prospect{i}@example.com", f"Re: idea {i}")
+        if scenario == "events":
+            kv.keys.update(f"{'open' if i % 3 else 'click'}:{1_700_000_000 + i}:{i}"
+                           for i in range(max(1, n // 2)))
+
+        code = (f"import json, os, sys; from bench.run_bench import _child; "
+                f"json.dump(_child({scenario!r}, {n}), open(os.environ['BENCH_RESULT'], 'w'))")
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"error": (proc.stderr.strip().splitlines() or ["?"])[-1]}
+        res = json.loads((tmp / "result.json").read_text())
+        res["requests"] = {"hubspot": hs.requests, "openai": oa.requests,
+                           "smtp_sessions": smtp.sessions, "kv": kv.requests}
+        return res
+
+
+def _compare(key: str, res: dict, base: dict | None, tol: float) -> list[str]:
+    if not base or "error" in res:
+        return []
+    out = []
+    if base["items_per_s"] and res["items_per_s"] < base["items_per_s"] * (1 - tol):
+        out.append(f"{key}: throughput {res['items_per_s']}/s < baseline {base['items_per_s']}/s")
+    if res["maxrss_mb"] > base["maxrss_mb"] * (1 + tol):
+        out.append(f"{key}: peak RSS {res['maxrss_mb']} MB > baseline {base['maxrss_mb']} MB")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-s", "--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("-n", "--contacts", default="1000", help="comma list of portal sizes")
+    ap.add_argument("--hs-latency", type=float, default=0.0)
+    ap.add_argument("--openai-latency", type=float, default=0.05)
+    ap.add_argument("--openai-rpm", type=int, default=20_000,
+                    help="draft budget given to the agents (the fake has no limit)")
+    ap.add_argument("--batch", action="store_true",
+                    help="follow-ups draft through the (fake) Batch API")
+    ap.add_argument("--hs-rate", type=int, default=1_000_000,
+                    help="HubSpot calls per 10 s (real portals allow 100-190)")
+    ap.add_argument("--smtp-handshake", type=float, default=0.05)
+    ap.add_argument("--smtp-latency", type=float, default=0.0)
+    ap.add_argument("--kv-latency", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="429s on HTTP fakes")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--json", help="also write raw results here")
+    args = ap.parse_args()
+
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results, regressions = {}, []
+    print(f"{'scenario':<10}{'n':>8}{'items':>8}{'items/s':>10}{'wall s':>9}{'RSS MB':>9}  slowest stages (p50/p95 ms)")
+    for n in map(int, args.contacts.split(",")):
+        for sc in args.scenarios.split(","):
+            key = f"{sc}@{n}"
+            res = results[key] = _run(sc, n, args)
+            if "error" in res:
+                print(f"{sc:<10}{n:>8}  ERROR {res['error']}")
+                continue
+            top = sorted(res["stages"].items(), key=lambda kv: -kv[1]["total_s"])[:3]
+            stages = ", ".join(f"{k} {v['p50_ms']:.1f}/{v['p95_ms']:.1f}" for k, v in top)
+            print(f"{sc:<10}{n:>8}{res['items']:>8}{res['items_per_s']:>10.1f}"
+                  f"{res['wall_s']:>9.2f}{res['maxrss_mb']:>9.1f}  {stages}")
+            regressions += _compare(key, res, baselines.get(key), args.tolerance)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    if args.save:
+        for key, res in results.items():
+            if "error" not in res:
+                baselines[key] = {k: res[k] for k in ("items", "items_per_s", "wall_s", "maxrss_mb")}
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved → {BASELINES.relative_to(ROOT)}")
+    elif regressions:
+        print("\n⚠️  regressions vs baseline:")
+        for r in regressions:
+            print("  •", r)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Connection-per-message vs pooled SMTP sending against a local sink.
+
+    python -m bench.smtp_bench --messages 300 --handshake 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from pathlib import Path
+
+from bench.fake_smtp import FakeSMTP
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "agents"))
+
+from smtp_pool import SMTPPool  # noqa: E402
+
+
+def _msg(i: int) -> EmailMessage:
+    m = EmailMessage()
+    m["From"], m["To"], m["Subject"] = "me@example.com", f"c{i}@example.com", "hi"
+    m.set_content("Hello there\n" * 20)
+    return m
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--handshake", type=float, default=0.2, help="s per new session")
+    ap.add_argument("--latency", type=float, default=0.0, help="s per message")
+    ap.add_argument("--session-cap", type=int, default=90)
+    ap.add_argument("--pool-size", type=int, default=2)
+    args = ap.parse_args()
+
+    with FakeSMTP(connect_latency=args.handshake, latency=args.latency,
+                  max_per_session=args.session_cap) as srv:
+        n = min(args.messages, 30)
+        t0 = time.perf_counter()
+        for i in range(n):
+            with smtplib.SMTP(srv.host, srv.port) as s:
+                s.login("u", "p")
+                s.send_message(_msg(i))
+        per = (time.perf_counter() - t0) / n
+        print(f"per-message session : {per * 1000:7.1f} ms/msg "
+              f"(≈{per * args.messages:.1f}s for {args.messages})")
+
+        before = srv.sessions
+        t0 = time.perf_counter()
+        with SMTPPool(srv.host, srv.port, "u", "p", size=args.pool_size,
+                      max_per_session=args.session_cap, use_ssl=False) as pool:
+            with ThreadPoolExecutor(args.pool_size) as ex:
+                list(ex.map(lambda i: pool.send(_msg(i)), range(args.messages)))
+        dt = time.perf_counter() - t0
+        print(f"pooled (size {args.pool_size})    : {dt * 1000 / args.messages:7.1f} ms/msg "
+              f"({args.messages / dt:.0f} msg/s, {srv.sessions - before} sessions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Cold-start cost of each run.py command: fresh interpreter → agent imported.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --ref HEAD~1 --fake-creds   # vs an older tree
+
+Reports the median wall time to import the command's agent module and
+how many modules that pulls in. No network,
+no credentials – importing an agent must not need either (--fake-creds
+sets dummy ones for older trees that still build clients at import).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, os.path.join(os.getcwd(), "agents"))
+import importlib
+importlib.import_module(sys.argv[1])
+print(json.dumps({"s": time.perf_counter() - t0, "modules": len(sys.modules)}))
+"""
+
+MODULES = {
+    "rank": "signal_ranker", "scout": "prospect_scout", "send": "sequencer",
+    "followup": "followup_sequencer", "watch-replies": "reply_watcher",
+    "watch-events": "open_click_watcher",
+}
+
+
+FAKE_CREDS = {"SMTP_USER": "a@example.com", "SMTP_PASS": "x",
+              "HUBSPOT_TOKEN": "x", "OPENAI_API_KEY": "sk-x"}
+
+
+def measure(tree: Path, module: str, runs: int, creds: bool = False) -> dict:
+    env = {k: v for k, v in os.environ.items()
+           if not k.startswith(("SMTP_", "HUBSPOT_", "OPENAI_"))}   # no creds needed
+    if creds:
+        env.update(FAKE_CREDS)
+    samples, mods, err = [], 0, None
+    for _ in range(runs + 1):                         # first run warms .pyc / page cache
+        p = subprocess.run([sys.executable, "-c", PROBE, module], cwd=tree, env=env,
+                           capture_output=True, text=True)
+        if p.returncode:
+            err = (p.stderr.strip().splitlines() or ["?"])[-1]
+            break
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        samples.append(r["s"])
+        mods = r["modules"]
+    if err:
+        return {"error": err}
+    return {"ms": statistics.median(samples[1:]) * 1000, "modules": mods}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--ref", help="also measure this git revision (checked out to a temp dir)")
+    ap.add_argument("--fake-creds", action="store_true", help="set dummy API/SMTP credentials")
+    args = ap.parse_args()
+
+    trees = {"current": ROOT}
+    if args.ref:
+        tmp = Path(tempfile.mkdtemp(prefix="startup-"))
+        subprocess.run(["git", "worktree", "add", "--detach", str(tmp), args.ref],
+                       cwd=ROOT, check=True, capture_output=True)
+        trees = {args.ref: tmp, **trees}
+    try:
+        print(f"{'command':<15}" + "".join(f"{name:>26}" for name in trees))
+        for cmd, module in MODULES.items():
+            row = f"{cmd:<15}"
+            for tree in trees.values():
+                r = measure(tree, module, args.runs, args.fake_creds)
+                row += (f"{'error: ' + r['error'][:18]:>26}" if "error" in r
+                        else f"{r['ms']:>12.0f} ms {r['modules']:>5} mods")
+            print(row)
+    finally:
+        if args.ref:
+            subprocess.run(["git", "worktree", "remove", "--force", str(trees[args.ref])],
+                           cwd=ROOT, capture_output=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,253 @@
-# Temporary sanity-check script
+#!/usr/bin/env python3
+"""Single entry point for the agents.
+
+    python run.py                 supervise (default) – everything below
+    python run.py rank            score contacts against the ICP signals
+    python run.py scout [--csv F] create/update prospect contacts (ICP or CSV)
+    python run.py send            first-touch emails
+    python run.py followup        follow-up steps
+    python run.py watch-replies   IMAP reply watcher (until Ctrl-C)
+    python run.py watch-events    open/click ingest endpoint + KV catch-up (until Ctrl-C)
+
+Each command imports only its own agent (and what that agent needs), and
+API clients are built on first use, so a cron-triggered one-shot pays
+for nothing it doesn't call – see bench/startup.py.
+
+The supervisor runs every agent in one process under asyncio:
+
+  • reply watcher and open/click watcher run continuously (in threads –
+    both are blocking-I/O loops) and are restarted with backoff if they die
+  • signal_ranker, sequencer and followup_sequencer run on cron schedules
+    (5-field, local time), one daily job at a time
+  • HubSpot / OpenAI / HTTP clients are shared through agents/clients.py
+  • SIGINT / SIGTERM stop everything gracefully
+
+Env (defaults in brackets)
+  RANK_CRON      ["0 6 * * *"]      signal_ranker
+  SEND_CRON      ["0 9 * * 1-5"]    sequencer
+  FOLLOWUP_CRON  ["0 10 * * 1-5"]   followup_sequencer
+  RUN_WATCHERS   ["replies,events"] which watchers to start ("" = none)
+  EVENTS_MODE    [poll, or push once INGEST_TOKEN is set]
+                                    push: event_ingest.py endpoint with the KV
+                                    poller as catch-up; poll: KV polling only
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import os
+import signal
+import sys
+import threading
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "agents"))      # agents import each other flat
+
+
+# ── cron ──────────────────────────────────────────────────────────
+class Cron:
+    """Minimal 5-field cron: minute hour day-of-month month day-of-week.
+    Supports *, lists, ranges and steps (e.g. "*/15 9-17 * * 1-5")."""
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minute, self.hour, self.dom, self.month, self.dow = (
+            self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self.RANGES)
+        )
+        self.dom_any, self.dow_any = fields[2] == "*", fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> set[int]:
+        out = set()
+        for part in field.split(","):
+            rng, _, step = part.partition("/")
+            if rng == "*":
+                a, b = lo, hi
+            elif "-" in rng:
+                a, b = map(int, rng.split("-"))
+            else:
+                a = b = int(rng)
+            out.update(range(a, b + 1, int(step or 1)))
+        if hi == 6:
+            out = {v % 7 for v in out}                      # 7 = Sunday too
+        return out
+
+    def _day_ok(self, dt: datetime) -> bool:
+        dom = dt.day in self.dom
+        dow = (dt.weekday() + 1) % 7 in self.dow            # cron: 0 = Sunday
+        if self.dom_any or self.dow_any:
+            return dom and dow
+        return dom or dow                                   # cron's OR rule
+
+    def next_after(self, now: datetime) -> datetime:
+        t = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if t.month not in self.month or not self._day_ok(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.hour not in self.hour:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+                continue
+            if t.minute in self.minute:
+                return t
+            t += timedelta(minutes=1)
+        raise ValueError(f"cron {self.expr!r} never fires")
+
+
+# ── jobs ──────────────────────────────────────────────────────────
+COMMANDS = {                 # command → (agent module, help)
+    "rank":          ("signal_ranker",      "score contacts against the ICP signals"),
+    "scout":         ("prospect_scout",     "create/update prospect contacts"),
+    "send":          ("sequencer",          "send first-touch emails"),
+    "followup":      ("followup_sequencer", "send due follow-up steps"),
+    "watch-replies": ("reply_watcher",      "watch the mailbox for replies"),
+    "watch-events":  ("event_ingest",       "receive open/click events (+ KV catch-up)"),
+}
+
+def load(cmd: str):
+    """Import (only) the agent module behind a command."""
+    return importlib.import_module(COMMANDS[cmd][0])
+
+def rank():
+    load("rank").main()
+
+def scout(csv: str | None = None):
+    load("scout").main(csv)
+
+def send():
+    load("send").main()
+
+def followup():
+    load("followup").main()
+
+def watch_replies(stop: threading.Event):
+    reply_watcher = load("watch-replies")
+    reply_watcher.run_all(reply_watcher.announce, stop)
+
+def watch_events(stop: threading.Event):
+    # the tracker may only push to an authenticated endpoint; until a
+    # token is configured the KV poller is the event source
+    default = "push" if os.getenv("INGEST_TOKEN") else "poll"
+    if os.getenv("EVENTS_MODE", default).lower() == "poll":
+        importlib.import_module("open_click_watcher").run(stop)
+    else:
+        load("watch-events").run(stop)
+
+
+CRON_JOBS = [
+    ("rank",     os.getenv("RANK_CRON",     "0 6 * * *"),    rank),
+    ("send",     os.getenv("SEND_CRON",     "0 9 * * 1-5"),  send),
+    ("followup", os.getenv("FOLLOWUP_CRON", "0 10 * * 1-5"), followup),
+]
+WATCHERS = {"replies": watch_replies, "events": watch_events}
+
+
+# ── supervisor ────────────────────────────────────────────────────
+class Supervisor:
+    def __init__(self):
+        self.stop = asyncio.Event()               # loop side
+        self.thread_stop = threading.Event()      # worker-thread side
+        self.job_lock = asyncio.Lock()            # daily jobs never overlap
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Sleep unless asked to stop; True if we should keep going."""
+        try:
+            await asyncio.wait_for(self.stop.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+        return not self.stop.is_set()
+
+    async def watcher(self, name: str, fn):
+        backoff = 1
+        while not self.stop.is_set():
+            try:
+                await asyncio.to_thread(fn, self.thread_stop)
+                if self.stop.is_set():
+                    return
+                print(f"⚠️  {name} watcher exited – restarting")
+            except Exception:
+                print(f"❌ {name} watcher crashed – restarting in {backoff}s")
+                traceback.print_exc()
+            if not await self._sleep(backoff):
+                return
+            backoff = min(backoff * 2, 300)
+
+    async def cron(self, name: str, expr: str, fn):
+        cron = Cron(expr)
+        while True:
+            nxt = cron.next_after(datetime.now())
+            print(f"🗓  {name}: next run {nxt:%a %Y-%m-%d %H:%M} ({expr})")
+            if not await self._sleep((nxt - datetime.now()).total_seconds()):
+                return
+            async with self.job_lock:
+                print(f"▶️  {name} started")
+                try:
+                    await asyncio.to_thread(fn)
+                    print(f"✅ {name} finished")
+                except Exception:
+                    print(f"❌ {name} failed")
+                    traceback.print_exc()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop.set)
+            except NotImplementedError:                 # Windows
+                pass
+
+        wanted = [w for w in os.getenv("RUN_WATCHERS", "replies,events").split(",") if w]
+        tasks = [asyncio.create_task(self.watcher(w, WATCHERS[w]), name=w) for w in wanted]
+        tasks += [asyncio.create_task(self.cron(n, e, f), name=n) for n, e, f in CRON_JOBS]
+        print(f"🚀 supervisor up: watchers={wanted or '-'} jobs={[n for n, _, _ in CRON_JOBS]}")
+
+        await self.stop.wait()
+        print("🛑 shutting down …")
+        self.thread_stop.set()                          # watchers leave their loops
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print("👋 bye")
+
+
+# ── CLI ───────────────────────────────────────────────────────────
+ONE_SHOT = {"rank": rank, "scout": scout, "send": send, "followup": followup}
+WATCH    = {"watch-replies": watch_replies, "watch-events": watch_events}
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="GTM agents")
+    sub = ap.add_subparsers(dest="cmd", metavar="command")
+    sub.add_parser("supervise", help="run watchers + cron jobs (default)")
+    for name, (_, help_) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_)
+        if name == "scout":
+            p.add_argument("--csv", help="prospect CSV (default: config/icp.json signals)")
+    args = ap.parse_args(argv)
+    cmd = args.cmd or "supervise"
+
+    if cmd == "supervise":
+        asyncio.run(Supervisor().run())
+    elif cmd in WATCH:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        try:
+            WATCH[cmd](stop)
+        except KeyboardInterrupt:
+            stop.set()
+    elif cmd == "scout":
+        scout(args.csv)
+    else:
+        ONE_SHOT[cmd]()
+
+
 if __name__ == "__main__":
-    print("💡  Repo scaffold is working – import statements later will go here.")
\ No newline at end of file
+    main()